@@ -1,5 +1,7 @@
 import os
+import shutil
 import sys
+import time
 from typing import List
 
 import streamlit as st
@@ -11,10 +13,12 @@ if SRC_DIR not in sys.path:
     sys.path.append(SRC_DIR)
 
 # Import your project modules
-from src.ingestion.extract import extract_from_files
-from src.ingestion.to_documents import chunks_to_documents
-from src.core.vectorstore import add_documents
-from src.rag.rag_chain import build_rag_chain
+from src.config import STORE_SNAPSHOT
+from src.core.metrics import export_prometheus, snapshot
+from src.ingestion.jobs import FINISHED, get_job_queue
+from src.ingestion.snapshot import serve_snapshots
+from src.core.vectorstore import indexed_files, warm_up
+from src.rag.rag_chain import build_rag_chain, warm_up_llm
 
 
 # ---------- Helpers ----------
@@ -29,21 +33,99 @@ def save_uploaded_files(uploaded_files: List[st.runtime.uploaded_file_manager.Up
     paths: List[str] = []
     for f in uploaded_files:
         dest_path = os.path.join(raw_dir, f.name)
-        with open(dest_path, "wb") as out:
-            out.write(f.read())
+        # Spool in 1 MB pieces instead of reading the whole upload into memory;
+        # write beside the target first so a running job never sees a partial file
+        tmp_path = dest_path + ".part"
+        f.seek(0)
+        with open(tmp_path, "wb") as out:
+            shutil.copyfileobj(f, out, length=1024 * 1024)
+        os.replace(tmp_path, dest_path)
         paths.append(dest_path)
 
     return paths
 
 
+@st.cache_resource(show_spinner="Loading models and vector store...")
+def warm_up_once():
+    """Load the shared models and vector store once per process, not per session."""
+    timings = warm_up()
+    timings["llm_s"] = warm_up_llm()
+    return timings
+
+
 def ensure_chain():
     """Initialize RAG chain + chat history in session_state if not present."""
     if "chain" not in st.session_state:
+        start = time.perf_counter()
         st.session_state.chain = build_rag_chain()
+        st.session_state.chain_build_s = time.perf_counter() - start
     if "history" not in st.session_state:
         st.session_state.history = []  # list of (question, answer, sources)
 
 
+def render_sources(srcs):
+    """Show the retrieved source chunks for one answer."""
+    with st.expander("📚 Sources", expanded=False):
+        for i, doc in enumerate(srcs, start=1):
+            meta = doc.metadata or {}
+            st.markdown(
+                f"**Source {i}:** "
+                f"`{meta.get('file_name', '?')}`, "
+                f"page `{meta.get('page_number', '?')}`, "
+                f"modality `{meta.get('modality', '?')}`"
+            )
+            # Show a preview of the chunk
+            preview = doc.page_content[:500]
+            st.write(preview + ("…" if len(doc.page_content) > 500 else ""))
+            st.markdown("---")
+
+
+_STAGE_ICONS = {
+    "queued": "⏳", "extracting": "📄", "indexing": "🧮", "done": "✅",
+    "skipped": "⏭️", "failed": "⚠️", "cancelled": "✖️",
+}
+
+
+def render_job(job):
+    """Progress of one ingestion job: a bar over files plus each file's stage."""
+    files = job["files"]
+    finished = sum(1 for f in files if f["stage"] in ("done", "skipped", "failed", "cancelled"))
+    label = f"Job {job['id']} · {job['status']}" + (" (resumed)" if job.get("resumed") else "")
+    st.progress(finished / len(files) if files else 1.0, text=label)
+
+    for f in files:
+        line = f"{_STAGE_ICONS.get(f['stage'], '')} `{f['file_name']}` — {f['stage']}"
+        if f.get("written"):
+            line += f" ({f['written']} chunks written)"
+        st.caption(line)
+
+    stats = job.get("stats")
+    if job["status"] == "done" and stats:
+        st.caption(
+            f"Indexed {stats['written']} new chunks ({stats['unchanged']} unchanged, "
+            f"{stats.get('duplicates', 0)} near-duplicates skipped, "
+            f"{stats['deleted']} stale removed, {stats['skipped_files']} file(s) already up to date). "
+            f"PDF pages: {stats['fast_pages']} via fast text extraction, "
+            f"{stats['hi_res_pages']} via hi_res layout analysis."
+        )
+    if job.get("error"):
+        st.warning(job["error"])
+    if job["status"] not in FINISHED:
+        if st.button("Cancel", key=f"cancel-{job['id']}"):
+            get_job_queue().cancel(job["id"])
+
+
+@st.fragment(run_every=2)
+def render_jobs():
+    """Ingestion jobs, refreshed every couple of seconds without rerunning the page."""
+    jobs = get_job_queue().jobs()
+    if not jobs:
+        return
+    st.subheader("Indexing jobs")
+    for job in jobs[:5]:
+        render_job(job)
+
+
 # ---------- Streamlit UI ----------
 
 st.set_page_config(
@@ -55,70 +137,81 @@ st.set_page_config(
 st.title("🧠 LlamaChain — Chat with Your Documents (Offline)")
 
 
+# ===== Read replica: serve from a store snapshot =====
+serving_snapshot = None
+if STORE_SNAPSHOT:
+    # Imports and switch-overs run on a background thread, never in a rerun
+    serving_snapshot = serve_snapshots(STORE_SNAPSHOT)
+    if serving_snapshot is None:
+        st.warning("Waiting for the first store snapshot to be exported and imported. Reload in a moment.")
+        # Nothing to serve yet: the local store is not this replica's data
+        st.stop()
+
+
 # ===== Sidebar: Ingestion =====
 with st.sidebar:
     st.header("📥 Ingest / Index Documents")
 
-    st.markdown(
-        "Upload PDFs / PPT / PPTX here.\n\n"
-        "They will be parsed with Unstructured (text + tables + images), "
-        "embedded, and stored in the local ChromaDB."
-    )
-
-    uploaded_files = st.file_uploader(
-        "Upload documents",
-        type=["pdf", "ppt", "pptx"],
-        accept_multiple_files=True,
-    )
-
-    ingest_clicked = st.button("🚀 Process & Index", type="primary")
-
-    if ingest_clicked:
-        if not uploaded_files:
-            st.warning("Please upload at least one file before processing.")
-        else:
-            with st.spinner("Extracting with Unstructured and storing embeddings in Chroma..."):
-                # 1) Save to disk
+    if STORE_SNAPSHOT:
+        st.info(
+            f"Read-only replica serving snapshot `{os.path.basename(serving_snapshot or '-')}`. "
+            "Documents are indexed by the writer instance."
+        )
+    else:
+        st.markdown(
+            "Upload PDFs / PPT / PPTX here.\n\n"
+            "They will be parsed with Unstructured (text + tables + images), "
+            "embedded, and stored in the local ChromaDB."
+        )
+
+        uploaded_files = st.file_uploader(
+            "Upload documents",
+            type=["pdf", "ppt", "pptx"],
+            accept_multiple_files=True,
+        )
+
+        ingest_clicked = st.button("🚀 Process & Index", type="primary")
+
+        if ingest_clicked:
+            if not uploaded_files:
+                st.warning("Please upload at least one file before processing.")
+            else:
+                # Save to disk, then extract, convert and index in the background;
+                # only what changed since the last ingest is processed. The chain
+                # reads the shared vector store, so chat keeps working meanwhile.
                 paths = save_uploaded_files(uploaded_files)
+                get_job_queue().submit(paths)
+                st.info("Indexing started. You can keep chatting with the documents indexed so far.")
 
-                # 2) Extract raw chunks (text, tables, images) from PDFs/PPTX
-                chunks = extract_from_files(paths)
-
-                # 3) Convert to LangChain Documents (with merged titles + chunking)
-                docs = chunks_to_documents(chunks)
-
-                # 4) Add to vector store
-                num = add_documents(docs)
-
-                # 5) Reset RAG chain so it uses the updated DB
-                st.session_state.pop("chain", None)
-                st.session_state.pop("history", None)
-
-            st.success(f"✅ Indexed {num} chunks from {len(uploaded_files)} file(s).")
-            st.info("You can now ask questions about these documents in the main chat area.")
+        render_jobs()
 
 
 st.divider()
 
 # ===== Main: Chat Interface =====
+warm_up_timings = warm_up_once()
 ensure_chain()
 
+with st.sidebar:
+    st.header("🔎 Search filters")
+    selected_files = st.multiselect("Only these files", indexed_files(), placeholder="All files")
+    selected_modalities = st.multiselect(
+        "Only these content types", ["text", "table", "image"], placeholder="All content types"
+    )
+    # Empty selections mean no restriction
+    filters = {"file_name": selected_files, "modality": selected_modalities}
+
+    st.caption(
+        f"Cold start: model {warm_up_timings['embeddings_s']:.2f}s, "
+        f"vector store {warm_up_timings['vectorstore_s']:.2f}s, "
+        f"LLM {warm_up_timings['llm_s']:.2f}s · "
+        f"session setup {st.session_state.chain_build_s * 1000:.1f} ms"
+    )
+
 st.subheader("💬 Chat with your ingested documents")
 
 query = st.chat_input("Ask a question using the ingested PDFs/PPTX...")
 
-if query:
-    rag = st.session_state.chain
-
-    with st.spinner("Thinking with local Llama..."):
-        result = rag(query)
-
-    answer = result["answer"]
-    sources = result.get("source_documents", [])
-
-    # Save in history
-    st.session_state.history.append((query, answer, sources))
-
 
 # Render chat history
 for idx, (q, a, srcs) in enumerate(st.session_state.history):
@@ -128,16 +221,62 @@ for idx, (q, a, srcs) in enumerate(st.session_state.history):
         st.write(a)
 
         if srcs:
-            with st.expander("📚 Sources", expanded=False):
-                for i, doc in enumerate(srcs, start=1):
-                    meta = doc.metadata or {}
-                    st.markdown(
-                        f"**Source {i}:** "
-                        f"`{meta.get('file_name', '?')}`, "
-                        f"page `{meta.get('page_number', '?')}`, "
-                        f"modality `{meta.get('modality', '?')}`"
-                    )
-                    # Show a preview of the chunk
-                    preview = doc.page_content[:500]
-                    st.write(preview + ("…" if len(doc.page_content) > 500 else ""))
-                    st.markdown("---")
+            render_sources(srcs)
+
+
+if query:
+    rag = st.session_state.chain
+
+    st.chat_message("user").write(query)
+
+    with st.chat_message("assistant"):
+        # Sources are retrieved up front, then the answer streams in token by token
+        with st.spinner("Searching your documents..."):
+            result = rag.stream(query, filters)
+
+        answer = st.write_stream(result["tokens"])
+        sources = result.get("source_documents", [])
+
+        timings = result.get("timings", {})
+        context_stats = result.get("context_stats", {})
+        if "ttft_s" in timings:
+            caption = (
+                f"First token after {timings['ttft_s']:.2f}s · "
+                f"total {timings.get('total_s', 0.0):.2f}s"
+            )
+            if context_stats:
+                caption += f" · {context_stats['prompt_tokens']} prompt tokens"
+                if "prompt_tokens_saved" in context_stats:
+                    caption += f" ({context_stats['prompt_tokens_saved']} saved by context packing)"
+            st.caption(caption)
+
+        if sources:
+            render_sources(sources)
+
+    # Save in history
+    st.session_state.history.append((query, answer, sources))
+
+
+# ===== Sidebar: Performance metrics =====
+with st.sidebar:
+    if st.checkbox("📊 Show performance metrics"):
+        metrics = snapshot()
+        if metrics["spans"]:
+            st.dataframe(
+                [
+                    {
+                        "stage": name,
+                        "count": s["count"],
+                        "mean ms": round(s["mean_s"] * 1000, 1),
+                        "p50 ms": round(s["p50_s"] * 1000, 1),
+                        "p95 ms": round(s["p95_s"] * 1000, 1),
+                    }
+                    for name, s in metrics["spans"].items()
+                ],
+                hide_index=True,
+            )
+        else:
+            st.caption("No timings recorded yet.")
+        if metrics["counters"]:
+            st.json(metrics["counters"])
+        st.download_button("Download (Prometheus)", export_prometheus(), file_name="metrics.prom")
@@ -0,0 +1,60 @@
+"""
+Reproducible performance benchmarks on a synthetic corpus.
+
+    python -m src.bench --out bench.json
+
+Everything runs against a temporary Chroma store and cache directory, so the
+real index is never touched. Results are written as JSON for comparison
+between commits.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, embedding, retrieval and answering.")
+    parser.add_argument("--out", default="bench.json", help="JSON file to write results to")
+    parser.add_argument("--pdf-files", type=int, default=4)
+    parser.add_argument("--pptx-files", type=int, default=2)
+    parser.add_argument("--pages", type=int, default=20, help="pages / slides per file")
+    parser.add_argument("--workers", type=int, default=2, help="extraction worker processes")
+    parser.add_argument("--search-sizes", default="1000,5000",
+                        help="comma-separated collection sizes to measure search latency at")
+    parser.add_argument("--queries", type=int, default=50, help="queries per measurement")
+    parser.add_argument("--llm-delay", type=float, default=0.0, help="seconds the stub LLM sleeps per call")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary work directory")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="llamachain-bench-")
+    # Must be set before src.config is imported
+    os.environ["CHROMA_DIR"] = os.path.join(work_dir, "chroma")
+    os.environ["CACHE_DIR"] = os.path.join(work_dir, "cache")
+
+    from src.bench.run import run_benchmarks
+
+    try:
+        report = run_benchmarks(
+            work_dir,
+            pdf_files=args.pdf_files,
+            pptx_files=args.pptx_files,
+            pages=args.pages,
+            workers=args.workers,
+            search_sizes=[int(s) for s in args.search_sizes.split(",") if s],
+            queries=args.queries,
+            llm_delay_s=args.llm_delay,
+        )
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"[INFO] Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# src/bench/corpus.py
+"""Synthetic PDF / PPTX corpora, so benchmarks need no external files."""
+
+import os
+import random
+from typing import List
+
+import fitz  # PyMuPDF
+from pptx import Presentation
+from pptx.util import Pt
+
+_WORDS = (
+    "system model data document retrieval index vector query answer context "
+    "latency throughput chunk embedding language local offline pipeline page "
+    "table image section objective method result analysis project evaluation "
+    "performance memory storage network user interface design architecture"
+).split()
+
+_SECTIONS = ["Introduction", "Objectives", "Methodology", "Results", "Discussion", "Conclusion"]
+
+
+def sentence(rng: random.Random, min_words: int = 8, max_words: int = 20) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+
+def paragraph(rng: random.Random, sentences: int = 5) -> str:
+    return " ".join(sentence(rng) for _ in range(sentences))
+
+
+def make_pdf(path: str, pages: int, seed: int = 0) -> str:
+    """A born-digital PDF: each page has a heading and a few paragraphs."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for p in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"{p + 1}. {rng.choice(_SECTIONS)}", fontsize=18)
+        body = "\n\n".join(paragraph(rng) for _ in range(3))
+        page.insert_textbox(fitz.Rect(72, 100, page.rect.width - 72, page.rect.height - 72), body, fontsize=11)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def make_pptx(path: str, slides: int, seed: int = 0) -> str:
+    """A deck of title + bullet slides."""
+    rng = random.Random(seed)
+    prs = Presentation()
+    layout = prs.slide_layouts[1]  # title and content
+    for s in range(slides):
+        slide = prs.slides.add_slide(layout)
+        slide.shapes.title.text = f"{rng.choice(_SECTIONS)} {s + 1}"
+        body = slide.placeholders[1].text_frame
+        body.text = sentence(rng)
+        for _ in range(4):
+            para = body.add_paragraph()
+            para.text = sentence(rng)
+            para.font.size = Pt(16)
+    prs.save(path)
+    return path
+
+
+def make_corpus(out_dir: str, pdf_files: int, pptx_files: int, pages_per_file: int, seed: int = 0) -> List[str]:
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for i in range(pdf_files):
+        paths.append(make_pdf(os.path.join(out_dir, f"synthetic_{i}.pdf"), pages_per_file, seed + i))
+    for i in range(pptx_files):
+        paths.append(make_pptx(os.path.join(out_dir, f"synthetic_{i}.pptx"), pages_per_file, seed + 1000 + i))
+    return paths
+
+
+def make_texts(n: int, seed: int = 0) -> List[str]:
+    """Chunk-sized synthetic passages for growing a collection quickly."""
+    rng = random.Random(seed)
+    return [paragraph(rng, sentences=rng.randint(3, 8)) for _ in range(n)]
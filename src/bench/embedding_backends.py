@@ -0,0 +1,99 @@
+"""
+Compare an embedding backend against the PyTorch reference.
+
+    python -m src.bench.embedding_backends --backend onnx_int8 --texts 2000
+
+Reports load time, batch throughput and single-query latency for both
+backends, plus how closely the candidate agrees with the reference: cosine
+similarity between the two vectors of each text, and how many of each query's
+top-k reference neighbours the candidate also returns.
+"""
+
+import argparse
+import json
+import time
+from typing import Any, Dict
+
+import numpy as np
+
+from src.bench.corpus import make_texts
+from src.bench.run import percentiles
+from src.core.embeddings import load_backend
+
+
+def _measure(backend: str, texts, queries) -> Dict[str, Any]:
+    start = time.perf_counter()
+    model = load_backend(backend)
+    load_s = time.perf_counter() - start
+
+    model.embed_query("warm up")
+    start = time.perf_counter()
+    vectors = np.asarray(model.embed_documents(texts), dtype=np.float32)
+    embed_s = time.perf_counter() - start
+
+    latencies, query_vectors = [], []
+    for q in queries:
+        start = time.perf_counter()
+        query_vectors.append(model.embed_query(q))
+        latencies.append(time.perf_counter() - start)
+
+    report = {
+        "load_s": load_s,
+        "embed_s": embed_s,
+        "embed_texts_per_s": len(texts) / embed_s,
+        "query": percentiles(latencies),
+    }
+    return report, vectors, np.asarray(query_vectors, dtype=np.float32)
+
+
+def _normalize(m: np.ndarray) -> np.ndarray:
+    return m / np.clip(np.linalg.norm(m, axis=1, keepdims=True), 1e-12, None)
+
+
+def compare(backend: str, n_texts: int = 2000, n_queries: int = 100, k: int = 10) -> Dict[str, Any]:
+    texts = make_texts(n_texts, seed=7)
+    queries = [t.split(". ")[0] for t in make_texts(n_queries, seed=8)]
+
+    reference, ref_docs, ref_queries = _measure("torch", texts, queries)
+    candidate, cand_docs, cand_queries = _measure(backend, texts, queries)
+
+    cosine = np.sum(_normalize(ref_docs) * _normalize(cand_docs), axis=1)
+    ref_top = np.argsort(-(_normalize(ref_queries) @ _normalize(ref_docs).T), axis=1)[:, :k]
+    cand_top = np.argsort(-(_normalize(cand_queries) @ _normalize(cand_docs).T), axis=1)[:, :k]
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(ref_top, cand_top)]
+
+    return {
+        "backend": backend,
+        "texts": n_texts,
+        "queries": n_queries,
+        "torch": reference,
+        backend: candidate,
+        "speedup": candidate["embed_texts_per_s"] / reference["embed_texts_per_s"],
+        "agreement": {
+            "cosine_mean": float(cosine.mean()),
+            "cosine_min": float(cosine.min()),
+            "cosine_p5": float(np.percentile(cosine, 5)),
+            f"top{k}_overlap_mean": float(np.mean(overlap)),
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Throughput and agreement of an embedding backend vs PyTorch.")
+    parser.add_argument("--backend", default="onnx_int8")
+    parser.add_argument("--texts", type=int, default=2000, help="synthetic passages to embed")
+    parser.add_argument("--queries", type=int, default=100, help="single-query latency samples")
+    parser.add_argument("--k", type=int, default=10, help="neighbours compared per query")
+    parser.add_argument("--out", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    report = compare(args.backend, args.texts, args.queries, args.k)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# src/bench/run.py
+
+import os
+import platform
+import subprocess
+import time
+from typing import Any, Dict, Iterator, List
+
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+import src.core.llm as llm_module
+from src.bench.corpus import make_corpus, make_texts
+from src.core.embedding_cache import CachedEmbeddings
+from src.core.embeddings import get_embeddings
+from src.core.vectorstore import add_documents, get_vectorstore
+from src.ingestion.extract import extract_from_files
+from src.ingestion.to_documents import chunks_to_documents
+from src.rag.rag_chain import build_rag_chain
+from src.rag.retrieval import retrieve
+
+_QUERIES = [
+    "What are the objectives of the project?",
+    "How is retrieval latency evaluated?",
+    "Describe the system architecture",
+    "What storage does the pipeline use?",
+    "Summarise the results section",
+]
+
+
+class StubLLM:
+    """Stands in for ChatOllama: fixed answer, optional fixed delay."""
+
+    def __init__(self, answer: str = "Stub answer.", delay_s: float = 0.0):
+        self.answer = answer
+        self.delay_s = delay_s
+
+    def invoke(self, prompt: str) -> AIMessage:
+        time.sleep(self.delay_s)
+        return AIMessage(content=self.answer)
+
+    def stream(self, prompt: str) -> Iterator[AIMessageChunk]:
+        time.sleep(self.delay_s)
+        for word in self.answer.split(" "):
+            yield AIMessageChunk(content=word + " ")
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {
+        "n": len(ordered),
+        "mean_ms": 1000 * sum(ordered) / len(ordered),
+        "p50_ms": 1000 * pct(50),
+        "p95_ms": 1000 * pct(95),
+        "p99_ms": 1000 * pct(99),
+    }
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def bench_ingestion(work_dir: str, pdf_files: int, pptx_files: int, pages: int, workers: int) -> Dict[str, Any]:
+    paths = make_corpus(os.path.join(work_dir, "corpus"), pdf_files, pptx_files, pages)
+    total_pages = (pdf_files + pptx_files) * pages
+
+    chunks, extract_s = _timed(extract_from_files, paths, workers=workers)
+    docs, convert_s = _timed(chunks_to_documents, chunks)
+
+    return {
+        "files": len(paths),
+        "pages": total_pages,
+        "extract_s": extract_s,
+        "extract_pages_per_s": total_pages / extract_s,
+        "chunks": len(chunks),
+        "chunks_to_documents_s": convert_s,
+        "chunks_to_documents_chunks_per_s": len(chunks) / convert_s if convert_s else None,
+        "documents": len(docs),
+        "_docs": docs,
+    }
+
+
+def bench_embedding(texts: List[str]) -> Dict[str, Any]:
+    embeddings = get_embeddings()
+    # Measure the model itself, not the on-disk cache
+    model = embeddings.underlying if isinstance(embeddings, CachedEmbeddings) else embeddings
+    _, seconds = _timed(model.embed_documents, texts)
+    return {"chunks": len(texts), "embed_s": seconds, "embed_chunks_per_s": len(texts) / seconds}
+
+
+def bench_writes(docs: List[Document]) -> Dict[str, Any]:
+    # Warm the embedding cache first so the timing is dominated by the store
+    get_embeddings().embed_documents([d.page_content for d in docs])
+    _, seconds = _timed(add_documents, docs)
+    return {"documents": len(docs), "add_documents_s": seconds, "add_documents_docs_per_s": len(docs) / seconds}
+
+
+def bench_search(sizes: List[int], queries_per_size: int) -> List[Dict[str, Any]]:
+    results = []
+    collection = get_vectorstore()._collection
+    texts = make_texts(max(sizes), seed=42)
+
+    for size in sizes:
+        current = collection.count()
+        if size > current:
+            new_texts = texts[current:size]
+            add_documents([
+                Document(
+                    page_content=t,
+                    metadata={"chunk_id": f"bench-{current + i}", "file_name": "bench", "page_number": 1, "modality": "text"},
+                )
+                for i, t in enumerate(new_texts)
+            ])
+
+        vs = get_vectorstore()
+        search, hybrid = [], []
+        for i in range(queries_per_size):
+            q = f"{_QUERIES[i % len(_QUERIES)]} ({i})"  # distinct text, so no embedding-cache hits
+            search.append(_timed(vs.similarity_search, q, k=6)[1])
+            hybrid.append(_timed(retrieve, [q + " hybrid"])[1])
+
+        results.append({
+            "collection_size": collection.count(),
+            "similarity_search": percentiles(search),
+            "hybrid_retrieve": percentiles(hybrid),
+        })
+    return results
+
+
+def bench_end_to_end(n: int, llm_delay_s: float) -> Dict[str, Any]:
+    llm_module._llm = StubLLM(delay_s=llm_delay_s)
+    rag = build_rag_chain(use_cache=False)
+    latencies = [_timed(rag, f"{_QUERIES[i % len(_QUERIES)]} [{i}]")[1] for i in range(n)]
+    return {"stub_llm_delay_s": llm_delay_s, "rag": percentiles(latencies)}
+
+
+def run_benchmarks(
+    work_dir: str,
+    pdf_files: int = 4,
+    pptx_files: int = 2,
+    pages: int = 20,
+    workers: int = 2,
+    search_sizes: List[int] = (1000, 5000),
+    queries: int = 50,
+    llm_delay_s: float = 0.0,
+) -> Dict[str, Any]:
+    report: Dict[str, Any] = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "params": {
+            "pdf_files": pdf_files,
+            "pptx_files": pptx_files,
+            "pages_per_file": pages,
+            "workers": workers,
+            "search_sizes": list(search_sizes),
+            "queries": queries,
+        },
+    }
+
+    print("[INFO] Benchmark: ingestion")
+    ingestion = bench_ingestion(work_dir, pdf_files, pptx_files, pages, workers)
+    docs = ingestion.pop("_docs")
+    report["ingestion"] = ingestion
+
+    print("[INFO] Benchmark: embedding")
+    report["embedding"] = bench_embedding([d.page_content for d in docs])
+
+    print("[INFO] Benchmark: vector writes")
+    report["writes"] = bench_writes(docs)
+
+    print("[INFO] Benchmark: search latency")
+    report["search"] = bench_search(sorted(search_sizes), queries)
+
+    print("[INFO] Benchmark: end-to-end rag() with stub LLM")
+    report["end_to_end"] = bench_end_to_end(queries, llm_delay_s)
+
+    return report
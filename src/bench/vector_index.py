@@ -0,0 +1,157 @@
+"""
+Compare the quantized vector indexes with Chroma's HNSW index.
+
+    python -m src.bench.vector_index --vectors 50000 --dim 384
+
+Uses synthetic clustered unit vectors (or, with --store, the embeddings in the
+configured Chroma store). Exact brute-force neighbours are the reference; for
+Chroma and for the int8 and binary indexes at several rescore factors it
+reports recall@k, query latency, build time and the bytes scanned per query.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from src.bench.run import percentiles
+
+_ADD_BATCH = 5000
+
+
+def synthetic_vectors(n: int, dim: int, n_queries: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Unit vectors around a few hundred centres, like sentence embeddings; queries are noisy copies."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(max(1, n // 100), dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, len(centres), n)] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[rng.integers(0, n, n_queries)] + 0.3 * rng.normal(size=(n_queries, dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return vectors, queries.astype(np.float32)
+
+
+def store_vectors(n_queries: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Embeddings of the configured store; queries are perturbed stored vectors."""
+    from src.core.vectorstore import get_shard, shard_names
+
+    blocks = []
+    for name in shard_names():
+        collection = get_shard(name)._collection
+        offset = 0
+        while True:
+            batch = collection.get(include=["embeddings"], limit=1000, offset=offset)
+            if not len(batch["ids"]):
+                break
+            blocks.append(np.asarray(batch["embeddings"], dtype=np.float32))
+            offset += len(batch["ids"])
+    vectors = np.concatenate(blocks)
+    rng = np.random.default_rng(seed)
+    scale = float(np.linalg.norm(vectors, axis=1).mean())
+    queries = vectors[rng.integers(0, len(vectors), n_queries)]
+    queries = queries + 0.3 * scale / np.sqrt(vectors.shape[1]) * rng.normal(size=queries.shape)
+    return vectors, queries.astype(np.float32)
+
+
+def exact_neighbours(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    distances = (
+        np.einsum("ij,ij->i", vectors, vectors)[None, :] - 2.0 * queries @ vectors.T
+    )
+    return np.argsort(distances, axis=1)[:, :k]
+
+
+def _recall(found: List[np.ndarray], truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(f.tolist()) & set(t.tolist())) / k for f, t in zip(found, truth)]))
+
+
+def _bench_chroma(work_dir: str, vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int) -> Dict[str, Any]:
+    import chromadb
+
+    client = chromadb.PersistentClient(path=os.path.join(work_dir, "chroma"))
+    collection = client.create_collection("bench")
+    start = time.perf_counter()
+    for s in range(0, len(vectors), _ADD_BATCH):
+        block = vectors[s:s + _ADD_BATCH]
+        collection.add(ids=[str(i) for i in range(s, s + len(block))], embeddings=block.tolist())
+    build_s = time.perf_counter() - start
+
+    found, latencies = [], []
+    for q in queries:
+        start = time.perf_counter()
+        res = collection.query(query_embeddings=[q.tolist()], n_results=k, include=[])
+        latencies.append(time.perf_counter() - start)
+        found.append(np.array([int(i) for i in res["ids"][0]]))
+    return {"build_s": build_s, "recall": _recall(found, truth), "query": percentiles(latencies),
+            "scanned_bytes": int(vectors.nbytes)}
+
+
+def _bench_quantized(work_dir: str, kind: str, vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray,
+                     k: int, rescores: List[int]) -> Dict[str, Any]:
+    from src.core.quantized_index import QuantizedIndex
+
+    start = time.perf_counter()
+    index = QuantizedIndex.create(os.path.join(work_dir, kind), kind, [str(i) for i in range(len(vectors))], vectors)
+    report: Dict[str, Any] = {"build_s": time.perf_counter() - start, "scanned_bytes": index.nbytes()["codes"]}
+
+    for rescore in rescores:
+        found, latencies = [], []
+        for q in queries:
+            start = time.perf_counter()
+            rows, _ = index.search(q[None, :], k, rescore=rescore)[0]
+            latencies.append(time.perf_counter() - start)
+            found.append(rows)
+        report[f"rescore_{rescore}"] = {"recall": _recall(found, truth), "query": percentiles(latencies)}
+    return report
+
+
+def compare(n: int = 50000, dim: int = 384, n_queries: int = 200, k: int = 10,
+            rescores: List[int] = (1, 4, 10, 30, 100), use_store: bool = False) -> Dict[str, Any]:
+    vectors, queries = store_vectors(n_queries) if use_store else synthetic_vectors(n, dim, n_queries)
+    truth = exact_neighbours(vectors, queries, k)
+
+    work_dir = tempfile.mkdtemp(prefix="llamachain-vector-index-")
+    try:
+        report: Dict[str, Any] = {
+            "vectors": len(vectors),
+            "dim": int(vectors.shape[1]),
+            "queries": len(queries),
+            "k": k,
+            "float32_bytes": int(vectors.nbytes),
+        }
+        print("[INFO] Benchmark: chroma")
+        report["chroma"] = _bench_chroma(work_dir, vectors, queries, truth, k)
+        for kind in ("int8", "binary"):
+            print(f"[INFO] Benchmark: {kind}")
+            report[kind] = _bench_quantized(work_dir, kind, vectors, queries, truth, k, list(rescores))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recall and latency of the quantized vector indexes vs Chroma.")
+    parser.add_argument("--vectors", type=int, default=50000, help="synthetic vectors to index")
+    parser.add_argument("--dim", type=int, default=384, help="synthetic vector dimension")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore", default="1,4,10,30,100", help="comma-separated rescore factors to try")
+    parser.add_argument("--store", action="store_true", help="use the configured store's embeddings instead")
+    parser.add_argument("--out", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    report = compare(args.vectors, args.dim, args.queries, args.k,
+                     [int(r) for r in args.rescore.split(",") if r], args.store)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
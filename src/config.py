@@ -1,3 +1,201 @@
-CHROMA_DIR = "./chroma_store"
+import os
+
+# Storage locations can be overridden from the environment (e.g. to benchmark
+# against a throwaway store)
+CHROMA_DIR = os.environ.get("CHROMA_DIR", "./chroma_store")
+CACHE_DIR = os.environ.get("CACHE_DIR", "./cache")
+
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 OLLAMA_MODEL = "llama3.2:3b"
+
+# LLM backend: "ollama" (ChatOllama talking to the Ollama server) or "llamacpp"
+# (a local GGUF loaded in-process with llama-cpp-python). The llama.cpp backend
+# keeps the KV cache of the constant instruction part of the prompt, so each
+# request only prefills its context and question; requests run one at a time.
+# LLAMACPP_THREADS = 0 lets llama.cpp pick.
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "ollama")
+LLM_TEMPERATURE = 0.2
+LLAMACPP_MODEL_PATH = os.environ.get("LLAMACPP_MODEL_PATH", "./models/Llama-3.2-3B-Instruct-Q4_K_L.gguf")
+LLAMACPP_N_CTX = 4096
+LLAMACPP_THREADS = int(os.environ.get("LLAMACPP_THREADS", "0"))
+LLAMACPP_N_BATCH = 512
+LLAMACPP_MAX_TOKENS = 512
+LLAMACPP_CHAT_TEMPLATE = "llama3"  # or "none" to send the prompt as raw text
+
+# Ingestion: number of worker processes used to parse files in parallel
+# (1 = parse in-process, one file at a time), the per-file timeout in seconds,
+# and how many documents are embedded and written to the vector store per call.
+INGEST_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+INGEST_FILE_TIMEOUT = 900
+INGEST_WRITE_BATCH = 256
+
+# Background ingestion jobs (see src/ingestion/jobs.py) are persisted here so
+# unfinished ones resume after a restart; finished jobs beyond INGEST_JOBS_KEEP
+# are forgotten, oldest first.
+INGEST_JOBS_DIR = os.path.join(CACHE_DIR, "jobs")
+INGEST_JOBS_KEEP = 20
+
+# PDF extraction: "hi_res" (Unstructured layout inference on every page), "fast"
+# (PyMuPDF text layer only) or "auto" (PyMuPDF first, hi_res only for pages with
+# fewer than PDF_MIN_TEXT_CHARS of text, a detected table, or images covering at
+# least PDF_MAX_IMAGE_AREA of the page).
+PDF_STRATEGY = "auto"
+PDF_MIN_TEXT_CHARS = 20
+PDF_MAX_IMAGE_AREA = 0.3
+
+# Element cache: hi_res layout-inference output per PDF page, stored as msgpack
+# in SQLite and keyed by page content hash + extractor settings, so re-chunking
+# or rebuilding the index (python -m src.ingestion.rebuild) skips inference.
+ELEMENT_CACHE_ENABLED = True
+ELEMENT_CACHE_PATH = os.path.join(CACHE_DIR, "elements.sqlite3")
+
+# Embedding backend: "torch" (sentence-transformers) or "onnx_int8" (the same
+# model exported to ONNX with int8 dynamic quantization, run with onnxruntime;
+# exported to EMBEDDING_ONNX_DIR on first use). EMBEDDING_THREADS = 0 lets
+# onnxruntime pick; EMBEDDING_MAX_LENGTH matches the model's sequence limit.
+# A store records the model and backend its vectors came from and refuses to
+# open with another one; switching backends needs a fresh CHROMA_DIR.
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_DIR = os.path.join(CACHE_DIR, "onnx", EMBEDDING_MODEL.replace("/", "--"))
+EMBEDDING_THREADS = int(os.environ.get("EMBEDDING_THREADS", "0"))
+EMBEDDING_MAX_LENGTH = 256
+
+# Embedding cache: vectors keyed by model name (+ backend, other than torch) and
+# text hash in a local SQLite file, evicting the least recently used entries
+# beyond EMBEDDING_CACHE_MAX_ENTRIES. EMBEDDING_BATCH_SIZE is the number of texts
+# sent to the model per call.
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_PATH = os.path.join(CACHE_DIR, "embeddings.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = 500_000
+EMBEDDING_BATCH_SIZE = 64
+
+# Retrieval: neighbours fetched per query variant, and optional MMR
+# diversification over the merged candidates (RETRIEVAL_MMR_LAMBDA: 1 = pure
+# relevance, 0 = pure diversity).
+RETRIEVAL_K = 6
+RETRIEVAL_MMR = False
+RETRIEVAL_MMR_LAMBDA = 0.5
+
+# Answer cache: repeated questions (exact after normalisation, or with question
+# embeddings at least ANSWER_CACHE_THRESHOLD cosine-similar) are answered from a
+# SQLite cache kept in the store it answers from (so a switch with use_store
+# starts from that store's cache), cleared whenever the collection changes.
+# Snapshots leave it out.
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_PATH = os.path.join(CHROMA_DIR, "answers.sqlite3")
+ANSWER_CACHE_THRESHOLD = 0.95
+ANSWER_CACHE_MAX_ENTRIES = 1000
+ANSWER_CACHE_TTL = 7 * 24 * 3600  # seconds
+
+# Batch querying (python -m src.rag.batch): concurrent LLM generations, and
+# threads retrieving ahead of generation. Retrieval pauses while BATCH_MAX_READY
+# questions beyond what the two pools can work on are in flight.
+BATCH_CONCURRENCY = 2
+BATCH_RETRIEVAL_WORKERS = 4
+BATCH_MAX_READY = 4
+
+# Hybrid retrieval: a BM25 index kept next to the Chroma store is queried
+# alongside the vectors and the two rankings are merged by reciprocal-rank
+# fusion (score = sum of 1 / (RRF_K + rank)). RETRIEVAL_TOP_N documents are
+# passed on to context building.
+HYBRID_RETRIEVAL = True
+BM25_PATH = os.path.join(CHROMA_DIR, "bm25.sqlite3")
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+RETRIEVAL_TOP_N = 10
+
+# Near-duplicate elimination: documents whose 64-bit SimHash (word 3-shingles)
+# is within DEDUP_MAX_DISTANCE bits of a stored document of the same file are
+# not embedded or stored; they point at that canonical document instead.
+# Matches never cross files, so file filters see every file's own content.
+# Texts under DEDUP_MIN_TOKENS words (slide titles, footers) only match exactly.
+DEDUP_ENABLED = True
+DEDUP_PATH = os.path.join(CHROMA_DIR, "dedup.sqlite3")
+DEDUP_MAX_DISTANCE = 3
+DEDUP_MIN_TOKENS = 8
+
+# Sharding: with SHARD_KEY set to a metadata field ("file_name", "file_type" or
+# "modality"), each value gets its own Chroma collection. Searches only query the
+# shards a filter on that field allows, in parallel on up to SHARD_QUERY_WORKERS
+# threads. Changing SHARD_KEY needs a fresh store (re-ingest the documents).
+SHARD_KEY = os.environ.get("SHARD_KEY", "")
+SHARD_QUERY_WORKERS = 4
+
+# Vector search engine. "chroma" searches the HNSW index; "int8" or "binary"
+# (1 bit per dimension) scan a quantized copy of the embeddings held in
+# memory-mapped arrays under QUANTIZED_INDEX_DIR, then rescore the best
+# QUANTIZED_RESCORE x k candidates (QUANTIZED_BINARY_RESCORE x k for binary)
+# exactly against the float32 vectors. Binary codes rank far more coarsely:
+# on 384-d clustered vectors int8 reaches recall@10 of 1.0 at x4, binary about
+# 0.4 at x10 and 0.8 at x100 (python -m src.bench.vector_index).
+# Chroma stays the store of record; after writes the copy is updated in the
+# background from the logged changes while the previous one keeps serving.
+VECTOR_INDEX = os.environ.get("VECTOR_INDEX", "chroma")
+QUANTIZED_INDEX_DIR = os.path.join(CHROMA_DIR, "quantized")
+QUANTIZED_RESCORE = 10
+QUANTIZED_BINARY_RESCORE = 100
+
+# Snapshots (python -m src.ingestion.snapshot): versioned, checksummed copies of
+# the store's files - Chroma database and HNSW segments, BM25 and dedup
+# indexes, ingest manifest, quantized index - under SNAPSHOT_DIR, keeping the
+# newest SNAPSHOT_KEEP. With STORE_SNAPSHOT set to a snapshot directory or
+# "latest", the app is a read-only replica: a background thread copies the
+# snapshot under REPLICA_DIR and switches to it, and with "latest" checks for
+# newer ones every SNAPSHOT_POLL_S seconds (python -m src.ingestion.snapshot
+# import latest prepares one ahead of time). Each serving process refreshes a
+# pin file for its replica; replicas pinned in the last few polls are kept.
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", "./snapshots")
+SNAPSHOT_KEEP = 3
+STORE_SNAPSHOT = os.environ.get("STORE_SNAPSHOT", "")
+REPLICA_DIR = os.environ.get("REPLICA_DIR", os.path.join(CACHE_DIR, "replicas"))
+SNAPSHOT_POLL_S = 30
+
+# Hierarchical index: at ingest every section (a title and its body, or a
+# standalone table / image) and every file gets a centroid of its chunk vectors.
+# Retrieval then picks the DOCUMENT_TOP_K closest files (0 = all), the
+# SECTION_TOP_K closest sections in them, and searches only those sections'
+# chunks. Stores indexed before sections existed need a rebuild
+# (python -m src.ingestion.rebuild); until every file has sections, and for
+# filters on modality, retrieval stays flat.
+HIERARCHICAL_RETRIEVAL = True
+DOCUMENT_TOP_K = 5
+SECTION_TOP_K = 12
+
+# Context packing: prompt context is limited to CONTEXT_TOKEN_BUDGET tokens of
+# the generation model's tokenizer (characters / 4 if it cannot be loaded), with
+# at most CONTEXT_CHUNK_TOKENS of the most query-relevant sentences per chunk.
+# The tokenizer is a local directory or a hub name already in the local cache;
+# it is never downloaded at query time. The old greedy 5000-character context
+# comes to about 1100-1160 tokens for the top 8-10 chunks, so the budget sits
+# about 30% below it. The tokens saved against that baseline are measured on a
+# CONTEXT_BASELINE_SAMPLE fraction of requests (0 = never), as building and
+# tokenizing the baseline prompt costs as much as the packing itself.
+CONTEXT_TOKENIZER = os.environ.get("CONTEXT_TOKENIZER", "unsloth/Llama-3.2-3B-Instruct")
+CONTEXT_TOKEN_BUDGET = 800
+CONTEXT_CHUNK_TOKENS = 250
+CONTEXT_BASELINE_SAMPLE = 0.05
+
+# Reranking: optionally score the top RERANK_CANDIDATES fused candidates with a
+# small CPU cross-encoder and keep the best RERANK_TOP_N. If scoring is expected
+# to take longer than RERANK_BUDGET_MS, the retrieval order is kept instead;
+# every RERANK_PROBE_EVERY skipped queries, RERANK_PROBE_PAIRS pairs are scored
+# to re-measure the cost, so one slow call does not disable reranking for good.
+RERANK_ENABLED = False
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_CANDIDATES = 30
+RERANK_TOP_N = 6
+RERANK_BATCH_SIZE = 32
+RERANK_BUDGET_MS = 800
+RERANK_CACHE_SIZE = 10_000
+RERANK_PROBE_EVERY = 20
+RERANK_PROBE_PAIRS = 4
+
+# Metrics: percentiles are computed over the last METRICS_WINDOW samples per
+# span; set METRICS_JSONL_PATH to also log every span as a JSON line. Lines are
+# buffered and appended every METRICS_JSONL_FLUSH_S seconds, or sooner once
+# METRICS_JSONL_BUFFER of them are waiting.
+METRICS_WINDOW = 1000
+METRICS_JSONL_PATH = os.environ.get("METRICS_JSONL_PATH")
+METRICS_JSONL_FLUSH_S = 2.0
+METRICS_JSONL_BUFFER = 512
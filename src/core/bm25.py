@@ -0,0 +1,188 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from src.config import BM25_B, BM25_K1, BM25_PATH
+from src.core.store import store_path
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this "
+    "to was were what which who will with how do does did can".split()
+)
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens without stopwords, with plural 's' stripped."""
+    tokens = []
+    for tok in _TOKEN_RE.findall(text.lower()):
+        if tok in _STOPWORDS:
+            continue
+        if len(tok) > 3 and tok.endswith("s") and not tok.endswith("ss"):
+            tok = tok[:-1]
+        tokens.append(tok)
+    return tokens
+
+
+class BM25Index:
+    """
+    Persistent BM25 inverted index in SQLite, kept in sync with the vector
+    collection: documents are added and deleted by the same IDs.
+    """
+
+    def __init__(self, path: str = BM25_PATH, k1: float = BM25_K1, b: float = BM25_B):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                doc_id TEXT PRIMARY KEY, file_name TEXT, length INTEGER NOT NULL,
+                content TEXT NOT NULL, metadata TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS docs_file ON docs(file_name);
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL, doc_id TEXT NOT NULL, tf INTEGER NOT NULL,
+                PRIMARY KEY (term, doc_id)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_doc ON postings(doc_id);
+            """
+        )
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def _delete_locked(self, ids: List[str]) -> None:
+        for start in range(0, len(ids), _SQL_BATCH):
+            batch = ids[start:start + _SQL_BATCH]
+            marks = ",".join("?" * len(batch))
+            self._conn.execute(f"DELETE FROM postings WHERE doc_id IN ({marks})", batch)
+            self._conn.execute(f"DELETE FROM docs WHERE doc_id IN ({marks})", batch)
+
+    def add(self, ids: List[str], docs: List[Document]) -> None:
+        """Index (or re-index) documents under the given IDs."""
+        with self._lock:
+            self._delete_locked(ids)
+            for doc_id, doc in zip(ids, docs):
+                tf = Counter(tokenize(doc.page_content))
+                meta = doc.metadata or {}
+                self._conn.execute(
+                    "INSERT INTO docs (doc_id, file_name, length, content, metadata) VALUES (?, ?, ?, ?, ?)",
+                    (doc_id, meta.get("file_name"), sum(tf.values()), doc.page_content, json.dumps(meta)),
+                )
+                self._conn.executemany(
+                    "INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                    [(term, doc_id, n) for term, n in tf.items()],
+                )
+            self._conn.commit()
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock:
+            self._delete_locked(ids)
+            self._conn.commit()
+
+    def delete_file(self, file_name: str) -> None:
+        with self._lock:
+            ids = [r[0] for r in self._conn.execute("SELECT doc_id FROM docs WHERE file_name = ?", (file_name,))]
+            self._delete_locked(ids)
+            self._conn.commit()
+
+    def file_names(self) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute(
+                "SELECT DISTINCT file_name FROM docs WHERE file_name IS NOT NULL ORDER BY file_name"
+            )]
+
+    def search(
+        self, query: str, k: int, filters: Optional[Dict[str, List[Any]]] = None
+    ) -> List[Tuple[Document, float]]:
+        """
+        Top-k documents by BM25 score, best first. `filters` maps metadata keys
+        to allowed values; collection statistics (IDF, average length) stay global.
+        Scoring, filtering and ranking run in SQLite, so only the top k leave it.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        where, params = "", []
+        for key, values in (filters or {}).items():
+            if not values:
+                continue
+            marks = ",".join("?" * len(values))
+            if key == "file_name":
+                where += f" AND d.file_name IN ({marks})"
+            else:
+                where += f" AND json_extract(d.metadata, ?) IN ({marks})"
+                params.append(f'$."{key}"')
+            params.extend(values)
+
+        with self._lock:
+            n_docs, total_length = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs"
+            ).fetchone()
+            if not n_docs:
+                return []
+            avg_length = total_length / n_docs
+
+            df = dict(self._conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE term IN ({','.join('?' * len(terms))}) GROUP BY term",
+                terms,
+            ).fetchall())
+            if not df:
+                return []
+            # score = sum over terms of weight * tf / (tf + k1 * (1 - b + b * length / avg_length))
+            weights = [
+                (term, math.log(1 + (n_docs - n + 0.5) / (n + 0.5)) * (self.k1 + 1))
+                for term, n in df.items()
+            ]
+            rows = self._conn.execute(
+                f"WITH q(term, weight) AS (VALUES {', '.join(['(?, ?)'] * len(weights))}),"
+                " top AS ("
+                "  SELECT p.doc_id, SUM(q.weight * p.tf / (p.tf + ? + ? * d.length)) AS score"
+                "  FROM q JOIN postings p ON p.term = q.term JOIN docs d ON d.doc_id = p.doc_id"
+                f"  WHERE 1 = 1{where} GROUP BY p.doc_id ORDER BY score DESC LIMIT ?)"
+                " SELECT top.doc_id, top.score, d.content, d.metadata"
+                " FROM top JOIN docs d ON d.doc_id = top.doc_id ORDER BY top.score DESC",
+                [value for pair in weights for value in pair]
+                + [self.k1 * (1 - self.b), self.k1 * self.b / avg_length]
+                + params
+                + [k],
+            ).fetchall()
+
+        results = []
+        for doc_id, score, content, metadata in rows:
+            meta = json.loads(metadata)
+            meta.setdefault("chunk_id", doc_id)
+            results.append((Document(page_content=content, metadata=meta), score))
+        return results
+
+
+_index: Optional[BM25Index] = None
+_index_lock = threading.Lock()
+
+
+def get_lexical_index() -> BM25Index:
+    """Process-wide BM25 index of the active store, opened on first use."""
+    global _index
+    path = store_path(BM25_PATH)
+    if _index is None or _index.path != path:
+        with _index_lock:
+            if _index is None or _index.path != path:
+                _index = BM25Index(path)
+    return _index
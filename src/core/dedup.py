@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.config import DEDUP_MAX_DISTANCE, DEDUP_MIN_TOKENS, DEDUP_PATH
+from src.core.store import store_path
+
+_WORD_RE = re.compile(r"\w+")
+
+# 64-bit signatures split into 4 bands of 16 bits: two signatures within
+# DEDUP_MAX_DISTANCE (< 4) bits of each other agree on at least one band
+_BANDS = 4
+_BAND_BITS = 16
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+def simhash(text: str) -> Tuple[int, int]:
+    """
+    64-bit SimHash over word 3-shingles of the lower-cased text. Returns the
+    signature and the number of words it was built from.
+    """
+    words = _WORD_RE.findall(text.lower())
+    shingles = [" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))]
+    digests = b"".join(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest() for s in shingles)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(len(shingles), 8), axis=1)
+    votes = bits.sum(axis=0) * 2 > len(shingles)
+    return int("".join("1" if v else "0" for v in votes), 2), len(words)
+
+
+def _signed(value: int) -> int:
+    """SQLite integers are signed 64-bit."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _bands(signature: int) -> List[int]:
+    mask = (1 << _BAND_BITS) - 1
+    return [(signature >> (i * _BAND_BITS)) & mask for i in range(_BANDS)]
+
+
+class NearDuplicateIndex:
+    """
+    Persistent SimHash signatures of every written document, kept next to the
+    vector store. A document within `max_distance` bits of an already stored
+    one of the same file is not written: it is recorded as a duplicate of that
+    canonical document (with its own content, so it can take over if the
+    canonical one is deleted). Documents of different files never match, so
+    every file keeps its own copy for file filters. Texts shorter than
+    `min_tokens` words only match exactly.
+    """
+
+    def __init__(self, path: str = DEDUP_PATH, max_distance: int = DEDUP_MAX_DISTANCE,
+                 min_tokens: int = DEDUP_MIN_TOKENS):
+        self.path = path
+        self.max_distance = max_distance
+        self.min_tokens = min_tokens
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS signatures (
+                doc_id TEXT PRIMARY KEY, file_name TEXT, simhash INTEGER NOT NULL,
+                short INTEGER NOT NULL, b0 INTEGER, b1 INTEGER, b2 INTEGER, b3 INTEGER,
+                canonical_id TEXT, document TEXT);
+            CREATE INDEX IF NOT EXISTS signatures_b0 ON signatures(b0);
+            CREATE INDEX IF NOT EXISTS signatures_b1 ON signatures(b1);
+            CREATE INDEX IF NOT EXISTS signatures_b2 ON signatures(b2);
+            CREATE INDEX IF NOT EXISTS signatures_b3 ON signatures(b3);
+            CREATE INDEX IF NOT EXISTS signatures_canonical ON signatures(canonical_id);
+            CREATE INDEX IF NOT EXISTS signatures_file ON signatures(file_name);
+            """
+        )
+        self._conn.commit()
+
+    def _find_canonical(self, signature: int, short: bool, file_name: Optional[str]) -> Optional[str]:
+        if short:
+            row = self._conn.execute(
+                "SELECT doc_id FROM signatures WHERE canonical_id IS NULL AND short = 1 AND simhash = ?"
+                " AND file_name IS ? LIMIT 1",
+                (_signed(signature), file_name),
+            ).fetchone()
+            return row[0] if row else None
+
+        bands = _bands(signature)
+        rows = self._conn.execute(
+            "SELECT doc_id, simhash FROM signatures WHERE canonical_id IS NULL AND short = 0"
+            " AND file_name IS ? AND (b0 = ? OR b1 = ? OR b2 = ? OR b3 = ?)",
+            (file_name, *bands),
+        ).fetchall()
+        best = None
+        for doc_id, other in rows:
+            distance = bin((other & ((1 << 64) - 1)) ^ signature).count("1")
+            if distance <= self.max_distance and (best is None or distance < best[1]):
+                best = (doc_id, distance)
+        return best[0] if best else None
+
+    def filter_new(self, docs: List[Document]) -> Tuple[List[Document], List[str]]:
+        """
+        Record `docs` and return the ones to write (new canonical documents and
+        ones already stored; near-duplicates are recorded and left out) plus the
+        IDs recorded by this call, to pass to discard() if the write fails.
+        """
+        keep, recorded = [], []
+        with self._lock:
+            for d in docs:
+                doc_id = d.metadata.get("chunk_id")
+                if not doc_id:
+                    keep.append(d)
+                    continue
+                row = self._conn.execute(
+                    "SELECT canonical_id FROM signatures WHERE doc_id = ?", (doc_id,)
+                ).fetchone()
+                if row is not None:
+                    if row[0] is None:
+                        keep.append(d)
+                    continue
+
+                signature, n_words = simhash(d.page_content)
+                short = n_words < self.min_tokens
+                canonical = self._find_canonical(signature, short, d.metadata.get("file_name"))
+                self._conn.execute(
+                    "INSERT INTO signatures (doc_id, file_name, simhash, short, b0, b1, b2, b3, canonical_id, document)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (doc_id, d.metadata.get("file_name"), _signed(signature), int(short), *_bands(signature),
+                     canonical,
+                     json.dumps({"page_content": d.page_content, "metadata": d.metadata}) if canonical else None),
+                )
+                recorded.append(doc_id)
+                if canonical is None:
+                    keep.append(d)
+            self._conn.commit()
+        return keep, recorded
+
+    def discard(self, ids: List[str]) -> None:
+        """
+        Undo filter_new for `ids`, e.g. because writing them failed. Unlike
+        remove() nothing is promoted: the IDs were never stored.
+        """
+        with self._lock:
+            for start in range(0, len(ids), _SQL_BATCH):
+                batch = ids[start:start + _SQL_BATCH]
+                self._conn.execute(f"DELETE FROM signatures WHERE doc_id IN ({','.join('?' * len(batch))})", batch)
+            self._conn.commit()
+
+    def remove(self, ids: List[str]) -> List[Document]:
+        """
+        Forget `ids`. For each removed canonical document that still has
+        duplicates, one of them becomes canonical; those documents are returned
+        and must be written to the store.
+        """
+        promoted: List[Document] = []
+        with self._lock:
+            removed_canonicals = []
+            for start in range(0, len(ids), _SQL_BATCH):
+                batch = ids[start:start + _SQL_BATCH]
+                marks = ",".join("?" * len(batch))
+                removed_canonicals += [r[0] for r in self._conn.execute(
+                    f"SELECT doc_id FROM signatures WHERE canonical_id IS NULL AND doc_id IN ({marks})", batch
+                )]
+                self._conn.execute(f"DELETE FROM signatures WHERE doc_id IN ({marks})", batch)
+
+            for old_id in removed_canonicals:
+                rows = self._conn.execute(
+                    "SELECT doc_id, document FROM signatures WHERE canonical_id = ? ORDER BY doc_id", (old_id,)
+                ).fetchall()
+                if not rows:
+                    continue
+                new_id, document = rows[0]
+                self._conn.execute(
+                    "UPDATE signatures SET canonical_id = NULL, document = NULL WHERE doc_id = ?", (new_id,)
+                )
+                self._conn.execute(
+                    "UPDATE signatures SET canonical_id = ? WHERE canonical_id = ?", (new_id, old_id)
+                )
+                promoted.append(Document(**json.loads(document)))
+            self._conn.commit()
+        return promoted
+
+    def remove_file(self, file_name: str) -> List[Document]:
+        with self._lock:
+            ids = [r[0] for r in self._conn.execute(
+                "SELECT doc_id FROM signatures WHERE file_name = ?", (file_name,)
+            )]
+        return self.remove(ids)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            total, duplicates = self._conn.execute(
+                "SELECT COUNT(*), COUNT(canonical_id) FROM signatures"
+            ).fetchone()
+        return {"documents": total, "duplicates": duplicates}
+
+
+_index: Optional[NearDuplicateIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_dedup_index() -> NearDuplicateIndex:
+    """Process-wide near-duplicate index of the active store, opened on first use."""
+    global _index
+    path = store_path(DEDUP_PATH)
+    if _index is None or _index.path != path:
+        with _index_lock:
+            if _index is None or _index.path != path:
+                _index = NearDuplicateIndex(path)
+    return _index
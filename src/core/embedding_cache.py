@@ -0,0 +1,158 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from src.config import (
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_PATH,
+)
+from src.core.metrics import incr, span
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper backed by an on-disk SQLite cache.
+
+    Vectors are stored as float32 blobs keyed by sha256(model name + text), so
+    identical text is embedded once per model no matter how often it is ingested.
+    Lookups and misses are batched, the least recently used entries are evicted
+    beyond `max_entries`, and hits and misses are counted.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        model_name: str,
+        path: str = EMBEDDING_CACHE_PATH,
+        max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+    ):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings(last_used)")
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _key(self, text: str, kind: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\x1f{kind}\x1f{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for start in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[start:start + _LOOKUP_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+        return found
+
+    def _store(self, items: Dict[str, List[float]]) -> None:
+        now = time.time()
+        with self._lock:
+            cur = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, array("f", vec).tobytes(), now) for key, vec in items.items()],
+            )
+            self._size += max(cur.rowcount, 0)
+            if self._size > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (self._size - self.max_entries,),
+                )
+                self._size = self.max_entries
+            self._conn.commit()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed_many(texts, "doc")
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        embed_query for many texts, sharing its cache entries but computing the
+        missing ones in batches. The backends embed a query exactly like a
+        document (HuggingFaceEmbeddings, OnnxEmbeddings).
+        """
+        return self._embed_many(texts, "query")
+
+    def _embed_many(self, texts: List[str], kind: str) -> List[List[float]]:
+        keys = [self._key(t, kind) for t in texts]
+        cached = self._lookup(list(dict.fromkeys(keys)))
+
+        # Each distinct missing text is embedded once, in batches
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+
+        hits = len(texts) - sum(1 for k in keys if k not in cached)
+        self.hits += hits
+        self.misses += len(missing)
+        incr("embed.cache_hits", hits)
+        incr("embed.cache_misses", len(missing))
+
+        missing_keys = list(missing)
+        for start in range(0, len(missing_keys), self.batch_size):
+            batch = missing_keys[start:start + self.batch_size]
+            with span("embed.compute"):
+                vectors = self.underlying.embed_documents([missing[k] for k in batch])
+            computed = dict(zip(batch, vectors))
+            self._store(computed)
+            cached.update(computed)
+
+        return [cached[k] for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text, "query")
+        cached = self._lookup([key])
+        if key in cached:
+            self.hits += 1
+            incr("embed.cache_hits")
+            return cached[key]
+
+        self.misses += 1
+        incr("embed.cache_misses")
+        with span("embed.compute"):
+            vector = self.underlying.embed_query(text)
+        self._store({key: vector})
+        return vector
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else None,
+            "entries": self._size,
+        }
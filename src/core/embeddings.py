@@ -1,5 +1,53 @@
+import threading
+
 from langchain_community.embeddings import HuggingFaceEmbeddings
-from src.config import EMBEDDING_MODEL
+from src.config import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_MODEL,
+)
+from src.core.embedding_cache import CachedEmbeddings
+
+_embeddings = None
+_lock = threading.Lock()
+
+
+def load_backend(backend: str = EMBEDDING_BACKEND):
+    """The raw (uncached) embedding model for `backend`: "torch" or "onnx_int8"."""
+    if backend == "torch":
+        return HuggingFaceEmbeddings(
+            model_name=EMBEDDING_MODEL,
+            encode_kwargs={"batch_size": EMBEDDING_BATCH_SIZE},
+        )
+    if backend == "onnx_int8":
+        from src.core.onnx_embeddings import OnnxEmbeddings
+
+        return OnnxEmbeddings()
+    raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r}; expected 'torch' or 'onnx_int8'")
+
+
+def embedding_id(backend: str = EMBEDDING_BACKEND) -> str:
+    """
+    Identity of the vectors `backend` produces. Backends give slightly different
+    vectors, so they must not share cache entries or collections; the torch id
+    is the bare model name to keep existing caches valid.
+    """
+    return EMBEDDING_MODEL if backend == "torch" else f"{EMBEDDING_MODEL}@{backend}"
+
+
+def _load_embeddings():
+    embeddings = load_backend(EMBEDDING_BACKEND)
+    if EMBEDDING_CACHE_ENABLED:
+        return CachedEmbeddings(embeddings, embedding_id())
+    return embeddings
+
 
 def get_embeddings():
-    return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    """Process-wide embedding model, loaded on first use."""
+    global _embeddings
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                _embeddings = _load_embeddings()
+    return _embeddings
@@ -0,0 +1,149 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.core.metrics import span
+from src.core.vectorstore import (
+    COLLECTION_NAME,
+    collection_version,
+    filters_to_where,
+    get_shard,
+    get_vectorstore,
+    indexed_files,
+    shard_names,
+    writing,
+)
+
+SECTIONS_COLLECTION = f"{COLLECTION_NAME}__sections"
+DOCUMENTS_COLLECTION = f"{COLLECTION_NAME}__documents"
+
+# Section and document vectors are centroids, compared by angle
+_SPACE = {"hnsw:space": "cosine"}
+
+# Metadata that section and document entries carry, so filters on it apply there too
+_LEVEL_KEYS = ("file_name", "file_type")
+
+
+# (collection version, whether every indexed file has a document entry)
+_complete = (None, False)
+
+
+def _collection(name: str):
+    return get_vectorstore()._client.get_or_create_collection(name, metadata=_SPACE)
+
+
+def _centroid(vectors: List) -> List[float]:
+    mean = np.mean(np.asarray(vectors, dtype=np.float32), axis=0)
+    norm = np.linalg.norm(mean)
+    return (mean / norm if norm else mean).tolist()
+
+
+def update_file(file_name: str) -> int:
+    """
+    Recompute the section and document vectors of `file_name` from its stored
+    chunks and drop entries that no longer exist. Returns the number of sections.
+    """
+    sections: Dict[str, dict] = {}
+    for name in shard_names({"file_name": [file_name]}):
+        res = get_shard(name)._collection.get(where={"file_name": file_name}, include=["embeddings", "metadatas"])
+        for embedding, meta in zip(res["embeddings"], res["metadatas"]):
+            meta = meta or {}
+            section_id = meta.get("section_id")
+            if not section_id:
+                continue
+            entry = sections.setdefault(section_id, {"vectors": [], "meta": meta})
+            entry["vectors"].append(embedding)
+            if (meta.get("page_number") or 0) < (entry["meta"].get("page_number") or 0):
+                entry["meta"] = meta
+
+    section_col = _collection(SECTIONS_COLLECTION)
+    document_col = _collection(DOCUMENTS_COLLECTION)
+    with writing(), span("hierarchy.update"):
+        old = set(section_col.get(where={"file_name": file_name}, include=[])["ids"])
+        stale = list(old - set(sections))
+        if stale:
+            section_col.delete(ids=stale)
+
+        if not sections:
+            document_col.delete(ids=[file_name])
+            return 0
+
+        ids = list(sections)
+        centroids = [_centroid(sections[i]["vectors"]) for i in ids]
+        section_col.upsert(
+            ids=ids,
+            embeddings=centroids,
+            metadatas=[
+                {
+                    "file_name": file_name,
+                    "file_type": sections[i]["meta"].get("file_type") or "",
+                    "section_title": sections[i]["meta"].get("section_title") or "",
+                    "page_number": sections[i]["meta"].get("page_number") or 0,
+                    "chunks": len(sections[i]["vectors"]),
+                }
+                for i in ids
+            ],
+        )
+        document_col.upsert(
+            ids=[file_name],
+            embeddings=[_centroid([v for s in sections.values() for v in s["vectors"]])],
+            metadatas=[{"file_name": file_name, "file_type": sections[ids[0]]["meta"].get("file_type") or "",
+                        "sections": len(ids)}],
+        )
+    return len(ids)
+
+
+def _query_ids(name: str, vectors: List[List[float]], k: int, filters: Optional[Dict[str, List[Any]]]) -> List[str]:
+    """IDs of the k nearest entries per query vector, merged in rank order."""
+    collection = _collection(name)
+    count = collection.count()
+    if not count:
+        return []
+    res = collection.query(
+        query_embeddings=vectors,
+        n_results=min(k, count),
+        where=filters_to_where({key: v for key, v in (filters or {}).items() if key in _LEVEL_KEYS}),
+        include=[],
+    )
+    # Interleave so every query variant contributes its best entries first
+    merged = {}
+    for rank in range(max((len(ids) for ids in res["ids"]), default=0)):
+        for ids in res["ids"]:
+            if rank < len(ids):
+                merged.setdefault(ids[rank], None)
+    return list(merged)
+
+
+def is_complete() -> bool:
+    """True once every indexed file has hierarchy entries (e.g. after a rebuild)."""
+    global _complete
+    version = collection_version()
+    if _complete[0] != version:
+        documents = set(_collection(DOCUMENTS_COLLECTION).get(include=[])["ids"])
+        _complete = (version, set(indexed_files()) <= documents)
+    return _complete[1]
+
+
+def top_sections(
+    vectors: List[List[float]],
+    k: int,
+    document_k: int = 0,
+    filters: Optional[Dict[str, List[Any]]] = None,
+) -> List[str]:
+    """
+    Section IDs to search for the query vectors: the `k` closest sections per
+    query, within the `document_k` closest files when that is set. Empty (search
+    everything) until every indexed file has hierarchy entries, or when filters
+    on other metadata than _LEVEL_KEYS (e.g. modality) are set, as sections
+    cannot apply those.
+    """
+    if any(values for key, values in (filters or {}).items() if key not in _LEVEL_KEYS):
+        return []
+    if not is_complete():
+        return []
+    filters = dict(filters or {})
+    if document_k:
+        files = _query_ids(DOCUMENTS_COLLECTION, vectors, document_k, filters)
+        if len(files) >= document_k:
+            filters["file_name"] = files
+    return _query_ids(SECTIONS_COLLECTION, vectors, k, filters)
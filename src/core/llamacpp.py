@@ -0,0 +1,178 @@
+import queue
+import threading
+import time
+from typing import Iterator, List, Optional
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from src.config import (
+    LLAMACPP_CHAT_TEMPLATE,
+    LLAMACPP_MAX_TOKENS,
+    LLAMACPP_MODEL_PATH,
+    LLAMACPP_N_BATCH,
+    LLAMACPP_N_CTX,
+    LLAMACPP_THREADS,
+    LLM_TEMPERATURE,
+)
+from src.core.metrics import incr, observe
+
+# Text placed before and after the user prompt: (head, tail, stop strings)
+_TEMPLATES = {
+    "llama3": (
+        "<|begin_of_text|><|start_header_id|>user<|end_header_id|>\n\n",
+        "<|eot_id|><|start_header_id|>assistant<|end_header_id|>\n\n",
+        ["<|eot_id|>"],
+    ),
+    "none": ("", "", []),
+}
+
+_DONE = object()
+
+
+class LlamaCppChat:
+    """
+    In-process llama.cpp model with the same invoke / stream interface as
+    ChatOllama (messages with `.content`).
+
+    One worker thread owns the model and serves requests in arrival order, so
+    concurrent sessions queue instead of interleaving on the same KV cache.
+    After `cache_prefix`, the KV state of that text is kept: a prompt starting
+    with it only needs its remainder prefilled (llama.cpp reuses the longest
+    matching token prefix, and the saved state is restored if a previous
+    request left something else in the cache).
+    """
+
+    def __init__(
+        self,
+        model_path: str = LLAMACPP_MODEL_PATH,
+        n_ctx: int = LLAMACPP_N_CTX,
+        n_threads: int = LLAMACPP_THREADS,
+        n_batch: int = LLAMACPP_N_BATCH,
+        max_tokens: int = LLAMACPP_MAX_TOKENS,
+        temperature: float = LLM_TEMPERATURE,
+        template: str = LLAMACPP_CHAT_TEMPLATE,
+    ):
+        from llama_cpp import Llama
+
+        self._llama = Llama(
+            model_path=model_path,
+            n_ctx=n_ctx,
+            n_threads=n_threads or None,
+            n_batch=n_batch,
+            verbose=False,
+        )
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self._head, self._tail, self._stop = _TEMPLATES[template]
+
+        self._prefix_text: Optional[str] = None
+        self._prefix_tokens: List[int] = []
+        self._prefix_state = None
+
+        self._requests: "queue.Queue[tuple]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="llamacpp", daemon=True)
+        self._worker.start()
+
+    def _tokenize(self, text: str, head: bool = False, tail: bool = False) -> List[int]:
+        """
+        Tokens of `text`, preceded by the template head and / or followed by its
+        tail. Only the template may produce special tokens: retrieved and user
+        text is tokenized as plain text, so a "<|eot_id|>" in a document cannot
+        end the turn.
+        """
+        encode = lambda s, special, bos=False: self._llama.tokenize(s.encode("utf-8"), add_bos=bos, special=special)
+        tokens: List[int] = []
+        if head and self._head:
+            # Chat templates start with their own BOS token
+            tokens += encode(self._head, True)
+        if text or (head and not self._head):
+            tokens += encode(text, False, bos=head and not self._head)
+        if tail and self._tail:
+            tokens += encode(self._tail, True)
+        return tokens
+
+    # ----- worker thread -----
+
+    def _run(self) -> None:
+        while True:
+            kind, args, out = self._requests.get()
+            try:
+                if kind == "prefix":
+                    self._prefill(*args)
+                    out.put(_DONE)
+                else:
+                    self._generate(*args, out)
+            except Exception as e:
+                out.put(e)
+
+    def _prefill(self, prefix: str) -> None:
+        if prefix == self._prefix_text:
+            return
+        start = time.perf_counter()
+        tokens = self._tokenize(prefix, head=True)
+        self._llama.reset()
+        self._llama.eval(tokens)
+        self._prefix_state = self._llama.save_state()
+        self._prefix_text, self._prefix_tokens = prefix, tokens
+        observe("llm.prefix_prefill", time.perf_counter() - start)
+        print(f"[INFO] llama.cpp: cached {len(tokens)} prompt prefix tokens in {time.perf_counter() - start:.2f}s")
+
+    def _prompt_tokens(self, prompt: str) -> List[int]:
+        if self._prefix_text and prompt.startswith(self._prefix_text):
+            rest = self._tokenize(prompt[len(self._prefix_text):], tail=True)
+            n = len(self._prefix_tokens)
+            if list(self._llama._input_ids[:n]) != self._prefix_tokens:
+                # The cache holds something else: restore the prefix state
+                self._llama.load_state(self._prefix_state)
+            incr("llm.prefix_tokens_reused", n)
+            return self._prefix_tokens + rest
+        return self._tokenize(prompt, head=True, tail=True)
+
+    def _generate(self, prompt: str, submitted: float, cancelled: threading.Event, out: "queue.Queue") -> None:
+        observe("llm.queue_wait", time.perf_counter() - submitted)
+        tokens = self._prompt_tokens(prompt)
+        incr("llm.prompt_tokens", len(tokens))
+        for part in self._llama.create_completion(
+            prompt=tokens,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            stop=self._stop,
+            stream=True,
+        ):
+            if cancelled.is_set():
+                break
+            text = part["choices"][0]["text"]
+            if text:
+                out.put(text)
+        out.put(_DONE)
+
+    # ----- public API -----
+
+    def cache_prefix(self, prefix: str) -> None:
+        """Prefill `prefix` once and keep its KV state; blocks until done."""
+        if prefix == self._prefix_text:
+            return
+        done: "queue.Queue" = queue.Queue()
+        self._requests.put(("prefix", (prefix,), done))
+        result = done.get()
+        if isinstance(result, Exception):
+            raise result
+
+    def stream(self, prompt: str) -> Iterator[AIMessageChunk]:
+        out: "queue.Queue" = queue.Queue()
+        cancelled = threading.Event()
+        self._requests.put(("generate", (prompt, time.perf_counter(), cancelled), out))
+        try:
+            while True:
+                item = out.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield AIMessageChunk(content=item)
+        finally:
+            # Stop generating if the caller stopped reading
+            cancelled.set()
+
+    def invoke(self, prompt: str) -> AIMessage:
+        return AIMessage(content="".join(chunk.content for chunk in self.stream(prompt)))
@@ -1,13 +1,30 @@
+import threading
+
 from langchain_ollama import ChatOllama
-from src.config import OLLAMA_MODEL
+from src.config import LLM_BACKEND, LLM_TEMPERATURE, OLLAMA_MODEL
 
 _llm = None
+_lock = threading.Lock()
+
+
+def _load_llm():
+    if LLM_BACKEND == "llamacpp":
+        from src.core.llamacpp import LlamaCppChat
+
+        return LlamaCppChat()
+    if LLM_BACKEND == "ollama":
+        return ChatOllama(
+            model=OLLAMA_MODEL,
+            temperature=LLM_TEMPERATURE,
+        )
+    raise ValueError(f"Unknown LLM_BACKEND {LLM_BACKEND!r}; expected 'ollama' or 'llamacpp'")
+
 
 def get_llm():
+    """Process-wide LLM client (or in-process model), created on first use."""
     global _llm
     if _llm is None:
-        _llm = ChatOllama(
-            model=OLLAMA_MODEL,
-            temperature=0.2,
-        )
+        with _lock:
+            if _llm is None:
+                _llm = _load_llm()
     return _llm
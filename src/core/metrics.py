@@ -0,0 +1,158 @@
+"""
+Lightweight in-process metrics: timing spans, counters and exporters.
+
+    with span("rag.retrieve"):
+        ...
+    incr("embed.cache_hits", 12)
+
+Spans are aggregated into histograms (with a window of recent samples for
+percentiles) and can be exported as Prometheus text or plain data. If
+METRICS_JSONL_PATH is set, every span is also logged there as a JSON line;
+lines are buffered and written by a background thread (and at exit), never
+while holding the metrics lock.
+"""
+
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from src.config import METRICS_JSONL_BUFFER, METRICS_JSONL_FLUSH_S, METRICS_JSONL_PATH, METRICS_WINDOW
+
+# Histogram bucket upper bounds in seconds
+_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+_lock = threading.Lock()
+_histograms: Dict[str, dict] = {}
+_counters: Dict[str, float] = {}
+
+# JSON lines waiting to be appended to METRICS_JSONL_PATH (deque appends are thread-safe)
+_pending: deque = deque()
+_file_lock = threading.Lock()
+_flusher: Optional[threading.Thread] = None
+
+
+def _new_histogram() -> dict:
+    return {"count": 0, "sum": 0.0, "buckets": [0] * len(_BUCKETS), "recent": deque(maxlen=METRICS_WINDOW)}
+
+
+def observe(name: str, seconds: float, **labels: Any) -> None:
+    """Record one duration for `name`."""
+    with _lock:
+        h = _histograms.get(name)
+        if h is None:
+            h = _histograms[name] = _new_histogram()
+        h["count"] += 1
+        h["sum"] += seconds
+        i = bisect.bisect_left(_BUCKETS, seconds)
+        if i < len(_BUCKETS):
+            h["buckets"][i] += 1
+        h["recent"].append(seconds)
+
+    if METRICS_JSONL_PATH:
+        record = {"ts": time.time(), "span": name, "duration_s": seconds, **labels}
+        _pending.append(json.dumps(record, default=str) + "\n")
+        if _flusher is None:
+            _start_flusher()
+        if len(_pending) >= METRICS_JSONL_BUFFER:
+            flush()
+
+
+def flush() -> None:
+    """Append the buffered span lines to METRICS_JSONL_PATH."""
+    if not METRICS_JSONL_PATH:
+        return
+    with _file_lock:
+        lines = []
+        while _pending:
+            lines.append(_pending.popleft())
+        if lines:
+            os.makedirs(os.path.dirname(METRICS_JSONL_PATH) or ".", exist_ok=True)
+            with open(METRICS_JSONL_PATH, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+
+
+def _flush_periodically() -> None:
+    while True:
+        time.sleep(METRICS_JSONL_FLUSH_S)
+        try:
+            flush()
+        except OSError as e:
+            print(f"[WARN] Writing metrics to {METRICS_JSONL_PATH} failed: {e}")
+
+
+def _start_flusher() -> None:
+    global _flusher
+    with _file_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_periodically, name="metrics-flush", daemon=True)
+            _flusher.start()
+            atexit.register(flush)
+
+
+@contextmanager
+def span(name: str, **labels: Any) -> Iterator[None]:
+    """Time the enclosed block as one observation of `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def incr(name: str, value: float = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def _percentile(ordered, pct: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def snapshot() -> Dict[str, Any]:
+    """Current metrics as plain data; span percentiles cover the recent window."""
+    with _lock:
+        spans = {}
+        for name, h in sorted(_histograms.items()):
+            ordered = sorted(h["recent"])
+            spans[name] = {
+                "count": h["count"],
+                "total_s": h["sum"],
+                "mean_s": h["sum"] / h["count"] if h["count"] else None,
+                "p50_s": _percentile(ordered, 50),
+                "p95_s": _percentile(ordered, 95),
+                "p99_s": _percentile(ordered, 99),
+            }
+        return {"timestamp": time.time(), "spans": spans, "counters": dict(sorted(_counters.items()))}
+
+
+def _prom_name(name: str) -> str:
+    return "llamachain_" + "".join(c if c.isalnum() else "_" for c in name)
+
+
+def export_prometheus() -> str:
+    """Metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        for name, h in sorted(_histograms.items()):
+            metric = _prom_name(name) + "_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, n in zip(_BUCKETS, h["buckets"]):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {h["count"]}')
+            lines.append(f"{metric}_sum {h['sum']}")
+            lines.append(f"{metric}_count {h['count']}")
+        for name, value in sorted(_counters.items()):
+            metric = _prom_name(name) + "_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
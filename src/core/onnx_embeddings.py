@@ -0,0 +1,125 @@
+import os
+import threading
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.config import (
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MAX_LENGTH,
+    EMBEDDING_MODEL,
+    EMBEDDING_ONNX_DIR,
+    EMBEDDING_THREADS,
+)
+
+_MODEL_FILE = "model_int8.onnx"
+_TOKENIZER_FILE = "tokenizer.json"
+
+
+def export_onnx_int8(model_name: str = EMBEDDING_MODEL, out_dir: str = EMBEDDING_ONNX_DIR) -> str:
+    """
+    Export a Hugging Face encoder to ONNX and quantize its weights to int8
+    (dynamic quantization: activations stay float and are quantized per batch).
+    Needs torch and transformers; inference afterwards only needs onnxruntime
+    and tokenizers. Returns the path of the quantized model.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+
+    sample = tokenizer(["an example sentence to trace the graph"], return_tensors="pt")
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[n] for n in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                **{n: {0: "batch", 1: "sequence"} for n in input_names},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=14,
+        )
+
+    out_path = os.path.join(out_dir, _MODEL_FILE)
+    quantize_dynamic(fp32_path, out_path, weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    tokenizer.save_pretrained(out_dir)
+    print(f"[INFO] Exported {model_name} as int8 ONNX to {out_path}")
+    return out_path
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings from an int8-quantized ONNX export of a
+    sentence-transformers model: mean pooling over the attention mask followed
+    by L2 normalisation, as in the original model's pipeline.
+
+    Texts are sorted by length before batching so each batch pads to a similar
+    length; results are returned in input order.
+    """
+
+    def __init__(
+        self,
+        model_dir: str = EMBEDDING_ONNX_DIR,
+        model_name: str = EMBEDDING_MODEL,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        threads: int = EMBEDDING_THREADS,
+        max_length: int = EMBEDDING_MAX_LENGTH,
+    ):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path = os.path.join(model_dir, _MODEL_FILE)
+        if not os.path.exists(model_path):
+            export_onnx_int8(model_name, model_dir)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self._session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self._session.get_inputs()}
+
+        self._tokenizer = Tokenizer.from_file(os.path.join(model_dir, _TOKENIZER_FILE))
+        self._tokenizer.enable_truncation(max_length=max_length)
+        self._tokenizer.enable_padding()
+        # The tokenizer object is not safe to reconfigure or share mid-batch
+        self._lock = threading.Lock()
+        self.batch_size = batch_size
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        with self._lock:
+            encodings = self._tokenizer.encode_batch(texts)
+        feed = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self._session.run(None, {k: v for k, v in feed.items() if k in self._inputs})[0]
+
+        mask = feed["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vec in zip(batch, self._embed_batch([texts[i] for i in batch])):
+                vectors[i] = vec.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
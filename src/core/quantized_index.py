@@ -0,0 +1,494 @@
+"""
+Quantized vector search over the stored embeddings.
+
+Chroma remains the store of record. This index keeps a copy of every
+embedding as float32 plus int8 (per-row scaled) or binary (sign of the
+mean-centred vector) codes, all as memory-mapped .npy files. A query scans
+the codes in blocks, keeps the best QUANTIZED_RESCORE x k candidates
+(QUANTIZED_BINARY_RESCORE x k for binary codes) and rescores those exactly
+against the float32 rows, so only the codes and the candidate rows are paged
+in. Distances are squared L2, like Chroma's default space. The metadata
+that queries filter on (FILTER_KEYS) is kept as dictionary-encoded columns
+next to the codes, so filtered queries never go back to Chroma. When
+collection_version() moves on, a new index is built in a background thread
+while the current one keeps answering, and swapped in once complete; it is
+made from the previous index plus the logged changes since (changes_since),
+so only written rows are read from Chroma.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.config import QUANTIZED_BINARY_RESCORE, QUANTIZED_INDEX_DIR, QUANTIZED_RESCORE, VECTOR_INDEX
+from src.core.metrics import span
+from src.core.store import store_path
+from src.core.vectorstore import changes_since, collection_version, filters_to_where, get_shard, shard_names
+
+KINDS = ("int8", "binary")
+# Metadata kept as columns for filtering; filters on other keys go to Chroma
+FILTER_KEYS = ("file_name", "file_type", "modality", "page_number", "section_id")
+
+# Rows scored per step, bounding the temporary arrays of a scan
+_SCAN_BLOCK = 16384
+# Rows read from Chroma per request while building
+_READ_BATCH = 1000
+
+# Set bits per byte value, for Hamming distances on packed codes
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# Default candidates rescored per result; binary codes need many more
+DEFAULT_RESCORE = {"int8": QUANTIZED_RESCORE, "binary": QUANTIZED_BINARY_RESCORE}
+
+
+def _write_codes(directory: str, kind: str, vectors: np.ndarray) -> None:
+    """Quantize `vectors` block by block into the code files for `kind`."""
+    n, dim = vectors.shape
+    np.save(os.path.join(directory, "norms.npy"), np.einsum("ij,ij->i", vectors, vectors).astype(np.float32))
+
+    if kind == "int8":
+        codes = np.lib.format.open_memmap(os.path.join(directory, "codes.npy"), "w+", np.int8, (n, dim))
+        scales = np.zeros(n, dtype=np.float32)
+        for start in range(0, n, _SCAN_BLOCK):
+            block = np.asarray(vectors[start:start + _SCAN_BLOCK])
+            scale = np.abs(block).max(axis=1) / 127.0
+            scale[scale == 0] = 1.0
+            codes[start:start + len(block)] = np.rint(block / scale[:, None]).astype(np.int8)
+            scales[start:start + len(block)] = scale
+        codes.flush()
+        np.save(os.path.join(directory, "scales.npy"), scales)
+    elif kind == "binary":
+        mean = np.asarray(vectors.mean(axis=0), dtype=np.float32) if n else np.zeros(dim, dtype=np.float32)
+        codes = np.lib.format.open_memmap(
+            os.path.join(directory, "codes.npy"), "w+", np.uint8, (n, (dim + 7) // 8)
+        )
+        for start in range(0, n, _SCAN_BLOCK):
+            block = np.asarray(vectors[start:start + _SCAN_BLOCK])
+            codes[start:start + len(block)] = np.packbits(block > mean, axis=1)
+        codes.flush()
+        np.save(os.path.join(directory, "mean.npy"), mean)
+    else:
+        raise ValueError(f"Unknown quantized index kind {kind!r}; expected one of {KINDS}")
+
+
+class _Columns:
+    """FILTER_KEYS metadata of `size` rows, as an int32 code per row into a list of values."""
+
+    def __init__(self, size: int, values: Optional[Dict[str, List[Any]]] = None):
+        self.values = {key: list((values or {}).get(key, [])) for key in FILTER_KEYS}
+        self._lookup = {key: {v: i for i, v in enumerate(vals)} for key, vals in self.values.items()}
+        self.codes = {key: np.zeros(size, dtype=np.int32) for key in FILTER_KEYS}
+
+    def set(self, row: int, metadata: Optional[Dict[str, Any]]) -> None:
+        for key in FILTER_KEYS:
+            value = (metadata or {}).get(key)
+            code = self._lookup[key].get(value)
+            if code is None:
+                code = self._lookup[key][value] = len(self.values[key])
+                self.values[key].append(value)
+            self.codes[key][row] = code
+
+    def save(self, directory: str, size: int) -> None:
+        for key, codes in self.codes.items():
+            np.save(os.path.join(directory, f"column_{key}.npy"), codes[:size])
+
+
+def _write_meta(directory: str, kind: str, version: int, ids: List[str], columns: Optional[_Columns]) -> None:
+    meta = {"kind": kind, "version": version, "ids": list(ids)}
+    if columns is not None:
+        columns.save(directory, len(ids))
+        meta["columns"] = columns.values
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+class QuantizedIndex:
+    """Quantized codes plus float32 vectors of a set of IDs, opened read-only."""
+
+    def __init__(self, directory: str, mmap: bool = True):
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.directory = directory
+        self.kind = meta["kind"]
+        self.version = meta["version"]
+        self.ids: List[str] = meta["ids"]
+        self._rows = {doc_id: i for i, doc_id in enumerate(self.ids)}
+
+        mode = "r" if mmap and self.ids else None
+        load = lambda name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode)
+        self.vectors = load("vectors")
+        self.codes = load("codes")
+        self.norms = load("norms")
+        self.scales = load("scales") if self.kind == "int8" else None
+        self.mean = load("mean") if self.kind == "binary" else None
+        # Indexes written before the columns existed filter through Chroma
+        self.values: Dict[str, List[Any]] = meta.get("columns", {})
+        self.columns = {key: load(f"column_{key}") for key in self.values}
+
+    @classmethod
+    def create(
+        cls,
+        directory: str,
+        kind: str,
+        ids: List[str],
+        vectors: np.ndarray,
+        version: int = 0,
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+    ) -> "QuantizedIndex":
+        """Write an index for `ids` / `vectors` (n x dim float32), and their `metadatas` if given, to `directory`."""
+        os.makedirs(directory, exist_ok=True)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        np.save(os.path.join(directory, "vectors.npy"), vectors)
+        _write_codes(directory, kind, vectors)
+        columns = None
+        if metadatas is not None:
+            columns = _Columns(len(ids))
+            for row, metadata in enumerate(metadatas):
+                columns.set(row, metadata)
+        _write_meta(directory, kind, version, ids, columns)
+        return cls(directory)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def nbytes(self) -> Dict[str, int]:
+        """Size of the scanned codes and of the float32 rows used for rescoring."""
+        return {"codes": int(self.codes.nbytes), "vectors": int(self.vectors.nbytes)}
+
+    def _approx_distances(self, queries: np.ndarray, block) -> np.ndarray:
+        """Approximate distances (smaller is closer) of the rows in `block`, shape (rows, queries)."""
+        codes = np.asarray(self.codes[block])
+        if self.kind == "int8":
+            dots = (codes.astype(np.float32) @ queries.T) * np.asarray(self.scales[block])[:, None]
+            return np.asarray(self.norms[block])[:, None] - 2.0 * dots
+        query_codes = np.packbits(queries > self.mean, axis=1)
+        return _POPCOUNT[codes[:, None, :] ^ query_codes[None, :, :]].sum(axis=2, dtype=np.int32)
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        rows: Optional[np.ndarray] = None,
+        rescore: Optional[int] = None,
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        (row indices, squared L2 distances) of the k nearest rows for each query,
+        searching only `rows` (sorted) if given. `rescore` defaults per kind
+        (DEFAULT_RESCORE).
+        """
+        if rescore is None:
+            rescore = DEFAULT_RESCORE[self.kind]
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        n = len(self.ids) if rows is None else len(rows)
+        if n == 0 or k <= 0:
+            return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in queries]
+
+        approx = np.empty((n, len(queries)), dtype=np.float32)
+        for start in range(0, n, _SCAN_BLOCK):
+            stop = min(n, start + _SCAN_BLOCK)
+            block = slice(start, stop) if rows is None else rows[start:stop]
+            approx[start:stop] = self._approx_distances(queries, block)
+
+        n_candidates = min(n, max(k, k * rescore))
+        results = []
+        for qi, query in enumerate(queries):
+            candidates = np.argpartition(approx[:, qi], n_candidates - 1)[:n_candidates]
+            if rows is not None:
+                candidates = rows[candidates]
+            # Sorted row order reads the memory-mapped vectors sequentially
+            candidates = np.sort(candidates)
+            diff = np.asarray(self.vectors[candidates]) - query
+            exact = np.einsum("ij,ij->i", diff, diff)
+            best = np.argsort(exact)[:k]
+            results.append((candidates[best], exact[best]))
+        return results
+
+    def rows_for(self, ids) -> np.ndarray:
+        return np.array(sorted(self._rows[i] for i in ids if i in self._rows), dtype=np.int64)
+
+    def filter_rows(self, filters: Dict[str, List[Any]]) -> Optional[np.ndarray]:
+        """
+        Sorted rows whose metadata matches `filters` ({key: allowed values}),
+        or None if a filtered key has no column.
+        """
+        mask = np.ones(len(self.ids), dtype=bool)
+        for key, allowed in filters.items():
+            if not allowed:
+                continue
+            if key not in self.columns:
+                return None
+            lookup = {v: i for i, v in enumerate(self.values[key])}
+            mask &= np.isin(self.columns[key], [lookup[v] for v in allowed if v in lookup])
+        return np.flatnonzero(mask)
+
+    def query(
+        self,
+        vectors: List[List[float]],
+        k: int,
+        filters: Optional[Dict[str, List[Any]]] = None,
+        include_embeddings: bool = False,
+    ) -> List[List[Tuple[Document, float, Optional[List[float]]]]]:
+        """Same contract as vectorstore.query_by_vectors."""
+        names = shard_names(filters)
+        rows = None
+        where = filters_to_where(filters)
+        if where is not None:
+            with span("quantized.filter"):
+                rows = self.filter_rows(filters)
+                if rows is None:
+                    # Resolved by the collections, without touching their vectors
+                    rows = self.rows_for(
+                        doc_id
+                        for name in names
+                        for doc_id in get_shard(name)._collection.get(where=where, include=[])["ids"]
+                    )
+
+        with span("quantized.search"):
+            hits = self.search(np.asarray(vectors, dtype=np.float32), k, rows)
+
+        wanted = list(dict.fromkeys(self.ids[r] for found, _ in hits for r in found))
+        docs: Dict[str, Document] = {}
+        for name in names:
+            if len(docs) == len(wanted):
+                break
+            res = get_shard(name)._collection.get(ids=wanted, include=["documents", "metadatas"])
+            for doc_id, text, metadata in zip(res["ids"], res["documents"], res["metadatas"]):
+                metadata = dict(metadata or {})
+                metadata.setdefault("chunk_id", doc_id)
+                docs[doc_id] = Document(page_content=text, metadata=metadata)
+
+        results = []
+        for found, distances in hits:
+            results.append([
+                (
+                    docs[self.ids[r]],
+                    float(d),
+                    self.vectors[r].tolist() if include_embeddings else None,
+                )
+                for r, d in zip(found, distances)
+                if self.ids[r] in docs
+            ])
+        return results
+
+
+def build_from_store(directory: str, kind: str, version: int) -> QuantizedIndex:
+    """Copy every stored embedding out of the collection(s) into a new index."""
+    names = shard_names()
+    total = sum(get_shard(name)._collection.count() for name in names)
+    os.makedirs(directory, exist_ok=True)
+
+    ids: List[str] = []
+    vectors = None
+    columns = _Columns(total)
+    for name in names:
+        collection = get_shard(name)._collection
+        offset = 0
+        while True:
+            batch = collection.get(include=["embeddings", "metadatas"], limit=_READ_BATCH, offset=offset)
+            if not len(batch["ids"]):
+                break
+            block = np.asarray(batch["embeddings"], dtype=np.float32)
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(
+                    os.path.join(directory, "vectors.npy"), "w+", np.float32, (total, block.shape[1])
+                )
+            # Rows written since `total` was counted are picked up by the next rebuild
+            block = block[:total - len(ids)]
+            vectors[len(ids):len(ids) + len(block)] = block
+            for doc_id, metadata in zip(batch["ids"][:len(block)], batch["metadatas"]):
+                columns.set(len(ids), metadata)
+                ids.append(doc_id)
+            offset += len(batch["ids"])
+
+    if vectors is None:
+        return QuantizedIndex.create(directory, kind, [], np.zeros((0, 1), dtype=np.float32), version, [])
+    vectors.flush()
+    if len(ids) < total:
+        # Rows deleted while reading: shrink the file to what was read
+        np.save(os.path.join(directory, "vectors.npy"), np.array(vectors[:len(ids)]))
+        vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+
+    _write_codes(directory, kind, vectors)
+    _write_meta(directory, kind, version, ids, columns)
+    return QuantizedIndex(directory)
+
+
+def _read_rows(ids: List[str]) -> Tuple[List[str], List[List[float]], List[Dict[str, Any]]]:
+    """IDs, embeddings and metadata of those of `ids` still stored, in no particular order."""
+    found_ids, embeddings, metadatas = [], [], []
+    for name in shard_names():
+        found = set(found_ids)
+        missing = [doc_id for doc_id in ids if doc_id not in found]
+        for start in range(0, len(missing), _READ_BATCH):
+            batch = get_shard(name)._collection.get(
+                ids=missing[start:start + _READ_BATCH], include=["embeddings", "metadatas"]
+            )
+            found_ids.extend(batch["ids"])
+            embeddings.extend(batch["embeddings"])
+            metadatas.extend(batch["metadatas"])
+    return found_ids, embeddings, metadatas
+
+
+def update_from(
+    previous: QuantizedIndex, directory: str, version: int, changes: List[Dict[str, Any]]
+) -> QuantizedIndex:
+    """
+    A new index for `version` made of the rows of `previous` that the logged
+    `changes` since did not touch, plus the written rows read from the
+    collection(s). Rows deleted again after being written are simply not found.
+    """
+    added = list(dict.fromkeys(doc_id for entry in changes for doc_id in entry["added"]))
+    keep = np.ones(len(previous), dtype=bool)
+    keep[previous.rows_for(set(added).union(*(entry["deleted"] for entry in changes)))] = False
+    deleted_files = {name for entry in changes for name in entry["deleted_files"]}
+    if deleted_files:
+        file_names = previous.values["file_name"]
+        keep &= ~np.isin(
+            previous.columns["file_name"], [i for i, name in enumerate(file_names) if name in deleted_files]
+        )
+    kept = np.flatnonzero(keep)
+
+    new_ids, embeddings, metadatas = _read_rows(added)
+    n = len(kept) + len(new_ids)
+    if n == 0:
+        return QuantizedIndex.create(directory, previous.kind, [], np.zeros((0, 1), dtype=np.float32), version, [])
+    os.makedirs(directory, exist_ok=True)
+    vectors = np.lib.format.open_memmap(
+        os.path.join(directory, "vectors.npy"), "w+", np.float32, (n, previous.vectors.shape[1])
+    )
+    columns = _Columns(n, previous.values)
+    for start in range(0, len(kept), _SCAN_BLOCK):
+        rows = kept[start:start + _SCAN_BLOCK]
+        vectors[start:start + len(rows)] = previous.vectors[rows]
+        for key in FILTER_KEYS:
+            columns.codes[key][start:start + len(rows)] = previous.columns[key][rows]
+    if new_ids:
+        vectors[len(kept):] = np.asarray(embeddings, dtype=np.float32)
+    for row, metadata in enumerate(metadatas, start=len(kept)):
+        columns.set(row, metadata)
+    vectors.flush()
+
+    ids = [previous.ids[r] for r in kept] + new_ids
+    _write_codes(directory, previous.kind, vectors)
+    _write_meta(directory, previous.kind, version, ids, columns)
+    return QuantizedIndex(directory)
+
+
+_index: Optional[QuantizedIndex] = None
+_lock = threading.Lock()
+# Directory of the index being built in the background, if any
+_building: Optional[str] = None
+
+
+def _index_dir(kind: str, version: int) -> str:
+    return os.path.join(store_path(QUANTIZED_INDEX_DIR), f"{kind}-v{version}")
+
+
+def open_or_build(kind: str, version: int) -> QuantizedIndex:
+    directory = _index_dir(kind, version)
+    if os.path.exists(os.path.join(directory, "meta.json")):
+        return QuantizedIndex(directory)
+
+    start = time.perf_counter()
+    tmp_dir = f"{directory}.tmp-{os.getpid()}-{threading.get_ident()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    previous = _latest_on_disk(kind)
+    changes = None
+    if previous is not None and len(previous) and "file_name" in previous.columns and previous.version < version:
+        changes = changes_since(previous.version, version)
+    if changes is not None:
+        print(f"[INFO] Updating {kind} vector index from collection version {previous.version} to {version}...")
+        with span("quantized.update"):
+            update_from(previous, tmp_dir, version, changes)
+    else:
+        print(f"[INFO] Building {kind} vector index for collection version {version}...")
+        with span("quantized.build"):
+            build_from_store(tmp_dir, kind, version)
+    try:
+        os.replace(tmp_dir, directory)
+    except OSError:
+        # Built concurrently (e.g. by a snapshot export) and already in place
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    index = QuantizedIndex(directory)
+    print(f"[INFO] Built {kind} vector index of {len(index)} vectors in {time.perf_counter() - start:.2f}s")
+
+    # Older versions may still be mapped (here or by another process); unlinked
+    # files stay readable through existing maps, so remove what we can
+    parent = os.path.dirname(directory)
+    for name in os.listdir(parent):
+        if name != os.path.basename(directory) and name.startswith(f"{kind}-v") and ".tmp-" not in name:
+            shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+    return index
+
+
+def _latest_on_disk(kind: str) -> Optional[QuantizedIndex]:
+    """The newest complete index of `kind` already on disk, whatever its version."""
+    parent = store_path(QUANTIZED_INDEX_DIR)
+    if not os.path.isdir(parent):
+        return None
+    versions = []
+    for name in os.listdir(parent):
+        version = name[len(kind) + 2:]
+        if name.startswith(f"{kind}-v") and version.isdigit() and os.path.exists(os.path.join(parent, name, "meta.json")):
+            versions.append(int(version))
+    return QuantizedIndex(_index_dir(kind, max(versions))) if versions else None
+
+
+def _rebuild(kind: str, version: int) -> None:
+    global _index, _building
+    directory = _index_dir(kind, version)
+    try:
+        index = open_or_build(kind, version)
+        with _lock:
+            # A store switch (use_store) may have happened meanwhile
+            if _index is None or os.path.dirname(_index.directory) == os.path.dirname(directory):
+                _index = index
+    except Exception as e:
+        print(f"[WARN] Rebuilding the {kind} vector index failed ({type(e).__name__}: {e}); "
+              "serving the previous one")
+    finally:
+        with _lock:
+            if _building == directory:
+                _building = None
+
+
+def get_quantized_index(kind: str = VECTOR_INDEX) -> QuantizedIndex:
+    """
+    Process-wide quantized index. Only the very first call builds synchronously
+    (if nothing is on disk yet); after writes the current index keeps serving
+    while the next version is built in the background.
+    """
+    global _index, _building
+    version = collection_version()
+    directory = _index_dir(kind, version)
+    if _index is not None and _index.directory == directory:
+        return _index
+
+    with _lock:
+        current = _index
+        stale = (
+            current is not None
+            and current.kind == kind
+            and os.path.dirname(current.directory) == os.path.dirname(directory)
+        )
+        if current is not None and current.directory == directory:
+            return current
+        if not stale:
+            current = _index = _latest_on_disk(kind)
+            if current is not None and current.directory == directory:
+                return current
+        if current is not None:
+            # One build at a time; a version that moves on meanwhile is built next
+            if _building is None:
+                _building = directory
+                threading.Thread(target=_rebuild, args=(kind, version), name="quantized-rebuild", daemon=True).start()
+            return current
+
+        _index = open_or_build(kind, version)
+        return _index
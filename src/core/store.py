@@ -0,0 +1,28 @@
+"""
+Location of the active store. Everything kept under CHROMA_DIR (collections,
+BM25 and dedup indexes, ingest manifest, quantized index) is opened relative
+to it, so a read replica can switch to an imported snapshot at runtime (see
+vectorstore.use_store).
+"""
+
+import os
+
+from src.config import CHROMA_DIR
+
+_active_dir = CHROMA_DIR
+
+
+def active_dir() -> str:
+    return _active_dir
+
+
+def store_path(path: str) -> str:
+    """`path`, a location under CHROMA_DIR, inside the active store."""
+    if _active_dir == CHROMA_DIR:
+        return path
+    return os.path.join(_active_dir, os.path.relpath(path, CHROMA_DIR))
+
+
+def set_active_dir(directory: str) -> None:
+    global _active_dir
+    _active_dir = directory
@@ -1,18 +1,493 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
 from langchain_community.vectorstores import Chroma
 from langchain_core.documents import Document
-from src.core.embeddings import get_embeddings
-from src.config import CHROMA_DIR
+from src.core.bm25 import get_lexical_index
+from src.core.dedup import get_dedup_index
+from src.core.embeddings import embedding_id, get_embeddings
+from src.core.metrics import incr, span
+from src.core.store import active_dir, set_active_dir, store_path
+from src.config import (
+    CHROMA_DIR,
+    DEDUP_ENABLED,
+    INGEST_WRITE_BATCH,
+    SHARD_KEY,
+    SHARD_QUERY_WORKERS,
+    VECTOR_INDEX,
+)
+
+COLLECTION_NAME = "llamachain_docs"
+
+# Chroma rejects very large requests, so writes and deletes are sent in batches
+_WRITE_BATCH = 1000
+
+VERSION_PATH = os.path.join(CHROMA_DIR, "collection_version")
+# One JSON line per version: the IDs written and deleted and the files deleted
+CHANGES_PATH = os.path.join(CHROMA_DIR, "changes.jsonl")
+# Versions kept in CHANGES_PATH; indexes older than that are rebuilt in full
+_CHANGES_KEEP = 200
+# Embedding model and backend the store's vectors were made with
+EMBEDDING_ID_PATH = os.path.join(CHROMA_DIR, "embedding_model")
+# Exists while a group of writes is in progress (see writing)
+WRITING_PATH = os.path.join(CHROMA_DIR, "writing")
+
+_vectorstore = None
+_shards: Dict[str, Any] = {}  # collection name -> Chroma, when SHARD_KEY is set
+_query_pool: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+# Guards the one-off BM25 backfill; see ensure_lexical_index
+_lexical_lock = threading.Lock()
+_lexical_checked = False
+_write_lock = threading.RLock()
+_write_depth = 0
+# Changes made by the current writing() block, logged when it ends
+_changes: Dict[str, List[str]] = {"added": [], "deleted": [], "deleted_files": []}
 
 
 def get_vectorstore():
-    return Chroma(
-        persist_directory=CHROMA_DIR,
-        embedding_function=get_embeddings(),
-        collection_name="llamachain_docs",
+    """Process-wide Chroma handle sharing the process-wide embedding model."""
+    global _vectorstore
+    if _vectorstore is None:
+        with _lock:
+            if _vectorstore is None:
+                vectorstore = Chroma(
+                    persist_directory=active_dir(),
+                    embedding_function=get_embeddings(),
+                    collection_name=COLLECTION_NAME,
+                )
+                _check_embedding_model(vectorstore)
+                _vectorstore = vectorstore
+    return _vectorstore
+
+
+def _check_embedding_model(vectorstore) -> None:
+    """
+    Refuse to open a store whose vectors come from another embedding model or
+    backend: mixed vectors in one collection make distances meaningless.
+    """
+    path = store_path(EMBEDDING_ID_PATH)
+    current = embedding_id()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            stored = f.read().strip()
+    except FileNotFoundError:
+        # Stores from before this check were always embedded with torch
+        stored = embedding_id("torch") if vectorstore._collection.count() else current
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(stored)
+    if stored != current:
+        raise RuntimeError(
+            f"The store in {active_dir()} holds {stored!r} embeddings but EMBEDDING_BACKEND / "
+            f"EMBEDDING_MODEL give {current!r}. Switch back, or point CHROMA_DIR at a new "
+            "directory and ingest the documents again."
+        )
+
+
+def use_store(directory: str) -> None:
+    """
+    Serve from the store in `directory` (e.g. an imported snapshot) from now on.
+    Chains built with build_rag_chain pick it up on their next query; requests
+    already running finish against the previous store.
+    """
+    global _vectorstore, _lexical_checked
+    with _lock:
+        set_active_dir(directory)
+        _vectorstore = None
+        _shards.clear()
+        _lexical_checked = False
+    print(f"[INFO] Using store {directory}")
+
+
+def _shard_prefix() -> str:
+    return f"{COLLECTION_NAME}__{SHARD_KEY}__"
+
+
+def shard_name(value: Any) -> str:
+    """Collection holding documents whose SHARD_KEY metadata is `value`."""
+    if not SHARD_KEY:
+        return COLLECTION_NAME
+    # Chroma collection names are limited in length and characters
+    return _shard_prefix() + hashlib.sha256(str(value).encode("utf-8")).hexdigest()[:16]
+
+
+def get_shard(name: str):
+    """Chroma handle for one collection; the default collection is get_vectorstore()."""
+    if name == COLLECTION_NAME:
+        return get_vectorstore()
+    shard = _shards.get(name)
+    if shard is None:
+        client = get_vectorstore()._client
+        with _lock:
+            shard = _shards.get(name)
+            if shard is None:
+                shard = _shards[name] = Chroma(
+                    client=client,
+                    embedding_function=get_embeddings(),
+                    collection_name=name,
+                )
+    return shard
+
+
+def shard_names(filters: Optional[Dict[str, List[Any]]] = None) -> List[str]:
+    """
+    Collections to search. With sharding, only existing shards whose value is
+    allowed by a filter on SHARD_KEY (all shards without one).
+    """
+    if not SHARD_KEY:
+        return [COLLECTION_NAME]
+    existing = {
+        getattr(c, "name", c)  # list_collections returns names or collection objects
+        for c in get_vectorstore()._client.list_collections()
+    }
+    values = (filters or {}).get(SHARD_KEY)
+    if values:
+        return [name for name in dict.fromkeys(shard_name(v) for v in values) if name in existing]
+    return sorted(name for name in existing if name.startswith(_shard_prefix()))
+
+
+def filters_to_where(filters: Optional[Dict[str, List[Any]]]) -> Optional[Dict[str, Any]]:
+    """Chroma `where` clause for {metadata key: allowed values}."""
+    clauses = [
+        {key: values[0]} if len(values) == 1 else {key: {"$in": list(values)}}
+        for key, values in (filters or {}).items()
+        if values
+    ]
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def collection_version() -> int:
+    """
+    Increases whenever documents are written or deleted. Persisted next to the
+    collection so that other processes and later runs see it too.
+    """
+    try:
+        with open(store_path(VERSION_PATH), "r", encoding="utf-8") as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def _read_changes() -> List[Dict[str, Any]]:
+    try:
+        with open(store_path(CHANGES_PATH), "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def changes_since(version: int, target: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    The logged changes of versions after `version` up to `target`, oldest
+    first, or None if any of them is missing (e.g. pruned, or an older store).
+    """
+    entries = [e for e in _read_changes() if version < e["version"] <= target]
+    if [e["version"] for e in entries] != list(range(version + 1, target + 1)):
+        return None
+    return entries
+
+
+def _record(kind: str, items: List[str]) -> None:
+    """Note a change made inside writing(), for the change log."""
+    with _write_lock:
+        _changes[kind].extend(items)
+
+
+def _bump_version() -> None:
+    global _changes
+    with _lock:
+        version = collection_version() + 1
+        path = store_path(VERSION_PATH)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        entry = json.dumps({"version": version, **_changes})
+        _changes = {"added": [], "deleted": [], "deleted_files": []}
+        changes_path = store_path(CHANGES_PATH)
+        if version % _CHANGES_KEEP == 0:
+            kept = [json.dumps(e) for e in _read_changes() if e["version"] > version - _CHANGES_KEEP]
+            with open(changes_path + ".tmp", "w", encoding="utf-8") as f:
+                f.write("".join(line + "\n" for line in kept + [entry]))
+            os.replace(changes_path + ".tmp", changes_path)
+        else:
+            with open(changes_path, "a", encoding="utf-8") as f:
+                f.write(entry + "\n")
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(str(version))
+        os.replace(tmp_path, path)
+
+
+@contextmanager
+def writing():
+    """
+    Group writes to the store. While the outermost block runs, a marker file
+    says a write is in progress, so that a snapshot taken meanwhile (possibly
+    by another process) is discarded; on exit the collection version moves on
+    once and the marker is removed. Blocks may be nested.
+    """
+    global _write_depth
+    with _write_lock:
+        _write_depth += 1
+        if _write_depth == 1:
+            marker = store_path(WRITING_PATH)
+            os.makedirs(os.path.dirname(marker), exist_ok=True)
+            with open(marker, "w", encoding="utf-8") as f:
+                f.write(str(os.getpid()))
+        try:
+            yield
+        finally:
+            _write_depth -= 1
+            if _write_depth == 0:
+                _bump_version()
+                try:
+                    os.remove(store_path(WRITING_PATH))
+                except FileNotFoundError:
+                    pass
+
+
+def write_in_progress() -> bool:
+    """True while some process is inside writing() on the active store."""
+    return os.path.exists(store_path(WRITING_PATH))
+
+
+def pause_writes():
+    """Lock keeping this process's writers out, e.g. while a snapshot is copied."""
+    return _write_lock
+
+
+def warm_up() -> Dict[str, float]:
+    """Load the embedding model and open the collection ahead of the first request."""
+    timings = {}
+
+    start = time.perf_counter()
+    get_embeddings().embed_query("warm-up")
+    timings["embeddings_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    get_vectorstore()._collection.count()
+    ensure_lexical_index()
+    if VECTOR_INDEX != "chroma":
+        from src.core.quantized_index import get_quantized_index
+
+        get_quantized_index(VECTOR_INDEX)
+    timings["vectorstore_s"] = time.perf_counter() - start
+
+    print(
+        f"[INFO] Warm-up: embedding model {timings['embeddings_s']:.2f}s, "
+        f"vector store {timings['vectorstore_s']:.2f}s"
+    )
+    return timings
+
+
+def _query_collection(
+    name: str,
+    vectors: List[List[float]],
+    k: int,
+    where: Optional[Dict[str, Any]],
+    include_embeddings: bool,
+) -> List[List[Tuple[Document, float, Optional[List[float]]]]]:
+    include = ["documents", "metadatas", "distances"]
+    if include_embeddings:
+        include.append("embeddings")
+
+    res = get_shard(name)._collection.query(
+        query_embeddings=vectors,
+        n_results=k,
+        where=where,
+        include=include,
     )
 
+    results = []
+    for qi in range(len(vectors)):
+        hits = []
+        for j, doc_id in enumerate(res["ids"][qi]):
+            metadata = dict(res["metadatas"][qi][j] or {})
+            metadata.setdefault("chunk_id", doc_id)
+            doc = Document(page_content=res["documents"][qi][j], metadata=metadata)
+            embedding = list(res["embeddings"][qi][j]) if include_embeddings else None
+            hits.append((doc, res["distances"][qi][j], embedding))
+        results.append(hits)
+    return results
+
+
+def query_by_vectors(
+    vectors: List[List[float]],
+    k: int,
+    filters: Optional[Dict[str, List[Any]]] = None,
+    include_embeddings: bool = False,
+) -> List[List[Tuple[Document, float, Optional[List[float]]]]]:
+    """
+    Nearest neighbours for several query vectors, one call per collection.
+    `filters` maps metadata keys to allowed values. With sharding, the relevant
+    shards are queried in parallel and their hits merged by distance. With
+    VECTOR_INDEX "int8" or "binary" the quantized index answers instead. Returns,
+    per query, (document, distance, embedding or None) with the stored ID in
+    `metadata["chunk_id"]`.
+    """
+    global _query_pool
+    if VECTOR_INDEX != "chroma":
+        from src.core.quantized_index import get_quantized_index
+
+        return get_quantized_index(VECTOR_INDEX).query(vectors, k, filters, include_embeddings)
+
+    names = shard_names(filters)
+    where = filters_to_where(filters)
+    if len(names) == 1:
+        return _query_collection(names[0], vectors, k, where, include_embeddings)
+
+    if _query_pool is None:
+        with _lock:
+            if _query_pool is None:
+                _query_pool = ThreadPoolExecutor(max_workers=SHARD_QUERY_WORKERS, thread_name_prefix="shard-query")
+    per_shard = _query_pool.map(
+        lambda name: _query_collection(name, vectors, k, where, include_embeddings), names
+    )
+
+    results: List[list] = [[] for _ in vectors]
+    for shard_results in per_shard:
+        for qi, hits in enumerate(shard_results):
+            results[qi].extend(hits)
+    return [sorted(hits, key=lambda h: h[1])[:k] for hits in results]
+
+
+def _write(docs: List[Document]) -> None:
+    by_shard: Dict[str, List[Document]] = {}
+    for d in docs:
+        by_shard.setdefault(shard_name(d.metadata.get(SHARD_KEY)), []).append(d)
+
+    for name, shard_docs in by_shard.items():
+        vs = get_shard(name)
+        for start in range(0, len(shard_docs), INGEST_WRITE_BATCH):
+            # Embeds and writes one batch at a time to keep memory per call bounded
+            batch = shard_docs[start:start + INGEST_WRITE_BATCH]
+            ids = [d.metadata.get("chunk_id") for d in batch]
+            with span("vectorstore.write"):
+                ids = vs.add_documents(batch, ids=ids if all(ids) else None)
+            _record("added", ids)
+            with span("bm25.write"):
+                get_lexical_index().add(ids, batch)
+
 
 def add_documents(docs: list[Document]) -> int:
-    vs = get_vectorstore()
-    vs.add_documents(docs)
+    """
+    Upsert documents. Documents carrying a `chunk_id` in their metadata are stored
+    under that ID, so writing the same content twice does not duplicate it.
+    Near-duplicates of stored documents are recorded but not stored. Returns the
+    number of documents stored.
+    """
+    with writing():
+        recorded: List[str] = []
+        if DEDUP_ENABLED:
+            with span("dedup.filter"):
+                kept, recorded = get_dedup_index().filter_new(docs)
+            incr("dedup.duplicates", len(docs) - len(kept))
+            docs = kept
+
+        try:
+            _write(docs)
+        except Exception:
+            # Not stored, so not a canonical copy later writes may be skipped for
+            if recorded:
+                get_dedup_index().discard(recorded)
+            raise
+    incr("vectorstore.written", len(docs))
     return len(docs)
+
+
+def _promote_duplicates(promoted: List[Document]) -> None:
+    """
+    Store the duplicates that took over from deleted canonical documents and
+    recompute the hierarchy of their files, which had no stored chunks for them.
+    """
+    if promoted:
+        from src.core.hierarchy import update_file
+
+        _write(promoted)
+        for file_name in dict.fromkeys(d.metadata.get("file_name") for d in promoted):
+            if file_name:
+                update_file(file_name)
+        incr("dedup.promoted", len(promoted))
+
+
+def delete_documents(ids: List[str]) -> int:
+    """Delete documents by ID."""
+    if not ids:
+        return 0
+    with writing(), span("vectorstore.delete"):
+        # IDs do not say which shard they are in; deleting missing IDs is a no-op
+        for name in shard_names():
+            vs = get_shard(name)
+            for start in range(0, len(ids), _WRITE_BATCH):
+                vs.delete(ids=ids[start:start + _WRITE_BATCH])
+        _record("deleted", ids)
+        get_lexical_index().delete(ids)
+        if DEDUP_ENABLED:
+            _promote_duplicates(get_dedup_index().remove(ids))
+    incr("vectorstore.deleted", len(ids))
+    return len(ids)
+
+
+def delete_file(file_name: str) -> None:
+    """Delete every document that came from `file_name`, whatever its ID."""
+    with writing(), span("vectorstore.delete"):
+        if SHARD_KEY == "file_name":
+            name = shard_name(file_name)
+            if name in shard_names({"file_name": [file_name]}):
+                get_vectorstore()._client.delete_collection(name)
+                with _lock:
+                    _shards.pop(name, None)
+        else:
+            for name in shard_names():
+                get_shard(name)._collection.delete(where={"file_name": file_name})
+        _record("deleted_files", [file_name])
+        get_lexical_index().delete_file(file_name)
+        if DEDUP_ENABLED:
+            _promote_duplicates(get_dedup_index().remove_file(file_name))
+
+
+def ensure_lexical_index() -> None:
+    """Build the BM25 index from the collection if it is empty (e.g. an older store)."""
+    global _lexical_checked
+    if _lexical_checked:
+        return
+    # Not _lock: the backfill calls get_vectorstore / shard_names / get_shard,
+    # which take _lock themselves, and threading.Lock is not reentrant
+    with _lexical_lock:
+        if _lexical_checked:
+            return
+        index = get_lexical_index()
+        if len(index) == 0:
+            for name in shard_names():
+                collection = get_shard(name)._collection
+                if collection.count() == 0:
+                    continue
+                print(f"[INFO] Building BM25 index from collection {name}...")
+                offset = 0
+                while True:
+                    batch = collection.get(
+                        include=["documents", "metadatas"], limit=_WRITE_BATCH, offset=offset
+                    )
+                    if not batch["ids"]:
+                        break
+                    index.add(batch["ids"], [
+                        Document(page_content=text, metadata=meta or {})
+                        for text, meta in zip(batch["documents"], batch["metadatas"])
+                    ])
+                    offset += len(batch["ids"])
+        _lexical_checked = True
+
+
+def indexed_files() -> List[str]:
+    """Names of all files with indexed documents."""
+    ensure_lexical_index()
+    return get_lexical_index().file_names()
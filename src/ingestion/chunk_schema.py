@@ -1,10 +1,40 @@
 # src/ingestion/chunk_schema.py
 
+import sys
 from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
+import numpy as np
 
-@dataclass
+BBox = Tuple[float, float, float, float]
+
+# String fields stored as codes into a shared string table
+_STRING_FIELDS = ("modality", "file_name", "file_type", "category", "extractor", "image_path")
+# Fields with few distinct values, shared between chunks instead of copied
+_INTERNED = ("modality", "file_name", "file_type", "category", "extractor")
+
+
+def compact_bbox(coordinates) -> Optional[BBox]:
+    """
+    Bounding box (x0, y0, x1, y1) of Unstructured CoordinatesMetadata, a list of
+    points, a flat list of floats or a bbox tuple.
+    """
+    if coordinates is None:
+        return None
+    points = getattr(coordinates, "points", coordinates)
+    flat = []
+    for p in points:
+        if isinstance(p, (tuple, list)):
+            flat.extend(float(v) for v in p)
+        else:
+            flat.append(float(p))
+    if len(flat) < 4:
+        return None
+    xs, ys = flat[0::2], flat[1::2]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+@dataclass(slots=True)
 class Chunk:
     id: str
     content: str            # text we will embed
@@ -12,4 +42,104 @@ class Chunk:
     file_name: str
     file_type: str          # "pdf" | "pptx"
     page_number: Optional[int]
-    extra: Dict[str, Any]
+    category: Optional[str] = None      # Unstructured element category, e.g. "Title"
+    coordinates: Optional[BBox] = None  # bounding box on the page
+    image_path: Optional[str] = None
+    extractor: Optional[str] = None     # "pymupdf" | "hi_res" for PDF pages
+    last_page: Optional[int] = None     # last page of a merged section
+
+    def __post_init__(self):
+        for name in _INTERNED:
+            value = getattr(self, name)
+            if value is not None:
+                setattr(self, name, sys.intern(value))
+        self.coordinates = compact_bbox(self.coordinates)
+
+
+class ChunkBatch:
+    """
+    Chunks stored column by column: contents in one UTF-8 buffer, page numbers
+    and bounding boxes in NumPy arrays, and repeated strings (file names,
+    modalities, categories...) as codes into one string table. Much smaller
+    than a list of Chunk objects and cheap to send between processes. Chunk
+    objects are only built when the batch is iterated or indexed.
+    """
+
+    def __init__(self, ids: np.ndarray, text: np.ndarray, offsets: np.ndarray, pages: np.ndarray,
+                 last_pages: np.ndarray, bboxes: np.ndarray, codes: np.ndarray, strings: List[Optional[str]]):
+        self.ids = ids              # (n,) bytes
+        self.text = text            # (total bytes,) uint8
+        self.offsets = offsets      # (n + 1,) int64 into text
+        self.pages = pages          # (n,) int32, -1 for None
+        self.last_pages = last_pages
+        self.bboxes = bboxes        # (n, 4) float32, NaN for None
+        self.codes = codes          # (n, len(_STRING_FIELDS)) uint32 into strings
+        self.strings = strings      # strings[0] is None
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[Chunk]) -> "ChunkBatch":
+        strings: List[Optional[str]] = [None]
+        lookup: Dict[Optional[str], int] = {None: 0}
+        ids, blobs, pages, last_pages, bboxes, codes = [], [], [], [], [], []
+
+        for ch in chunks:
+            ids.append(ch.id.encode("ascii"))
+            blobs.append(ch.content.encode("utf-8"))
+            pages.append(-1 if ch.page_number is None else ch.page_number)
+            last_pages.append(-1 if ch.last_page is None else ch.last_page)
+            bboxes.append(ch.coordinates or (np.nan,) * 4)
+            row = []
+            for name in _STRING_FIELDS:
+                value = getattr(ch, name)
+                code = lookup.get(value)
+                if code is None:
+                    code = lookup[value] = len(strings)
+                    strings.append(value)
+                row.append(code)
+            codes.append(row)
+
+        offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in blobs], out=offsets[1:])
+        return cls(
+            ids=np.array(ids, dtype=bytes) if ids else np.zeros(0, dtype="S1"),
+            text=np.frombuffer(b"".join(blobs), dtype=np.uint8),
+            offsets=offsets,
+            pages=np.array(pages, dtype=np.int32),
+            last_pages=np.array(last_pages, dtype=np.int32),
+            bboxes=np.array(bboxes, dtype=np.float32).reshape(-1, 4),
+            codes=np.array(codes, dtype=np.uint32).reshape(-1, len(_STRING_FIELDS)),
+            strings=strings,
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, i: int) -> Chunk:
+        values = {name: self.strings[code] for name, code in zip(_STRING_FIELDS, self.codes[i])}
+        bbox = self.bboxes[i]
+        page, last_page = int(self.pages[i]), int(self.last_pages[i])
+        return Chunk(
+            id=self.ids[i].decode("ascii"),
+            content=self.text[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8"),
+            page_number=None if page < 0 else page,
+            coordinates=None if np.isnan(bbox[0]) else tuple(float(v) for v in bbox),
+            last_page=None if last_page < 0 else last_page,
+            **values,
+        )
+
+    def __iter__(self) -> Iterator[Chunk]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def page_set(self, **where: str) -> set:
+        """Distinct page numbers, optionally of chunks whose string fields equal `where`."""
+        mask = self.pages >= 0
+        for name, value in where.items():
+            if value not in self.strings:
+                return set()
+            mask &= self.codes[:, _STRING_FIELDS.index(name)] == self.strings.index(value)
+        return set(np.unique(self.pages[mask]).tolist())
+
+    @classmethod
+    def concat(cls, batches: Iterable["ChunkBatch"]) -> "ChunkBatch":
+        return cls.from_chunks(ch for batch in batches for ch in batch)
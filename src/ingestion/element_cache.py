@@ -0,0 +1,116 @@
+# src/ingestion/element_cache.py
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import msgpack
+
+from src.config import ELEMENT_CACHE_PATH
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+# Per-element fields stored for each page, one column (list) per field
+_FIELDS = ("content", "modality", "category", "coordinates", "image_path")
+
+
+def _flatten_coordinates(coordinates) -> Optional[List[float]]:
+    """Unstructured CoordinatesMetadata or a bbox tuple as a flat list of floats."""
+    if coordinates is None:
+        return None
+    points = getattr(coordinates, "points", coordinates)
+    flat = []
+    for p in points:
+        if isinstance(p, (tuple, list)):
+            flat.extend(float(v) for v in p)
+        else:
+            flat.append(float(p))
+    return flat
+
+
+def encode_page(elements: List[Dict[str, Any]]) -> bytes:
+    """Pack one page's elements column by column."""
+    columns = {f: [] for f in _FIELDS}
+    for e in elements:
+        for f in _FIELDS:
+            value = e.get(f)
+            columns[f].append(_flatten_coordinates(value) if f == "coordinates" else value)
+    return msgpack.packb(columns, use_bin_type=True)
+
+
+def decode_page(blob: bytes) -> List[Dict[str, Any]]:
+    columns = msgpack.unpackb(blob, raw=False)
+    elements = [dict(zip(_FIELDS, row)) for row in zip(*(columns[f] for f in _FIELDS))]
+    for e in elements:
+        flat = e["coordinates"]
+        if flat is not None:
+            e["coordinates"] = tuple(zip(flat[0::2], flat[1::2]))
+    return elements
+
+
+class ElementCache:
+    """
+    Raw extraction output per page, keyed by the caller (page content hash plus
+    extractor settings). Pages without elements are stored too, so they are not
+    re-parsed either. Safe to open from several processes (SQLite WAL).
+    """
+
+    def __init__(self, path: str = ELEMENT_CACHE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " key TEXT PRIMARY KEY, elements BLOB NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, keys: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[start:start + _LOOKUP_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT key, elements FROM pages WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = decode_page(blob)
+        return found
+
+    def put(self, pages: Dict[str, List[Dict[str, Any]]]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pages (key, elements, created) VALUES (?, ?, ?)",
+                [(key, encode_page(elements), now) for key, elements in pages.items()],
+            )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM pages")
+            self._conn.commit()
+
+
+_cache: Optional[ElementCache] = None
+_cache_pid: Optional[int] = None
+_cache_lock = threading.Lock()
+
+
+def get_element_cache() -> ElementCache:
+    """
+    Element cache for this process. A forked extraction worker opens its own
+    connection instead of reusing the parent's.
+    """
+    global _cache, _cache_pid
+    if _cache is None or _cache_pid != os.getpid():
+        with _cache_lock:
+            if _cache is None or _cache_pid != os.getpid():
+                _cache = ElementCache()
+                _cache_pid = os.getpid()
+    return _cache
@@ -1,19 +1,51 @@
 # src/ingestion/extract.py
 
-import uuid
+import hashlib
+import multiprocessing as mp
+import os
+import re
+import tempfile
+import time
+from collections import Counter, deque
+from multiprocessing.connection import wait
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
+import fitz  # PyMuPDF
 from unstructured.partition.pdf import partition_pdf
 from unstructured.partition.pptx import partition_pptx
 
-from src.ingestion.chunk_schema import Chunk
+from src.config import (
+    ELEMENT_CACHE_ENABLED,
+    INGEST_FILE_TIMEOUT,
+    INGEST_WORKERS,
+    PDF_MAX_IMAGE_AREA,
+    PDF_MIN_TEXT_CHARS,
+    PDF_STRATEGY,
+)
+from src.core.metrics import incr, observe, span
+from src.ingestion.chunk_schema import Chunk, ChunkBatch
+from src.ingestion.element_cache import get_element_cache
+from src.ingestion.manifest import pdf_page_hash
 
+# Part of every element cache key: bump when the hi_res call, the element
+# filtering in _extract_pdf_hi_res or the key itself changes
+_HI_RES_SETTINGS = "hi_res:2:eng:tables:images"
 
-def make_chunk(element, modality, path, file_type):
+PDF_STRATEGIES = ("auto", "fast", "hi_res")
+
+
+def chunk_id(file_name: str, page_number, modality: str, content: str, occurrence: int = 0) -> str:
+    """Content-derived chunk ID: the same element on the same page always gets the same ID."""
+    key = f"{file_name}\x1f{page_number}\x1f{modality}\x1f{content}\x1f{occurrence}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def make_chunk(element, modality, path, file_type, page=None):
     meta = element.metadata or {}
     text = getattr(element, "text", "").strip()
-    page = getattr(meta, "page_number", None)
+    if page is None:
+        page = getattr(meta, "page_number", None)
 
     # images
     if modality == "image":
@@ -25,30 +57,67 @@ def make_chunk(element, modality, path, file_type):
     if not content:
         return None
 
+    file_name = Path(path).name
     return Chunk(
-        id=str(uuid.uuid4()),
+        id=chunk_id(file_name, page, modality, content),
         content=content,
         modality=modality,
-        file_name=Path(path).name,
+        file_name=file_name,
         file_type=file_type,
         page_number=page,
-        extra={
-            "category": getattr(element, "category", None),
-            "coordinates": getattr(meta, "coordinates", None),
-            "image_path": getattr(meta, "image_path", None),
-        },
+        category=getattr(element, "category", None),
+        coordinates=getattr(meta, "coordinates", None),
+        image_path=getattr(meta, "image_path", None),
     )
 
 
-def extract_pdf(path: str) -> List[Chunk]:
-    """Uses full Unstructured extraction: text, tables, and images."""
-    elements = partition_pdf(
-        filename=path,
-        extract_images_in_pdf=True,
-        infer_table_structure=True,
-        languages=["eng"],
-        strategy="hi_res",
-    )
+def _disambiguate_ids(chunks: List[Chunk]) -> List[Chunk]:
+    """Repeated elements on a page (e.g. two identical bullets) get distinct, still stable IDs."""
+    seen = Counter()
+    for ch in chunks:
+        seen[ch.id] += 1
+        if seen[ch.id] > 1:
+            ch.id = chunk_id(ch.file_name, ch.page_number, ch.modality, ch.content, seen[ch.id] - 1)
+    return chunks
+
+
+def _pdf_subset(path: str, pages: List[int]) -> str:
+    """Write the given 1-based pages of a PDF to a temporary file and return its path."""
+    src = fitz.open(path)
+    out = fitz.open()
+    try:
+        for p in pages:
+            out.insert_pdf(src, from_page=p - 1, to_page=p - 1)
+        fd, tmp_path = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        out.save(tmp_path)
+    finally:
+        out.close()
+        src.close()
+    return tmp_path
+
+
+def _extract_pdf_hi_res(path: str, pages: Optional[List[int]] = None) -> List[Chunk]:
+    """Full Unstructured layout inference (text, tables, images) on all or some pages."""
+    page_map = None
+    source = path
+    if pages is not None:
+        page_map = sorted(set(pages))
+        if not page_map:
+            return []
+        source = _pdf_subset(path, page_map)
+
+    try:
+        elements = partition_pdf(
+            filename=source,
+            extract_images_in_pdf=True,
+            infer_table_structure=True,
+            languages=["eng"],
+            strategy="hi_res",
+        )
+    finally:
+        if source != path:
+            os.remove(source)
 
     chunks = []
 
@@ -63,15 +132,241 @@ def extract_pdf(path: str) -> List[Chunk]:
         else:
             continue
 
-        chunk = make_chunk(e, modality, path, "pdf")
+        page = None
+        if page_map is not None:
+            # Map the page number in the subset back to the original document
+            sub_page = getattr(e.metadata, "page_number", None)
+            page = page_map[sub_page - 1] if sub_page else None
+
+        chunk = make_chunk(e, modality, path, "pdf", page=page)
         if chunk:
+            chunk.extractor = "hi_res"
             chunks.append(chunk)
 
     return chunks
 
 
-def extract_pptx(path: str) -> List[Chunk]:
+def _element_key(doc, page, memo: Dict[int, bytes]) -> str:
+    """
+    Element cache key of a PDF page: the hi_res settings, the page's content
+    and resources (fonts, images, XObjects; see pdf_page_hash) and the geometry
+    it is rendered with for layout inference. Identical content streams with
+    different fonts or page boxes get different keys.
+    """
+    geometry = f"{tuple(page.mediabox)}:{tuple(page.cropbox)}:{page.rotation}"
+    key = f"{_HI_RES_SETTINGS}\x1f{pdf_page_hash(doc, page, memo)}\x1f{geometry}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _cached_chunks(path: str, page: int, elements: List[dict]) -> List[Chunk]:
+    """Chunks for one page from cached hi_res elements (IDs use the current file name)."""
+    file_name = Path(path).name
+    return [
+        Chunk(
+            id=chunk_id(file_name, page, e["modality"], e["content"]),
+            content=e["content"],
+            modality=e["modality"],
+            file_name=file_name,
+            file_type="pdf",
+            page_number=page,
+            category=e["category"],
+            coordinates=e["coordinates"],
+            image_path=e["image_path"],
+            extractor="hi_res",
+        )
+        for e in elements
+    ]
+
+
+def _extract_pdf_hi_res_cached(path: str, pages: List[int], total_pages: int) -> Tuple[List[Chunk], int]:
+    """
+    hi_res extraction of `pages`, answered from the element cache for pages whose
+    content was parsed before. Returns the chunks and the number of cached pages.
+    """
+    if not ELEMENT_CACHE_ENABLED:
+        subset = None if len(pages) == total_pages else pages
+        return _extract_pdf_hi_res(path, subset), 0
+
+    memo: Dict[int, bytes] = {}
+    with fitz.open(path) as doc:
+        keys = {p: _element_key(doc, doc[p - 1], memo) for p in pages}
+    cache = get_element_cache()
+    cached = cache.get(list(set(keys.values())))
+    missing = [p for p in pages if keys[p] not in cached]
+
+    chunks: List[Chunk] = []
+    if missing:
+        # Skip the subset copy when every page of the file needs hi_res anyway
+        subset = None if len(missing) == total_pages else missing
+        fresh = _extract_pdf_hi_res(path, subset)
+        by_page: Dict[int, List[dict]] = {p: [] for p in missing}
+        for ch in fresh:
+            if ch.page_number in by_page:
+                by_page[ch.page_number].append({
+                    "content": ch.content,
+                    "modality": ch.modality,
+                    "category": ch.category,
+                    "coordinates": ch.coordinates,
+                    "image_path": ch.image_path,
+                })
+        cache.put({keys[p]: elements for p, elements in by_page.items()})
+        chunks.extend(fresh)
+
+    for p in pages:
+        if keys[p] in cached:
+            chunks.extend(_cached_chunks(path, p, cached[keys[p]]))
+    chunks.sort(key=lambda c: c.page_number or 0)
+    return chunks, len(pages) - len(missing)
+
+
+_BULLET_RE = re.compile(r"^(?:[\u2022\u25aa\u25cf\u2013*-]|\d+[.)])\s+")
+
+
+def _page_needs_hi_res(page, text_blocks) -> bool:
+    """A page needs layout inference if it has no text layer, a table or large images."""
+    if sum(len(b["text"]) for b in text_blocks) < PDF_MIN_TEXT_CHARS:
+        return True
+
+    page_area = abs(page.rect) or 1.0
+    image_area = sum(
+        abs(fitz.Rect(info["bbox"]) & page.rect) for info in page.get_image_info()
+    )
+    if image_area / page_area >= PDF_MAX_IMAGE_AREA:
+        return True
+
+    try:
+        return bool(page.find_tables().tables)
+    except AttributeError:  # PyMuPDF without table detection
+        return False
+
+
+def _text_blocks(page) -> List[dict]:
+    blocks = []
+    for block in page.get_text("dict")["blocks"]:
+        if block.get("type") != 0:
+            continue
+        spans = [span for line in block["lines"] for span in line["spans"] if span["text"].strip()]
+        if not spans:
+            continue
+        text = "\n".join(
+            "".join(span["text"] for span in line["spans"]).strip() for line in block["lines"]
+        ).strip()
+        blocks.append({
+            "text": text,
+            "size": max(span["size"] for span in spans),
+            "bold": all(span["flags"] & 16 for span in spans),
+            "bbox": tuple(block["bbox"]),
+            "chars": [(span["size"], len(span["text"])) for span in spans],
+        })
+    return blocks
+
+
+def _body_font_size(blocks_by_page: Dict[int, List[dict]]) -> float:
+    """Character-weighted median font size, i.e. the size of ordinary body text."""
+    sizes = sorted(
+        (size, n) for blocks in blocks_by_page.values() for b in blocks for size, n in b["chars"]
+    )
+    total = sum(n for _, n in sizes)
+    running = 0
+    for size, n in sizes:
+        running += n
+        if running * 2 >= total:
+            return size
+    return 0.0
+
+
+def _blocks_to_chunks(path: str, blocks_by_page: Dict[int, List[dict]]) -> List[Chunk]:
+    """Turn PyMuPDF text blocks into the same Title / ListItem / NarrativeText chunks as hi_res."""
+    file_name = Path(path).name
+    body_size = _body_font_size(blocks_by_page)
+    chunks = []
+
+    for page_number in sorted(blocks_by_page):
+        for b in blocks_by_page[page_number]:
+            text = b["text"]
+            short = len(text) <= 150 and "\n" not in text and not text.endswith(".")
+            if short and (b["size"] >= body_size * 1.15 or b["bold"]):
+                category = "Title"
+            elif _BULLET_RE.match(text):
+                category = "ListItem"
+            else:
+                category = "NarrativeText"
+
+            chunks.append(Chunk(
+                id=chunk_id(file_name, page_number, "text", text),
+                content=text,
+                modality="text",
+                file_name=file_name,
+                file_type="pdf",
+                page_number=page_number,
+                category=category,
+                coordinates=b["bbox"],
+                extractor="pymupdf",
+            ))
+
+    return chunks
+
+
+def extract_pdf(
+    path: str,
+    pages: Optional[Iterable[int]] = None,
+    strategy: Optional[str] = None,
+) -> List[Chunk]:
+    """
+    Extract text, tables and images from a PDF. If `pages` is given, only those
+    1-based pages are parsed.
+
+    strategy "hi_res" runs Unstructured layout inference on every page, "fast"
+    uses only the PyMuPDF text layer, and "auto" (default, see PDF_STRATEGY) reads
+    every page with PyMuPDF and sends only pages without a text layer, with
+    tables or with large images to hi_res. An empty `pages` parses nothing.
+    """
+    strategy = strategy or PDF_STRATEGY
+    if strategy not in PDF_STRATEGIES:
+        raise ValueError(f"Unknown PDF strategy {strategy!r}; expected one of {PDF_STRATEGIES}")
+    wanted = sorted(set(pages)) if pages is not None else None
+    if wanted == []:
+        return []
+
+    if strategy == "hi_res":
+        with fitz.open(path) as doc:
+            total_pages = doc.page_count
+        chunks, _ = _extract_pdf_hi_res_cached(
+            path, wanted if wanted is not None else list(range(1, total_pages + 1)), total_pages
+        )
+        return _disambiguate_ids(chunks)
+
+    fast_blocks: Dict[int, List[dict]] = {}
+    hi_res_pages: List[int] = []
+    with fitz.open(path) as doc:
+        page_numbers = wanted if wanted is not None else range(1, doc.page_count + 1)
+        for page_number in page_numbers:
+            page = doc[page_number - 1]
+            blocks = _text_blocks(page)
+            if strategy == "auto" and _page_needs_hi_res(page, blocks):
+                hi_res_pages.append(page_number)
+            else:
+                fast_blocks[page_number] = blocks
+        total_pages = doc.page_count
+
+    chunks = _blocks_to_chunks(path, fast_blocks)
+    cached_pages = 0
+    if hi_res_pages:
+        hi_res_chunks, cached_pages = _extract_pdf_hi_res_cached(path, hi_res_pages, total_pages)
+        chunks.extend(hi_res_chunks)
+        chunks.sort(key=lambda c: c.page_number or 0)
+
+    print(
+        f"[INFO] {Path(path).name}: {len(fast_blocks)} page(s) via PyMuPDF, "
+        f"{len(hi_res_pages)} page(s) via hi_res ({cached_pages} from the element cache)"
+    )
+    return _disambiguate_ids(chunks)
+
+
+def extract_pptx(path: str, pages: Optional[Iterable[int]] = None) -> List[Chunk]:
+    """Slides are cheap to parse, so `pages` only filters the output."""
     elements = partition_pptx(path, extract_images_in_pptx=True)
+    wanted = set(pages) if pages is not None else None
     chunks = []
 
     for e in elements:
@@ -86,22 +381,128 @@ def extract_pptx(path: str) -> List[Chunk]:
             continue
 
         chunk = make_chunk(e, modality, path, "pptx")
-        if chunk:
+        if chunk and (wanted is None or chunk.page_number in wanted):
             chunks.append(chunk)
 
-    return chunks
+    return _disambiguate_ids(chunks)
 
 
-def extract_from_files(file_paths: List[str]) -> List[Chunk]:
-    final = []
+def extract_file(path: str, pages: Optional[Iterable[int]] = None) -> List[Chunk]:
+    """Extract chunks from a single file (optionally only some pages), dispatching on its extension."""
+    ext = Path(path).suffix.lower()
+    if ext == ".pdf":
+        return extract_pdf(path, pages=pages)
+    elif ext in [".pptx", ".ppt"]:
+        return extract_pptx(path, pages=pages)
 
-    for path in file_paths:
-        ext = Path(path).suffix.lower()
-        if ext == ".pdf":
-            final.extend(extract_pdf(path))
-        elif ext in [".pptx", ".ppt"]:
-            final.extend(extract_pptx(path))
-        else:
-            print(f"[WARN] Unsupported file type: {path}")
+    print(f"[WARN] Unsupported file type: {path}")
+    return []
+
+
+def _extract_worker(path: str, pages, conn) -> None:
+    """Child-process entry point: extract one file and send the result back."""
+    try:
+        # Columnar batches pickle far smaller and faster than lists of Chunks
+        conn.send(("ok", ChunkBatch.from_chunks(extract_file(path, pages=pages))))
+    except BaseException as e:  # report everything, the parent decides what to do
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+def iter_extract_from_files(
+    file_paths: List[str],
+    workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    pages: Optional[Dict[str, Iterable[int]]] = None,
+) -> Iterator[Tuple[str, ChunkBatch]]:
+    """
+    Yield (path, chunks) for each file as soon as that file has been extracted.
+    Chunks come as a ChunkBatch; Chunk objects are built as it is iterated.
+
+    With more than one worker every file is parsed in its own process, so a crash
+    or a hang in Unstructured only loses that file: failures are logged and skipped,
+    and a file still running after `timeout` seconds is killed. Results arrive in
+    completion order, not input order. `pages` optionally restricts a file to a
+    subset of its pages (see `extract_file`).
+    """
+    workers = INGEST_WORKERS if workers is None else workers
+    timeout = INGEST_FILE_TIMEOUT if timeout is None else timeout
+    pages = pages or {}
+
+    if workers <= 1:
+        for path in file_paths:
+            try:
+                with span("ingest.extract"):
+                    chunks = ChunkBatch.from_chunks(extract_file(path, pages=pages.get(path)))
+            except Exception as e:
+                print(f"[WARN] Failed to extract {path}: {type(e).__name__}: {e}")
+                continue
+            yield path, chunks
+        return
 
-    return final
+    # Not fork: the parent may hold threads (Streamlit, metrics, Chroma) and
+    # locks that a forked child would inherit mid-use
+    ctx = mp.get_context("spawn")
+    pending = deque(file_paths)
+    running = {}  # receiving end of the pipe -> (path, process, start time)
+
+    try:
+        while pending or running:
+            while pending and len(running) < workers:
+                path = pending.popleft()
+                recv_conn, send_conn = ctx.Pipe(duplex=False)
+                proc = ctx.Process(target=_extract_worker, args=(path, pages.get(path), send_conn))
+                proc.start()
+                send_conn.close()
+                running[recv_conn] = (path, proc, time.monotonic())
+
+            wait_for = None
+            if timeout:
+                next_deadline = min(started + timeout for _, _, started in running.values())
+                wait_for = max(0.0, next_deadline - time.monotonic())
+
+            for conn in wait(list(running), timeout=wait_for):
+                path, proc, started = running.pop(conn)
+                try:
+                    status, payload = conn.recv()
+                except EOFError:
+                    proc.join()
+                    status, payload = "error", f"worker exited with code {proc.exitcode}"
+                conn.close()
+                proc.join()
+
+                if status == "ok":
+                    # Worker wall time, including the transfer back to this process
+                    observe("ingest.extract", time.monotonic() - started)
+                    yield path, payload
+                else:
+                    print(f"[WARN] Failed to extract {path}: {payload}")
+
+            if timeout:
+                now = time.monotonic()
+                for conn, (path, proc, started) in list(running.items()):
+                    # A finished worker may sit blocked on a large send while the
+                    # consumer is busy; only kill workers that have produced nothing.
+                    if now - started > timeout and not conn.poll():
+                        proc.terminate()
+                        proc.join()
+                        conn.close()
+                        del running[conn]
+                        incr("ingest.extract_timeouts")
+                        print(f"[WARN] Timed out extracting {path} after {timeout}s")
+    finally:
+        for conn, (_, proc, _) in running.items():
+            proc.terminate()
+            proc.join()
+            conn.close()
+
+
+def extract_from_files(
+    file_paths: List[str],
+    workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> ChunkBatch:
+    return ChunkBatch.concat(
+        chunks for _, chunks in iter_extract_from_files(file_paths, workers=workers, timeout=timeout)
+    )
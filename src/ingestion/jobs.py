@@ -0,0 +1,185 @@
+# src/ingestion/jobs.py
+"""
+Background ingestion jobs.
+
+Jobs run one at a time on a daemon thread, so the Streamlit script (and chat)
+keeps working while documents are indexed. Each job is saved as a JSON file
+after every state change; jobs that were queued or running when the process
+stopped are picked up again on start. Ingestion is incremental, so a resumed
+job skips the files it already finished.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.config import INGEST_JOBS_DIR, INGEST_JOBS_KEEP
+from src.ingestion.pipeline import ingest_files
+
+# Job states; the last three are final
+QUEUED, RUNNING, CANCELLING, DONE, CANCELLED, FAILED = (
+    "queued", "running", "cancelling", "done", "cancelled", "failed",
+)
+FINISHED = (DONE, CANCELLED, FAILED)
+
+
+class JobQueue:
+    def __init__(self, jobs_dir: str = INGEST_JOBS_DIR, keep: int = INGEST_JOBS_KEEP):
+        self.jobs_dir = jobs_dir
+        self.keep = keep
+        os.makedirs(jobs_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._queue: "queue.Queue[str]" = queue.Queue()
+
+        # Resume whatever was interrupted, in submission order
+        for job in sorted(self._load_all(), key=lambda j: j["created"]):
+            self._jobs[job["id"]] = job
+            if job["status"] == CANCELLING:
+                job["status"] = CANCELLED
+                self._save(job)
+            elif job["status"] not in FINISHED:
+                job["status"] = QUEUED
+                job["resumed"] = True
+                self._save(job)
+                self._queue.put(job["id"])
+
+        self._worker = threading.Thread(target=self._run, name="ingest-jobs", daemon=True)
+        self._worker.start()
+
+    # ----- persistence -----
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _load_all(self) -> List[Dict[str, Any]]:
+        jobs = []
+        for name in os.listdir(self.jobs_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.jobs_dir, name), "r", encoding="utf-8") as f:
+                    jobs.append(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"[WARN] Ignoring unreadable job file {name}: {e}")
+        return jobs
+
+    def _save(self, job: Dict[str, Any]) -> None:
+        job["updated"] = time.time()
+        tmp = self._path(job["id"]) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(tmp, self._path(job["id"]))
+
+    def _prune(self) -> None:
+        finished = sorted(
+            (j for j in self._jobs.values() if j["status"] in FINISHED),
+            key=lambda j: j["created"],
+        )
+        for job in finished[:max(0, len(finished) - self.keep)]:
+            del self._jobs[job["id"]]
+            try:
+                os.remove(self._path(job["id"]))
+            except OSError:
+                pass
+
+    # ----- public API -----
+
+    def submit(self, paths: List[str]) -> str:
+        """Queue `paths` for ingestion and return the job ID."""
+        job = {
+            "id": uuid.uuid4().hex[:12],
+            "created": time.time(),
+            "status": QUEUED,
+            "files": [
+                {"path": p, "file_name": Path(p).name, "stage": "queued", "written": 0}
+                for p in paths
+            ],
+            "stats": None,
+            "error": None,
+        }
+        with self._lock:
+            self._jobs[job["id"]] = job
+            self._save(job)
+            self._prune()
+        self._queue.put(job["id"])
+        return job["id"]
+
+    def cancel(self, job_id: str) -> None:
+        """Stop a job; a running one stops at its next write batch."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] in FINISHED:
+                return
+            job["status"] = CANCELLED if job["status"] == QUEUED else CANCELLING
+            self._save(job)
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        """Snapshot of all known jobs, newest first."""
+        with self._lock:
+            return [json.loads(json.dumps(j)) for j in sorted(self._jobs.values(), key=lambda j: -j["created"])]
+
+    # ----- worker -----
+
+    def _run(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job["status"] != QUEUED:
+                    continue
+                job["status"] = RUNNING
+                job["started"] = time.time()
+                self._save(job)
+
+            files = {f["path"]: f for f in job["files"]}
+
+            def progress(path: str, stage: str, info: Dict[str, Any]) -> None:
+                with self._lock:
+                    entry = files.get(path)
+                    if entry is not None:
+                        entry["stage"] = stage
+                        entry.update(info)
+                        self._save(job)
+
+            def should_stop() -> bool:
+                return job["status"] == CANCELLING
+
+            try:
+                stats = ingest_files(list(files), progress=progress, should_stop=should_stop)
+                with self._lock:
+                    job["stats"] = vars(stats)
+                    job["status"] = CANCELLED if stats.cancelled else DONE
+            except Exception as e:
+                print(f"[WARN] Ingestion job {job_id} failed: {type(e).__name__}: {e}")
+                with self._lock:
+                    job["status"] = FAILED
+                    job["error"] = f"{type(e).__name__}: {e}"
+
+            with self._lock:
+                job["finished"] = time.time()
+                for entry in job["files"]:
+                    if entry["stage"] in ("queued", "extracting", "indexing"):
+                        entry["stage"] = job["status"] if job["status"] != DONE else "failed"
+                self._save(job)
+                self._prune()
+
+
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide job queue; starts its worker (and resumes jobs) on first use."""
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = JobQueue()
+    return _job_queue
@@ -0,0 +1,201 @@
+# src/ingestion/manifest.py
+
+import hashlib
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+import fitz  # PyMuPDF
+from pptx import Presentation
+
+from src.config import CHROMA_DIR
+from src.core.store import store_path
+
+MANIFEST_PATH = os.path.join(CHROMA_DIR, "ingest_manifest.json")
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# Indirect references inside a PDF object, except back up the page tree
+_PDF_REF_RE = re.compile(rb"(?<!/Parent )(\d+) 0 R")
+
+
+def _pdf_object_hash(doc, xref: int, memo: Dict[int, bytes]) -> bytes:
+    """
+    Hash of a PDF object, its stream and everything it references (a font's
+    descriptor, widths and embedded font file, a form's own resources...).
+    """
+    digest = memo.get(xref)
+    if digest is None:
+        memo[xref] = b""  # breaks reference cycles
+        source = doc.xref_object(xref, compressed=True).encode("latin-1", "replace")
+        h = hashlib.sha256(source)
+        if doc.xref_is_stream(xref):
+            h.update(doc.xref_stream_raw(xref) or b"")
+        for ref in _PDF_REF_RE.findall(source):
+            h.update(_pdf_object_hash(doc, int(ref), memo))
+        digest = memo[xref] = h.digest()
+    return digest
+
+
+def pdf_page_hash(doc, page, memo: Optional[Dict[int, bytes]] = None) -> str:
+    """
+    Hash of one page's content stream and of the resources it draws with: fonts,
+    images and form XObjects, followed through their references. Pass the same
+    `memo` for pages of one document to hash shared resources once.
+    """
+    memo = {} if memo is None else memo
+    h = hashlib.sha256(page.read_contents())
+    xrefs = {f[0] for f in page.get_fonts(full=True)}
+    xrefs |= {img[0] for img in page.get_images(full=True)}
+    xrefs |= {x[0] for x in page.get_xobjects()}
+    for xref in sorted(x for x in xrefs if x > 0):
+        h.update(_pdf_object_hash(doc, xref, memo))
+    return h.hexdigest()
+
+
+def _pdf_page_hashes(path: str) -> Dict[int, str]:
+    memo: Dict[int, bytes] = {}
+    with fitz.open(path) as doc:
+        return {i: pdf_page_hash(doc, page, memo) for i, page in enumerate(doc, start=1)}
+
+
+def _pptx_page_hashes(path: str) -> Dict[int, str]:
+    hashes = {}
+    for i, slide in enumerate(Presentation(path).slides, start=1):
+        h = hashlib.sha256(slide.part.blob)
+        for rel in slide.part.rels.values():
+            if not rel.is_external:
+                h.update(getattr(rel.target_part, "blob", b""))
+        hashes[i] = h.hexdigest()
+    return hashes
+
+
+def page_hashes(path: str) -> Optional[Dict[int, str]]:
+    """Per-page (PDF) or per-slide (PPTX) content hashes, or None if not supported."""
+    ext = Path(path).suffix.lower()
+    try:
+        if ext == ".pdf":
+            return _pdf_page_hashes(path)
+        if ext == ".pptx":
+            return _pptx_page_hashes(path)
+    except Exception as e:
+        print(f"[WARN] Could not hash pages of {path}: {type(e).__name__}: {e}")
+    return None
+
+
+@dataclass
+class FilePlan:
+    """What needs to happen to bring one file's vectors up to date."""
+    path: str
+    file_name: str
+    file_hash: str
+    page_hashes: Optional[Dict[int, str]]
+    skip: bool = False
+    new_file: bool = False
+    # Pages to (re-)extract; None means the whole file
+    pages: Optional[List[int]] = None
+    # Previously stored document IDs that this update replaces
+    affected: Set[str] = field(default_factory=set)
+
+
+class Manifest:
+    """
+    Persistent record of what has been indexed: for each file its hash, its page
+    hashes and the IDs and page spans of the documents it produced.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        path = path or store_path(MANIFEST_PATH)
+        self.path = path
+        self.files: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "files": self.files}, f)
+        os.replace(tmp_path, self.path)
+
+    def forget(self, file_name: str) -> None:
+        """Drop a file's record, so its next ingest rebuilds it from scratch."""
+        self.files.pop(file_name, None)
+
+    def plan(self, path: str) -> FilePlan:
+        name = Path(path).name
+        entry = self.files.get(name)
+        fh = file_hash(path)
+
+        if entry and entry["file_hash"] == fh:
+            return FilePlan(path, name, fh, None, skip=True)
+
+        ph = page_hashes(path)
+        plan = FilePlan(path, name, fh, ph, new_file=entry is None)
+        if entry is None:
+            return plan
+
+        spans = {doc_id: tuple(span) for doc_id, span in entry["docs"].items()}
+        old_pages = entry.get("pages")
+        if ph is None or old_pages is None or any(None in span for span in spans.values()):
+            plan.affected = set(spans)
+            return plan
+
+        old_pages = {int(p): h for p, h in old_pages.items()}
+        dirty = {p for p, h in ph.items() if old_pages.get(p) != h}
+        dirty |= set(old_pages) - set(ph)
+
+        # Re-read the page before each changed run so that text continuing a
+        # section from the previous page is merged under its title again
+        dirty |= {p - 1 for p in dirty if p - 1 not in dirty and p - 1 in ph}
+
+        # A section spanning a changed page is rebuilt from all of its pages
+        while True:
+            grown = set(dirty)
+            for first, last in spans.values():
+                if any(first <= p <= last for p in dirty):
+                    grown.update(range(first, last + 1))
+            if grown == dirty:
+                break
+            dirty = grown
+
+        plan.pages = sorted(p for p in dirty if p in ph)
+        plan.affected = {
+            doc_id for doc_id, (first, last) in spans.items()
+            if any(first <= p <= last for p in dirty)
+        }
+        return plan
+
+    def stored_ids(self, file_name: str) -> Set[str]:
+        """IDs of the documents currently stored for `file_name`."""
+        return set(self.files.get(file_name, {}).get("docs", {}))
+
+    def apply(self, plan: FilePlan, spans: Dict[str, List]) -> List[str]:
+        """
+        Record the documents produced for `plan`, given as {doc ID: [first page,
+        last page]}. Returns the IDs of stored documents that are now stale.
+        """
+        old_docs = self.files.get(plan.file_name, {}).get("docs", {})
+        stale = sorted(plan.affected - set(spans))
+
+        stale_set = set(stale)
+        kept = {doc_id: span for doc_id, span in old_docs.items() if doc_id not in stale_set}
+        kept.update(spans)
+
+        self.files[plan.file_name] = {
+            "file_hash": plan.file_hash,
+            "pages": {str(p): h for p, h in plan.page_hashes.items()} if plan.page_hashes else None,
+            "docs": kept,
+        }
+        return stale
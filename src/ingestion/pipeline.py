@@ -0,0 +1,183 @@
+# src/ingestion/pipeline.py
+
+from dataclasses import dataclass
+from itertools import groupby, islice
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.documents import Document
+
+from src.config import INGEST_WRITE_BATCH
+from src.core.hierarchy import update_file as update_hierarchy
+from src.core.metrics import incr, span
+from src.core.vectorstore import add_documents, delete_documents, delete_file, writing
+from src.ingestion.chunk_schema import ChunkBatch
+from src.ingestion.extract import iter_extract_from_files
+from src.ingestion.manifest import FilePlan, Manifest
+from src.ingestion.to_documents import iter_documents
+
+
+@dataclass
+class IngestStats:
+    files: int = 0
+    skipped_files: int = 0
+    failed_files: int = 0
+    pages_extracted: int = 0
+    fast_pages: int = 0      # PDF pages read from the PyMuPDF text layer
+    hi_res_pages: int = 0    # PDF pages sent to Unstructured hi_res
+    written: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    duplicates: int = 0      # new chunks not stored as near-duplicates of stored ones
+    cancelled: bool = False
+
+
+# progress(path, stage, info): stage is "skipped", "extracting", "indexing",
+# "done" or "failed"; info carries counts such as {"written": n}
+ProgressCallback = Callable[[str, str, Dict[str, Any]], None]
+
+
+def _documents_for_pages(chunks: ChunkBatch, pages: Optional[List[int]]) -> Iterator[Document]:
+    """
+    Stream documents for one file's chunks, kept in reading order. When only
+    some pages were extracted, each run of consecutive pages is converted on its
+    own so titles never merge across a gap.
+    """
+    if pages is None:
+        yield from iter_documents(chunks)
+        return
+
+    run_of = {}
+    run, prev = 0, None
+    for p in pages:
+        if prev is not None and p != prev + 1:
+            run += 1
+        run_of[p] = run
+        prev = p
+
+    # Runs are contiguous in reading order; chunks outside every run are ignored
+    runs = groupby(
+        (ch for ch in chunks if ch.page_number in run_of),
+        key=lambda ch: run_of[ch.page_number],
+    )
+    for _, run_chunks in runs:
+        yield from iter_documents(run_chunks)
+
+
+def ingest_files(
+    paths: List[str],
+    workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    progress: Optional[ProgressCallback] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> IngestStats:
+    """
+    Incrementally index files. Unchanged files are skipped, changed PDFs only have
+    their changed pages re-parsed, new content is upserted under content-derived
+    IDs and documents that no longer exist are deleted.
+
+    `progress` is told about each file's stage. `should_stop` is polled between
+    write batches; once it returns True the run stops, and a file that was only
+    partly written is not recorded in the manifest, so the next run redoes it.
+    """
+    progress = progress or (lambda path, stage, info: None)
+    should_stop = should_stop or (lambda: False)
+    stats = IngestStats(files=len(paths))
+    manifest = Manifest()
+
+    plans = {}
+    for path in paths:
+        plan = manifest.plan(path)
+        if plan.skip:
+            stats.skipped_files += 1
+            progress(path, "skipped", {})
+        else:
+            plans[path] = plan
+            progress(path, "extracting", {})
+
+    pages = {path: plan.pages for path, plan in plans.items() if plan.pages is not None}
+    done = set()
+    extracted = iter_extract_from_files(list(plans), workers=workers, timeout=timeout, pages=pages)
+    try:
+        for path, chunks in extracted:
+            if should_stop():
+                stats.cancelled = True
+                break
+            # One file's deletes, chunks and hierarchy show up to readers as one write
+            with writing():
+                indexed = _index_file(manifest, plans[path], chunks, stats, progress, should_stop)
+            if indexed:
+                done.add(path)
+            else:
+                stats.cancelled = True
+                break
+    finally:
+        # Stops extraction workers still running
+        extracted.close()
+
+    if not stats.cancelled:
+        for path in plans:
+            if path not in done:
+                stats.failed_files += 1
+                progress(path, "failed", {})
+    incr("ingest.files_failed", stats.failed_files)
+    incr("ingest.files_skipped", stats.skipped_files)
+    return stats
+
+
+def _index_file(
+    manifest: Manifest,
+    plan: FilePlan,
+    chunks: ChunkBatch,
+    stats: IngestStats,
+    progress: ProgressCallback,
+    should_stop: Callable[[], bool],
+) -> bool:
+    """Write one extracted file. Returns False if stopped before it was recorded."""
+    path = plan.path
+    progress(path, "indexing", {"written": 0})
+    if plan.new_file:
+        # Drop anything indexed for this file before it was tracked (random IDs)
+        delete_file(plan.file_name)
+
+    # Documents are produced and written batch by batch; only their IDs and
+    # page spans are kept for the manifest
+    stored = manifest.stored_ids(plan.file_name)
+    spans = {}
+    written = 0
+    duplicates = 0
+    docs = _documents_for_pages(chunks, plan.pages)
+    while True:
+        if should_stop():
+            return False
+        with span("ingest.chunk"):
+            batch = list(islice(docs, INGEST_WRITE_BATCH))
+        if not batch:
+            break
+        to_write = [d for d in batch if d.metadata["chunk_id"] not in stored]
+        if to_write:
+            stored_now = add_documents(to_write)
+            written += stored_now
+            duplicates += len(to_write) - stored_now
+            progress(path, "indexing", {"written": written, "duplicates": duplicates})
+        for d in batch:
+            spans[d.metadata["chunk_id"]] = [d.metadata.get("page_number"), d.metadata.get("last_page")]
+
+    stale = manifest.apply(plan, spans)
+    delete_documents(stale)
+    update_hierarchy(plan.file_name)
+    manifest.save()
+    incr("ingest.chunks", len(chunks))
+    incr("ingest.documents", len(spans))
+
+    stats.pages_extracted += len(chunks.page_set())
+    stats.fast_pages += len(chunks.page_set(extractor="pymupdf"))
+    stats.hi_res_pages += len(chunks.page_set(extractor="hi_res"))
+    unchanged = len(spans) - written - duplicates
+    stats.written += written
+    stats.duplicates += duplicates
+    stats.unchanged += unchanged
+    stats.deleted += len(stale)
+    progress(path, "done", {
+        "written": written, "duplicates": duplicates, "unchanged": unchanged, "deleted": len(stale),
+    })
+    return True
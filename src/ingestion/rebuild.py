@@ -0,0 +1,48 @@
+# src/ingestion/rebuild.py
+"""
+Re-chunk and re-index documents without running layout inference again.
+
+    python -m src.ingestion.rebuild                 # every file in data/raw
+    python -m src.ingestion.rebuild a.pdf b.pptx
+
+Use after changing chunking (splitter sizes, title merging, ...). Each file's
+documents are replaced: PDF pages that needed hi_res are read back from the
+element cache, and unchanged chunks hit the embedding cache.
+"""
+
+import argparse
+import os
+from pathlib import Path
+from typing import List, Optional
+
+from src.ingestion.manifest import Manifest
+from src.ingestion.pipeline import IngestStats, ingest_files
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "raw")
+
+
+def rebuild_index(paths: List[str], workers: Optional[int] = None) -> IngestStats:
+    """Forget `paths` in the manifest and ingest them again from scratch."""
+    manifest = Manifest()
+    for path in paths:
+        manifest.forget(Path(path).name)
+    manifest.save()
+    return ingest_files(paths, workers=workers)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild the index from cached extraction output.")
+    parser.add_argument("paths", nargs="*", help=f"files to rebuild (default: everything in {DEFAULT_DIR})")
+    parser.add_argument("--workers", type=int, default=None, help="extraction worker processes")
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(
+        str(p) for p in Path(DEFAULT_DIR).iterdir()
+        if p.suffix.lower() in (".pdf", ".ppt", ".pptx")
+    )
+    stats = rebuild_index(paths, workers=args.workers)
+    print(f"[INFO] Rebuilt {stats.files} file(s): {stats}")
+
+
+if __name__ == "__main__":
+    main()
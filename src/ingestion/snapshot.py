@@ -0,0 +1,360 @@
+# src/ingestion/snapshot.py
+"""
+Versioned, checksummed snapshots of the store.
+
+    python -m src.ingestion.snapshot export          # writer: snapshot the live store
+    python -m src.ingestion.snapshot import latest   # replica: import without serving
+    python -m src.ingestion.snapshot list
+
+A snapshot is a directory named after the collection version it was taken at.
+It holds a file-level copy of the store - Chroma's SQLite database and HNSW
+segment files, the BM25 and dedup indexes, the ingest manifest, the collection
+version and the current quantized index, if any - plus a snapshot.json with
+the SHA-256 of every file. SQLite databases are copied with the backup API;
+the copy is taken while this process's writers are paused and discarded if
+any process wrote to the store meanwhile (vectorstore.writing). A snapshot is
+written beside its final name and renamed into place, so it either exists
+complete or not at all. Importing is a plain copy of the files into a fresh
+directory (nothing is re-embedded or re-indexed), which a read-only app can
+switch to with vectorstore.use_store.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from src.config import (
+    ANSWER_CACHE_PATH,
+    EMBEDDING_BACKEND,
+    EMBEDDING_MODEL,
+    QUANTIZED_INDEX_DIR,
+    REPLICA_DIR,
+    SNAPSHOT_DIR,
+    SNAPSHOT_KEEP,
+    SNAPSHOT_POLL_S,
+    VECTOR_INDEX,
+)
+from src.core.metrics import span
+from src.core.store import active_dir, store_path
+from src.core.vectorstore import (
+    WRITING_PATH,
+    collection_version,
+    get_vectorstore,
+    pause_writes,
+    use_store,
+    write_in_progress,
+)
+
+FORMAT_VERSION = 2
+_META = "snapshot.json"
+_STORE = "store"  # the copied store, inside a snapshot
+_IMPORTED = ".imported"  # written last into a complete imported store
+_PINS = ".pins"  # in the replica directory: one file per serving process
+
+_current: Optional[str] = None  # snapshot the process is serving, if any
+_load_lock = threading.Lock()
+_poller: Optional[threading.Thread] = None
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _copy_sqlite(src: str, dst: str) -> None:
+    """Consistent copy of a live SQLite database, including its WAL."""
+    source = sqlite3.connect(src)
+    target = sqlite3.connect(dst)
+    try:
+        with target:
+            source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def _copy_store(store: str, directory: str, version: int) -> None:
+    """Copy the files of `store` to `directory`, skipping temporary and stale ones."""
+    quantized = os.path.normpath(store_path(QUANTIZED_INDEX_DIR))
+    skip = {os.path.normpath(store_path(WRITING_PATH)), os.path.normpath(store_path(ANSWER_CACHE_PATH))}
+    for root, dirs, files in os.walk(store):
+        if os.path.normpath(root) == quantized:
+            # Only indexes of this version, complete ones
+            dirs[:] = [d for d in dirs if d.endswith(f"-v{version}")]
+        else:
+            dirs[:] = [d for d in dirs if ".tmp" not in d]
+        target = os.path.join(directory, os.path.relpath(root, store))
+        os.makedirs(target, exist_ok=True)
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.normpath(path) in skip or name.endswith(("-wal", "-shm", "-journal")) or ".tmp" in name:
+                continue
+            if name.endswith(".sqlite3"):
+                _copy_sqlite(path, os.path.join(target, name))
+            else:
+                shutil.copyfile(path, os.path.join(target, name))
+
+
+def _export_once(directory: str, version: int) -> None:
+    if VECTOR_INDEX != "chroma":
+        from src.core.quantized_index import open_or_build
+
+        # Shipped with the snapshot so that replicas do not build it
+        open_or_build(VECTOR_INDEX, version)
+
+    with pause_writes():
+        if write_in_progress():
+            raise RuntimeError(
+                f"a write is in progress (if no writer is running, remove {store_path(WRITING_PATH)})"
+            )
+        client = get_vectorstore()._client
+        names = sorted(getattr(c, "name", c) for c in client.list_collections())
+        collections = {name: {"count": client.get_collection(name).count()} for name in names}
+        _copy_store(active_dir(), os.path.join(directory, _STORE), version)
+
+    files = {}
+    for root, _, names_in_dir in os.walk(directory):
+        for name in names_in_dir:
+            path = os.path.join(root, name)
+            files[os.path.relpath(path, directory).replace(os.sep, "/")] = _sha256(path)
+
+    meta = {
+        "format": FORMAT_VERSION,
+        "collection_version": version,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "embedding_model": EMBEDDING_MODEL,
+        "embedding_backend": EMBEDDING_BACKEND,
+        "collections": collections,
+        "files": files,
+    }
+    with open(os.path.join(directory, _META), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=1)
+
+
+def list_snapshots(snapshot_dir: str = SNAPSHOT_DIR) -> List[str]:
+    """Complete snapshots in `snapshot_dir`, oldest first."""
+    if not os.path.isdir(snapshot_dir):
+        return []
+    return sorted(
+        os.path.join(snapshot_dir, name)
+        for name in os.listdir(snapshot_dir)
+        if name.startswith("v") and os.path.exists(os.path.join(snapshot_dir, name, _META))
+    )
+
+
+def latest_snapshot(snapshot_dir: str = SNAPSHOT_DIR) -> Optional[str]:
+    snapshots = list_snapshots(snapshot_dir)
+    return snapshots[-1] if snapshots else None
+
+
+def export_snapshot(snapshot_dir: str = SNAPSHOT_DIR, keep: int = SNAPSHOT_KEEP, retries: int = 3) -> str:
+    """
+    Snapshot the active store into `snapshot_dir` and return its path. If the
+    store is written to meanwhile (its collection version moves) the export is
+    retried. An unchanged store returns the existing latest snapshot.
+    """
+    latest = latest_snapshot(snapshot_dir)
+    version = collection_version()
+    if latest and read_meta(latest)["collection_version"] == version:
+        return latest
+
+    for attempt in range(retries):
+        version = collection_version()
+        final = os.path.join(snapshot_dir, f"v{version:08d}-{time.strftime('%Y%m%dT%H%M%S')}")
+        tmp = f"{final}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        try:
+            with span("snapshot.export"):
+                _export_once(tmp, version)
+            if collection_version() == version and not write_in_progress():
+                os.replace(tmp, final)
+                break
+        except RuntimeError as e:
+            print(f"[WARN] Snapshot attempt {attempt + 1} failed: {e}")
+        shutil.rmtree(tmp, ignore_errors=True)
+    else:
+        raise RuntimeError(f"store kept changing during {retries} snapshot attempts")
+
+    for old in list_snapshots(snapshot_dir)[:-keep] if keep else []:
+        shutil.rmtree(old, ignore_errors=True)
+    print(f"[INFO] Wrote snapshot {final}")
+    return final
+
+
+def read_meta(snapshot: str) -> Dict[str, Any]:
+    with open(os.path.join(snapshot, _META), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("format") != FORMAT_VERSION:
+        raise ValueError(f"{snapshot}: unsupported snapshot format {meta.get('format')!r}")
+    return meta
+
+
+def verify_snapshot(snapshot: str) -> Dict[str, Any]:
+    """Check every file against its recorded checksum; returns the snapshot metadata."""
+    meta = read_meta(snapshot)
+    for name, digest in meta["files"].items():
+        path = os.path.join(snapshot, *name.split("/"))
+        if not os.path.exists(path) or _sha256(path) != digest:
+            raise ValueError(f"{snapshot}: {name} is missing or corrupt")
+    return meta
+
+
+def import_snapshot(snapshot: str, replica_dir: str = REPLICA_DIR, verify: bool = True) -> str:
+    """
+    Materialize `snapshot` as a store directory under `replica_dir` and return
+    it. A snapshot already imported there (e.g. by another worker) is reused.
+    """
+    store = os.path.join(replica_dir, os.path.basename(os.path.normpath(snapshot)))
+    if os.path.exists(os.path.join(store, _IMPORTED)):
+        return store
+    if verify:
+        verify_snapshot(snapshot)
+    else:
+        read_meta(snapshot)
+
+    start = time.perf_counter()
+    tmp = f"{store}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(replica_dir, exist_ok=True)
+    with span("snapshot.import"):
+        # A copy, not links: Chroma opens its database for writing
+        shutil.copytree(os.path.join(snapshot, _STORE), tmp)
+        with open(os.path.join(tmp, _IMPORTED), "w", encoding="utf-8") as f:
+            f.write(snapshot)
+    try:
+        os.replace(tmp, store)
+    except OSError:
+        # Another worker finished importing the same snapshot first
+        shutil.rmtree(tmp, ignore_errors=True)
+    print(f"[INFO] Imported snapshot {snapshot} in {time.perf_counter() - start:.2f}s")
+    return store
+
+
+def _pin(store: str) -> None:
+    """Record (and refresh) that this process serves `store`."""
+    pins = os.path.join(os.path.dirname(store), _PINS)
+    os.makedirs(pins, exist_ok=True)
+    with open(os.path.join(pins, str(os.getpid())), "w", encoding="utf-8") as f:
+        f.write(os.path.basename(store))
+
+
+def _pinned(replica_dir: str, max_age_s: float) -> set:
+    """Replicas pinned by processes that refreshed their pin within `max_age_s`."""
+    pins = os.path.join(replica_dir, _PINS)
+    if not os.path.isdir(pins):
+        return set()
+    names = set()
+    now = time.time()
+    for pid in os.listdir(pins):
+        path = os.path.join(pins, pid)
+        try:
+            if now - os.path.getmtime(path) <= max_age_s:
+                with open(path, "r", encoding="utf-8") as f:
+                    names.add(f.read().strip())
+            else:
+                os.remove(path)  # the process stopped polling
+        except OSError:
+            continue
+    return names
+
+
+def _prune_replicas(store: str) -> None:
+    """Drop replicas beyond the newest SNAPSHOT_KEEP that no live process serves."""
+    parent = os.path.dirname(store)
+    pinned = _pinned(parent, 3 * SNAPSHOT_POLL_S)
+    stores = sorted(name for name in os.listdir(parent) if name.startswith("v") and ".tmp-" not in name)
+    for name in stores[:-SNAPSHOT_KEEP]:
+        if name not in pinned and os.path.join(parent, name) != store:
+            shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+
+
+def load_snapshot(snapshot: str = "latest", snapshot_dir: str = SNAPSHOT_DIR) -> Optional[str]:
+    """
+    Import `snapshot` (a path, or "latest" in `snapshot_dir`) and serve from it.
+    Returns the snapshot now in use, or None if there is none yet. Imports can
+    take a while: serving processes call this from serve_snapshots' thread.
+    """
+    global _current
+    path = latest_snapshot(snapshot_dir) if snapshot == "latest" else snapshot
+    if path is None or path == _current:
+        return _current
+    with _load_lock:
+        if path == _current:
+            return _current
+        store = import_snapshot(path)
+        _pin(store)
+        use_store(store)
+        _current = path
+        _prune_replicas(store)
+    return _current
+
+
+def _poll(snapshot: str, snapshot_dir: str, interval: float) -> None:
+    while True:
+        try:
+            load_snapshot(snapshot, snapshot_dir)
+            if _current is not None:
+                # Heartbeat: keeps this process's replica from being pruned
+                _pin(os.path.join(REPLICA_DIR, os.path.basename(os.path.normpath(_current))))
+        except Exception as e:
+            print(f"[WARN] Loading snapshot {snapshot} failed: {type(e).__name__}: {e}")
+        time.sleep(interval)
+
+
+def serve_snapshots(
+    snapshot: str = "latest", snapshot_dir: str = SNAPSHOT_DIR, interval: float = SNAPSHOT_POLL_S
+) -> Optional[str]:
+    """
+    Start, once per process, a background thread that loads `snapshot` and
+    keeps checking for newer ones (with "latest") every `interval` seconds.
+    Returns the snapshot served so far: None until the first import is done.
+    """
+    global _poller
+    if _poller is None:
+        with _load_lock:
+            if _poller is None:
+                _poller = threading.Thread(
+                    target=_poll, args=(snapshot, snapshot_dir, interval), name="snapshot-poller", daemon=True
+                )
+                _poller.start()
+    return _current
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export, import and list store snapshots.")
+    parser.add_argument("command", choices=["export", "import", "verify", "list"])
+    parser.add_argument("snapshot", nargs="?", default="latest", help="snapshot directory or 'latest'")
+    parser.add_argument("--dir", default=SNAPSHOT_DIR, help="snapshot directory")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        print(export_snapshot(args.dir))
+        return
+    if args.command == "list":
+        for path in list_snapshots(args.dir):
+            meta = read_meta(path)
+            counts = {name: info["count"] for name, info in meta["collections"].items()}
+            print(f"{path}\t{meta['created']}\t{json.dumps(counts)}")
+        return
+
+    path = latest_snapshot(args.dir) if args.snapshot == "latest" else args.snapshot
+    if path is None:
+        raise SystemExit(f"No snapshots in {args.dir}")
+    if args.command == "verify":
+        verify_snapshot(path)
+        print(f"{path}: OK")
+    else:
+        print(import_snapshot(path))
+
+
+if __name__ == "__main__":
+    main()
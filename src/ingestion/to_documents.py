@@ -1,82 +1,108 @@
 # src/ingestion/to_documents.py
 
-from typing import List
+import hashlib
+from collections import Counter
+from typing import Iterable, Iterator, List, Optional
+
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from src.ingestion.chunk_schema import Chunk
 
 
-def _merge_titles_with_body(chunks: List[Chunk]) -> List[Chunk]:
+def _section_chunk(title: Chunk, body: List[str], last_page) -> Chunk:
+    """Combine a title with all text accumulated under it."""
+    return Chunk(
+        id=title.id,
+        content=f"{title.content.strip()}\n\n" + "\n".join(body),
+        modality="text",
+        file_name=title.file_name,
+        file_type=title.file_type,
+        page_number=title.page_number,
+        category=title.category,
+        coordinates=title.coordinates,
+        extractor=title.extractor,
+        last_page=last_page,
+    )
+
+
+def iter_merged_chunks(chunks: Iterable[Chunk]) -> Iterator[Chunk]:
     """
     Merge a title with ALL following text chunks from the same section until another title appears.
     This ensures sections like 'Objectives' include their entire content.
-    """
-    merged: List[Chunk] = []
-    active_title: Chunk | None = None
-    buffer_text = []
 
-    chunks_sorted = sorted(
-        chunks,
-        key=lambda c: (c.file_name, c.page_number or 0, c.id),
-    )
+    Chunks are consumed in the order given, which must be reading order, and
+    only the current section is held in memory. A section never continues
+    into another file.
+    """
+    active_title: Optional[Chunk] = None
+    buffer_text: List[str] = []
+    last_page = None
 
-    for ch in chunks_sorted:
-        category = ch.extra.get("category") if ch.extra else None
+    for ch in chunks:
+        if active_title and ch.file_name != active_title.file_name:
+            yield _section_chunk(active_title, buffer_text, last_page)
+            active_title = None
 
         # If this is a title — flush previous and start a new section
-        if ch.modality == "text" and category == "Title":
+        if ch.modality == "text" and ch.category == "Title":
             if active_title:
-                # Combine title with all accumulated text
-                full_content = f"{active_title.content.strip()}\n\n" + "\n".join(buffer_text)
-                merged.append(
-                    Chunk(
-                        id=active_title.id,
-                        content=full_content,
-                        modality="text",
-                        file_name=active_title.file_name,
-                        file_type=active_title.file_type,
-                        page_number=active_title.page_number,
-                        extra=active_title.extra,
-                    )
-                )
+                yield _section_chunk(active_title, buffer_text, last_page)
             active_title = ch
             buffer_text = []
+            last_page = ch.page_number
             continue
 
         # If we have an active title, keep adding text under it
         if active_title and ch.modality == "text":
             buffer_text.append(ch.content.strip())
+            last_page = ch.page_number
             continue
 
         # Otherwise, it's a standalone chunk (table/image)
-        merged.append(ch)
+        yield ch
 
     # Final flush if last section had content
     if active_title:
-        full_content = f"{active_title.content.strip()}\n\n" + "\n".join(buffer_text)
-        merged.append(
-            Chunk(
-                id=active_title.id,
-                content=full_content,
-                modality="text",
-                file_name=active_title.file_name,
-                file_type=active_title.file_type,
-                page_number=active_title.page_number,
-                extra=active_title.extra,
-            )
-        )
-
-    return merged
+        yield _section_chunk(active_title, buffer_text, last_page)
+
+
+def _document_id(chunk_id: str, part: str, occurrence: int = 0) -> str:
+    """Content-derived Document ID, stable across re-ingestion of unchanged content."""
+    key = f"{chunk_id}\x1f{part}\x1f{occurrence}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def _make_document(ch: Chunk, content: str, seen: Counter) -> Document:
+    doc_id = _document_id(ch.id, content)
+    seen[doc_id] += 1
+    if seen[doc_id] > 1:
+        doc_id = _document_id(ch.id, content, seen[doc_id] - 1)
+
+    last_page = ch.last_page
+    is_section = ch.category == "Title"
+    return Document(
+        page_content=content,
+        metadata={
+            "chunk_id": doc_id,
+            "file_name": ch.file_name,
+            "file_type": ch.file_type,
+            "page_number": ch.page_number,
+            "last_page": last_page if last_page is not None else ch.page_number,
+            "modality": ch.modality,
+            # Every part of a merged section (or a standalone chunk) shares this
+            "section_id": ch.id,
+            "section_title": ch.content.split("\n", 1)[0].strip()[:200] if is_section else "",
+        },
+    )
 
 
-def chunks_to_documents(chunks: List[Chunk]) -> List[Document]:
+def iter_documents(chunks: Iterable[Chunk]) -> Iterator[Document]:
     """
-    Convert merged chunks into LangChain Documents.
+    Convert chunks, in reading order, into LangChain Documents as a stream.
     Uses larger chunk size to keep complete sections together.
+    Every Document carries a content-derived `chunk_id` in its metadata.
     """
-    merged_chunks = _merge_titles_with_body(chunks)
-
     # Use larger chunks to keep complete sections like "Objectives" together
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=1200,    # Larger to keep sections intact
@@ -84,8 +110,14 @@ def chunks_to_documents(chunks: List[Chunk]) -> List[Document]:
         separators=["\n\n", "\n", ". ", " ", ""],
     )
 
-    docs: List[Document] = []
-    for ch in merged_chunks:
+    seen: Counter = Counter()
+    current_file = None
+    for ch in iter_merged_chunks(chunks):
+        if ch.file_name != current_file:
+            # Chunk IDs include the file name, so repeats only need counting per file
+            seen.clear()
+            current_file = ch.file_name
+
         # For important sections, keep them as single chunks if possible
         content_lower = ch.content.lower()
         is_important_section = any(
@@ -95,31 +127,13 @@ def chunks_to_documents(chunks: List[Chunk]) -> List[Document]:
         
         if is_important_section and len(ch.content) < 2000:
             # Keep as single document without splitting
-            docs.append(
-                Document(
-                    page_content=ch.content,
-                    metadata={
-                        "file_name": ch.file_name,
-                        "file_type": ch.file_type,
-                        "page_number": ch.page_number,
-                        "modality": ch.modality,
-                    },
-                )
-            )
+            yield _make_document(ch, ch.content, seen)
         else:
             # Split normally
-            parts = text_splitter.split_text(ch.content)
-            for part in parts:
-                docs.append(
-                    Document(
-                        page_content=part,
-                        metadata={
-                            "file_name": ch.file_name,
-                            "file_type": ch.file_type,
-                            "page_number": ch.page_number,
-                            "modality": ch.modality,
-                        },
-                    )
-                )
-
-    return docs
\ No newline at end of file
+            for part in text_splitter.split_text(ch.content):
+                yield _make_document(ch, part, seen)
+
+
+def chunks_to_documents(chunks: Iterable[Chunk]) -> List[Document]:
+    """Convert merged chunks into LangChain Documents; see `iter_documents`."""
+    return list(iter_documents(chunks))
@@ -0,0 +1,184 @@
+# src/rag/answer_cache.py
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.config import (
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_PATH,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL,
+)
+from src.core.embeddings import get_embeddings
+from src.core.store import store_path
+from src.core.vectorstore import collection_version
+
+
+def normalize_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip(" ?!.")
+
+
+class AnswerCache:
+    """
+    Persistent cache of answers to previous questions.
+
+    A question is a hit if its normalised text was asked before, or if its
+    embedding is at least `threshold` cosine-similar to a cached question.
+    Entries expire after `ttl` seconds, the least recently used ones are evicted
+    beyond `max_entries`, and everything is dropped when the collection version
+    changes (i.e. documents were added or removed).
+    """
+
+    def __init__(
+        self,
+        path: str = ANSWER_CACHE_PATH,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        ttl: float = ANSWER_CACHE_TTL,
+    ):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " key TEXT PRIMARY KEY, question TEXT NOT NULL, embedding BLOB NOT NULL,"
+            " answer TEXT NOT NULL, sources TEXT NOT NULL,"
+            " created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+        self._load_index()
+
+    def _load_index(self) -> None:
+        """Keep question embeddings in memory for the similarity scan."""
+        rows = self._conn.execute("SELECT key, embedding FROM answers").fetchall()
+        self._keys: List[str] = [key for key, _ in rows]
+        self._matrix = (
+            np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows])
+            if rows else None
+        )
+
+    def _check_version(self) -> None:
+        version = str(collection_version())
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'collection_version'").fetchone()
+        if row is None or row[0] != version:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('collection_version', ?)",
+                (version,),
+            )
+            self._conn.commit()
+            self._load_index()
+
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def embed(self, question: str) -> List[float]:
+        return get_embeddings().embed_query(normalize_question(question))
+
+    def get(self, question: str, embedding: Optional[List[float]] = None) -> Optional[Dict[str, Any]]:
+        """Return the cached result for `question`, or None."""
+        with self._lock:
+            self._check_version()
+            key = hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()
+            hit_type = "exact"
+
+            if key not in self._keys:
+                key = None
+                if embedding is not None and self._matrix is not None:
+                    sims = self._matrix @ self._unit(embedding)
+                    best = int(np.argmax(sims))
+                    if sims[best] >= self.threshold:
+                        key = self._keys[best]
+                        hit_type = "semantic"
+
+            row = None
+            if key is not None:
+                row = self._conn.execute(
+                    "SELECT answer, sources, created FROM answers WHERE key = ?", (key,)
+                ).fetchone()
+            if row is None or time.time() - row[2] > self.ttl:
+                if row is not None:
+                    self._delete(key)
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+
+        answer, sources, _ = row
+        return {
+            "answer": answer,
+            "source_documents": [Document(**d) for d in json.loads(sources)],
+            "cache_hit": hit_type,
+        }
+
+    def put(self, question: str, embedding: List[float], result: Dict[str, Any]) -> None:
+        sources = json.dumps([
+            {"page_content": d.page_content, "metadata": d.metadata}
+            for d in result.get("source_documents", [])
+        ])
+        key = hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()
+        now = time.time()
+
+        with self._lock:
+            self._check_version()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers"
+                " (key, question, embedding, answer, sources, created, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, question, self._unit(embedding).tobytes(), result["answer"], sources, now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM answers WHERE created < ? OR key IN"
+                " (SELECT key FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (now - self.ttl, self.max_entries),
+            )
+            self._conn.commit()
+            self._load_index()
+
+    def _delete(self, key: str) -> None:
+        self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+        self._conn.commit()
+        self._load_index()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+            self._load_index()
+
+
+_answer_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """Process-wide answer cache of the active store, opened on first use."""
+    global _answer_cache
+    path = store_path(ANSWER_CACHE_PATH)
+    if _answer_cache is None or _answer_cache.path != path:
+        with _cache_lock:
+            if _answer_cache is None or _answer_cache.path != path:
+                _answer_cache = AnswerCache(path)
+    return _answer_cache
@@ -0,0 +1,212 @@
+# src/rag/batch.py
+"""
+Headless bulk question answering over a JSONL file.
+
+    python -m src.rag.batch questions.jsonl answers.jsonl --concurrency 2
+
+Each input line is a JSON object with a "question" (falling back to "body" or
+"title") and an optional "id" / "request_id". One JSON line is written per input
+line as soon as it is answered, with the answer, its sources and per-stage timings.
+"""
+
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List
+
+from src.config import BATCH_CONCURRENCY, BATCH_MAX_READY, BATCH_RETRIEVAL_WORKERS, EMBEDDING_CACHE_ENABLED
+from src.core.embeddings import get_embeddings
+from src.core.metrics import observe
+from src.rag.answer_cache import normalize_question
+from src.rag.rag_chain import build_rag_chain
+
+
+def read_requests(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for index, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            question = item.get("question") or item.get("body") or item.get("title") or ""
+            yield {
+                "index": index,
+                "id": item.get("id", item.get("request_id", index)),
+                "question": question,
+            }
+
+
+def _sources(docs) -> List[Dict[str, Any]]:
+    return [
+        {
+            "chunk_id": (d.metadata or {}).get("chunk_id"),
+            "file_name": (d.metadata or {}).get("file_name"),
+            "page_number": (d.metadata or {}).get("page_number"),
+            "modality": (d.metadata or {}).get("modality"),
+        }
+        for d in docs
+    ]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_batch(
+    in_path: str,
+    out_path: str,
+    concurrency: int = BATCH_CONCURRENCY,
+    retrieval_workers: int = BATCH_RETRIEVAL_WORKERS,
+    max_ready: int = BATCH_MAX_READY,
+) -> Dict[str, Any]:
+    """
+    Answer every question in `in_path` and write results to `out_path`.
+
+    Retrieval runs on its own thread pool ahead of generation, so the next
+    prompts are ready while the LLM (at most `concurrency` requests at a time)
+    is busy. New retrievals only start while fewer than `max_ready` questions
+    beyond what the two pools can work on are in flight, so retrieved contexts
+    do not pile up in memory when generation is the bottleneck. Identical
+    questions are retrieved and answered once, and with the embedding cache on,
+    all distinct questions are embedded in batches up front.
+    Each record's total_s runs from the start of its own retrieval to its result.
+    """
+    items = list(read_requests(in_path))
+    rag = build_rag_chain()
+    # One store's cache for the whole batch, even if use_store switches meanwhile
+    cache = rag.answer_cache()
+
+    # Coalesce identical questions into one job
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for item in items:
+        groups.setdefault(normalize_question(item["question"]), []).append(item)
+
+    start = time.perf_counter()
+    if EMBEDDING_CACHE_ENABLED:
+        # Batch-embed every distinct question exactly as it is looked up later,
+        # so retrieval (the raw question, as a document) and the answer cache
+        # (the normalized question, as a query) hit the embedding cache
+        questions = [group[0]["question"] for group in groups.values()]
+        embeddings = get_embeddings()
+        embeddings.embed_documents(questions)
+        if cache is not None:
+            embeddings.embed_queries([normalize_question(q) for q in questions])
+
+    done: "queue.Queue[tuple]" = queue.Queue()
+    retrieval_pool = ThreadPoolExecutor(max_workers=retrieval_workers)
+    generation_pool = ThreadPoolExecutor(max_workers=concurrency)
+    # One slot per question from the start of its retrieval until it is answered
+    slots = threading.BoundedSemaphore(retrieval_workers + concurrency + max(0, max_ready))
+
+    def generate(key: str, question: str, docs, prompt, context_stats, timings: Dict[str, float], question_vec):
+        try:
+            gen_start = time.perf_counter()
+            response = rag.llm.invoke(prompt)
+            answer = getattr(response, "content", str(response))
+            timings["generation_s"] = time.perf_counter() - gen_start
+            observe("rag.generate", timings["generation_s"])
+
+            result = {"answer": answer, "source_documents": docs[:5], "context_stats": context_stats}
+            if cache is not None:
+                cache.put(question, question_vec, result)
+            done.put((key, result, timings, None))
+        except Exception as e:
+            done.put((key, None, timings, f"{type(e).__name__}: {e}"))
+        finally:
+            slots.release()
+
+    def retrieve(key: str, question: str, submitted: float):
+        ret_start = time.perf_counter()
+        timings = {"queue_s": ret_start - submitted, "_start": ret_start}
+        try:
+            cached, question_vec = rag.check_cache(question, cache=cache)
+            if cached is not None:
+                timings["retrieval_s"] = time.perf_counter() - ret_start
+                done.put((key, cached, timings, None))
+                slots.release()
+                return
+
+            docs, prompt, context_stats = rag.prepare(question)
+            timings["retrieval_s"] = time.perf_counter() - ret_start
+            timings["_ready"] = time.perf_counter()
+            generation_pool.submit(generate, key, question, docs, prompt, context_stats, timings, question_vec)
+        except Exception as e:
+            done.put((key, None, timings, f"{type(e).__name__}: {e}"))
+            slots.release()
+
+    submitted = time.perf_counter()
+
+    def feed():
+        # Runs beside the writer below, which must keep draining `done`
+        for key, group in groups.items():
+            slots.acquire()
+            retrieval_pool.submit(retrieve, key, group[0]["question"], submitted)
+
+    feeder = threading.Thread(target=feed, name="batch-feeder", daemon=True)
+    feeder.start()
+
+    totals: List[float] = []
+    errors = 0
+    with open(out_path, "w", encoding="utf-8") as out:
+        for _ in range(len(groups)):
+            key, result, timings, error = done.get()
+            ready = timings.pop("_ready", None)
+            if ready is not None and "generation_s" in timings:
+                # Time spent waiting for a free generation slot
+                timings["generation_wait_s"] = time.perf_counter() - ready - timings["generation_s"]
+            timings["total_s"] = time.perf_counter() - timings.pop("_start")
+
+            for item in groups[key]:
+                record = {"id": item["id"], "question": item["question"], "timings": timings}
+                if error is None:
+                    record["answer"] = result["answer"]
+                    record["sources"] = _sources(result.get("source_documents", []))
+                    record["cache_hit"] = result.get("cache_hit")
+                    record["context_stats"] = result.get("context_stats")
+                else:
+                    record["error"] = error
+                    errors += 1
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                totals.append(timings["total_s"])
+            out.flush()
+
+    feeder.join()
+    retrieval_pool.shutdown()
+    generation_pool.shutdown()
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        "questions": len(items),
+        "distinct_questions": len(groups),
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "throughput_qps": len(items) / elapsed if elapsed else 0.0,
+        "latency_p50_s": _percentile(totals, 50),
+        "latency_p95_s": _percentile(totals, 95),
+    }
+    print(f"[INFO] Batch finished: {json.dumps(summary)}")
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Answer questions from a JSONL file with the RAG chain.")
+    parser.add_argument("input", help="JSONL file with one question per line")
+    parser.add_argument("output", help="JSONL file to write answers to")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY,
+                        help="concurrent LLM generations")
+    parser.add_argument("--retrieval-workers", type=int, default=BATCH_RETRIEVAL_WORKERS,
+                        help="threads retrieving ahead of generation")
+    parser.add_argument("--max-ready", type=int, default=BATCH_MAX_READY,
+                        help="retrieved prompts allowed to wait for generation")
+    args = parser.parse_args()
+    run_batch(args.input, args.output, args.concurrency, args.retrieval_workers, args.max_ready)
+
+
+if __name__ == "__main__":
+    main()
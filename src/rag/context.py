@@ -0,0 +1,170 @@
+# src/rag/context.py
+
+import re
+import threading
+from typing import Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+from src.config import CONTEXT_CHUNK_TOKENS, CONTEXT_TOKEN_BUDGET, CONTEXT_TOKENIZER
+from src.core.bm25 import tokenize
+
+# Overlaps shorter than this are treated as coincidence, not splitter overlap
+_MIN_OVERLAP_CHARS = 20
+# Longest overlap searched for; RecursiveCharacterTextSplitter uses chunk_overlap=200
+_MAX_OVERLAP_CHARS = 400
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+
+def _get_tokenizer():
+    """The generation model's tokenizer, or False if it cannot be loaded."""
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                try:
+                    from transformers import AutoTokenizer
+
+                    # Only a locally cached copy (or a local path): never download while answering
+                    _tokenizer = AutoTokenizer.from_pretrained(CONTEXT_TOKENIZER, local_files_only=True)
+                except Exception as e:  # not cached, not installed...
+                    print(f"[WARN] Tokenizer {CONTEXT_TOKENIZER} unavailable ({type(e).__name__}); "
+                          "estimating tokens as characters / 4")
+                    _tokenizer = False
+    return _tokenizer
+
+
+def count_tokens(text: str) -> int:
+    tokenizer = _get_tokenizer()
+    if tokenizer:
+        return len(tokenizer.encode(text, add_special_tokens=False))
+    return (len(text) + 3) // 4
+
+
+def truncate_tokens(text: str, budget: int) -> str:
+    """The longest prefix of `text` of at most `budget` tokens."""
+    tokenizer = _get_tokenizer()
+    if tokenizer:
+        ids = tokenizer.encode(text, add_special_tokens=False)
+        if len(ids) <= budget:
+            return text
+        text = tokenizer.decode(ids[:budget])
+        # Decoding a cut can spill over by a token at the boundary
+        while text and count_tokens(text) > budget:
+            text = text[:-1]
+        return text
+    return text[:budget * 4]
+
+
+def _header(i: int, doc: Document) -> str:
+    meta = doc.metadata or {}
+    return (
+        f"[Source {i}: {meta.get('file_name', '?')} - "
+        f"Page {meta.get('page_number', '?')} - "
+        f"{meta.get('modality', '?')}]\n"
+    )
+
+
+def build_char_context(docs: List[Document], max_chars: int = 5000) -> str:
+    """Greedy whole-chunk concatenation up to `max_chars`; the pre-packing baseline."""
+    context_parts = []
+    total_chars = 0
+    for i, d in enumerate(docs):
+        body = d.page_content.strip()
+        if not body:
+            continue
+        text = _header(i + 1, d) + body
+        if total_chars + len(text) > max_chars and context_parts:
+            break
+        context_parts.append(text)
+        total_chars += len(text)
+    return "\n\n".join(context_parts)
+
+
+def _strip_overlap(previous: List[str], body: str) -> str:
+    """Drop a prefix of `body` that repeats the end of an already packed chunk."""
+    for prev in previous:
+        for length in range(min(_MAX_OVERLAP_CHARS, len(prev), len(body)), _MIN_OVERLAP_CHARS - 1, -1):
+            if prev.endswith(body[:length]):
+                return body[length:].lstrip()
+    return body
+
+
+def _relevant_sentences(query_terms: set, body: str, budget: int) -> Tuple[str, int]:
+    """
+    Keep the sentences of `body` that share the most terms with the query, in
+    their original order, within `budget` tokens. Returns (text, tokens).
+    """
+    tokens = count_tokens(body)
+    if tokens <= budget:
+        return body, tokens
+
+    sentences = [s.strip() for s in _SENTENCE_RE.split(body) if s.strip()]
+    scored = sorted(
+        range(len(sentences)),
+        # The first sentence is usually a heading, so it wins ties
+        key=lambda i: (-len(query_terms & set(tokenize(sentences[i]))), i),
+    )
+
+    keep, used = [], 0
+    for i in scored:
+        n = count_tokens(sentences[i])
+        if used + n <= budget:
+            keep.append(i)
+            used += n
+        elif not keep:
+            # The best sentence alone is over budget: keep as much of it as fits
+            text = truncate_tokens(sentences[i], budget)
+            return text, count_tokens(text)
+    return "\n".join(sentences[i] for i in sorted(keep)), used
+
+
+def pack_context(
+    question: str,
+    docs: List[Document],
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    chunk_budget: int = CONTEXT_CHUNK_TOKENS,
+) -> Tuple[str, Dict[str, int]]:
+    """
+    Build the prompt context within `token_budget` tokens of the generation
+    model. Text repeated from the overlap with an already included chunk of the
+    same file is removed, and each chunk is cut down to its most query-relevant
+    sentences (at most `chunk_budget` tokens). Returns the context and counts of
+    chunks used, overlap characters removed and context tokens.
+    """
+    query_terms = set(tokenize(question))
+    packed_bodies: Dict[str, List[str]] = {}
+    parts: List[str] = []
+    used = 0
+    overlap_chars = 0
+
+    for d in docs:
+        body = d.page_content.strip()
+        if not body:
+            continue
+
+        file_name = (d.metadata or {}).get("file_name", "?")
+        deduped = _strip_overlap(packed_bodies.get(file_name, []), body)
+        overlap_chars += len(body) - len(deduped)
+        if not deduped:
+            continue
+
+        header = _header(len(parts) + 1, d)
+        remaining = token_budget - used - count_tokens(header)
+        if remaining <= 0:
+            break
+
+        text, n = _relevant_sentences(query_terms, deduped, min(chunk_budget, remaining))
+        if not text:
+            continue
+
+        parts.append(header + text)
+        packed_bodies.setdefault(file_name, []).append(body)
+        used += count_tokens(header) + n
+
+    stats = {"chunks": len(parts), "overlap_chars_removed": overlap_chars, "context_tokens": used}
+    return "\n\n".join(parts), stats
@@ -1,9 +1,25 @@
 # src/rag/rag_chain.py
 
-from typing import Dict, Any, List
-
-from src.core.vectorstore import get_vectorstore
+import random
+import time
+from functools import lru_cache
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from src.config import (
+    ANSWER_CACHE_ENABLED,
+    CONTEXT_BASELINE_SAMPLE,
+    RERANK_CANDIDATES,
+    RERANK_ENABLED,
+    RERANK_TOP_N,
+    RETRIEVAL_TOP_N,
+)
 from src.core.llm import get_llm
+from src.core.metrics import incr, observe, span
+from src.rag.answer_cache import get_answer_cache
+from src.rag.context import build_char_context, count_tokens, pack_context
+from src.rag.retrieval import retrieve
 
 
 RAG_PROMPT = """
@@ -25,106 +41,179 @@ You are a helpful AI assistant answering questions about the LlamaChain project
 **Your Answer (about LlamaChain project only):**
 """
 
+# Everything before the context is identical for every request; backends that
+# support it keep this part prefilled (see LlamaCppChat.cache_prefix)
+RAG_PROMPT_PREFIX = RAG_PROMPT.split("{context}")[0]
 
-def build_rag_chain():
-    vs = get_vectorstore()
-    llm = get_llm()
 
-    def rag(question: str) -> Dict[str, Any]:
-        # Enhanced retrieval: search with multiple query variations
-        queries = [question]
-        
-        # Add query expansion for common questions
-        if "objective" in question.lower():
-            queries.extend([
-                "LlamaChain objectives aims goals",
-                "project objectives section 5",
-                "what does LlamaChain aim to achieve"
-            ])
-        
-        # Collect documents from multiple query variations
-        all_docs = []
-        seen_ids = set()
-        
-        for q in queries:
-            docs = vs.similarity_search(q, k=6)
-            for doc in docs:
-                doc_id = id(doc)
-                if doc_id not in seen_ids:
-                    all_docs.append(doc)
-                    seen_ids.add(doc_id)
-        
-        # Prioritize documents from "Objectives" section
-        def doc_priority(doc):
-            content_lower = doc.page_content.lower()
-            meta = doc.metadata or {}
-            
-            # Highest priority: contains "Objectives" heading
-            if "objectives" in content_lower and ("5." in doc.page_content or "objective" in content_lower[:100]):
-                return 0
-            # High priority: page 3 (where objectives are)
-            elif meta.get("page_number") == 3:
-                return 1
-            # Medium: mentions project goals/aims
-            elif any(word in content_lower for word in ["llama", "llamachain", "system will", "project will"]):
-                return 2
-            # Low: literature review content
-            elif any(word in content_lower for word in ["authors:", "publication date:", "this paper", "this research"]):
-                return 10
-            else:
-                return 5
-        
-        all_docs.sort(key=doc_priority)
-        docs = all_docs[:10]  # Take top 10 after sorting
-        
-        print(f"\n[DEBUG] Retrieved {len(docs)} documents after deduplication and ranking")
-
-        # Build context string
-        context_parts = []
-        total_chars = 0
-        max_chars = 5000
-
-        for i, d in enumerate(docs):
-            meta = d.metadata or {}
-            page_num = meta.get('page_number', '?')
-            
-            header = (
-                f"[Source {i+1}: {meta.get('file_name', '?')} - "
-                f"Page {page_num} - "
-                f"{meta.get('modality', '?')}]\n"
-            )
-            body = d.page_content.strip()
-            if not body:
-                continue
+@lru_cache(maxsize=1)
+def _template_tokens() -> int:
+    """Tokens of the prompt around the context and question."""
+    return count_tokens(RAG_PROMPT.format(context="", question=""))
 
-            # Debug first few chunks
-            if i < 3:
-                print(f"[DEBUG] Chunk {i+1} (Page {page_num}): {body[:150]}...")
 
-            text = header + body
-            if total_chars + len(text) > max_chars and context_parts:
-                break
+def warm_up_llm() -> float:
+    """Load the LLM and prefill the static prompt prefix where supported; returns seconds."""
+    start = time.perf_counter()
+    llm = get_llm()
+    if hasattr(llm, "cache_prefix"):
+        llm.cache_prefix(RAG_PROMPT_PREFIX)
+    return time.perf_counter() - start
 
-            context_parts.append(text)
-            total_chars += len(text)
 
-        if context_parts:
-            context = "\n\n".join(context_parts)
-            print(f"[DEBUG] Total context length: {len(context)} chars, {len(context_parts)} chunks used")
-        else:
-            context = "No relevant context found."
-            print("[DEBUG] WARNING: No context parts generated!")
+def build_rag_chain(use_cache: bool = ANSWER_CACHE_ENABLED):
+    warm_up_llm()
+    llm = get_llm()
 
-        # Build prompt and call LLM
-        prompt = RAG_PROMPT.format(context=context, question=question)
-        response = llm.invoke(prompt)
+    def answer_cache():
+        # Looked up per request: each store has its own cache (see use_store)
+        return get_answer_cache() if use_cache else None
+
+    def prepare(
+        question: str, filters: Optional[Dict[str, List[Any]]] = None
+    ) -> Tuple[List[Document], str, Dict[str, int]]:
+        """
+        Retrieve and rank documents and build the prompt for `question`,
+        optionally only from documents matching metadata `filters`.
+        """
+        # Hybrid retrieval: vector + BM25 rankings merged by reciprocal-rank
+        # fusion, deduplicated by chunk ID
+        if RERANK_ENABLED:
+            # Imported here so sentence-transformers only loads with reranking on
+            from src.rag.rerank import get_reranker
+
+            # Retrieve more candidates and let the cross-encoder pick the best
+            with span("rag.retrieve"):
+                candidates = [doc for doc, _ in retrieve([question], k=RERANK_CANDIDATES, filters=filters)]
+            with span("rag.rerank"):
+                docs = get_reranker().rerank(question, candidates[:RERANK_CANDIDATES], RERANK_TOP_N)
+        else:
+            with span("rag.retrieve"):
+                docs = [doc for doc, _ in retrieve([question], filters=filters)][:RETRIEVAL_TOP_N]
+        incr("rag.retrieved_docs", len(docs))
+
+        # Pack the most relevant text into the model's token budget
+        with span("rag.context"):
+            context, context_stats = pack_context(question, docs)
+            if not context:
+                context = "No relevant context found."
+                incr("rag.empty_context")
+
+            prompt = RAG_PROMPT.format(context=context, question=question)
+            # From the parts already counted; tokens may merge across the joins
+            context_stats["prompt_tokens"] = (
+                _template_tokens() + context_stats["context_tokens"] + count_tokens(question)
+            )
+            incr("rag.prompt_tokens", context_stats["prompt_tokens"])
+
+            if CONTEXT_BASELINE_SAMPLE and random.random() < CONTEXT_BASELINE_SAMPLE:
+                # Compare with the old greedy 5000-character context
+                baseline_prompt = RAG_PROMPT.format(context=build_char_context(docs), question=question)
+                context_stats["prompt_tokens_saved"] = count_tokens(baseline_prompt) - count_tokens(prompt)
+                incr("rag.baseline_samples")
+                incr("rag.prompt_tokens_saved", context_stats["prompt_tokens_saved"])
+        return docs, prompt, context_stats
+
+    def check_cache(question: str, filters: Optional[Dict[str, List[Any]]] = None, cache=None):
+        """
+        Return (cached result or None, question embedding or None), looking in
+        `cache` (default: answer_cache()). Filtered questions bypass the cache,
+        whose entries cover the whole collection.
+        """
+        cache = cache or answer_cache()
+        if cache is None or any((filters or {}).values()):
+            return None, None
+        question_vec = cache.embed(question)
+        cached = cache.get(question, question_vec)
+        incr("rag.answer_cache_hits" if cached is not None else "rag.answer_cache_misses")
+        return cached, question_vec
+
+    def rag(question: str, filters: Optional[Dict[str, List[Any]]] = None) -> Dict[str, Any]:
+        start = time.perf_counter()
+
+        # Repeated / near-duplicate questions are answered from the cache
+        cache = answer_cache()
+        cached, question_vec = check_cache(question, filters, cache)
+        if cached is not None:
+            return cached
+
+        docs, prompt, context_stats = prepare(question, filters)
+        retrieval_s = time.perf_counter() - start
+
+        # Call LLM
+        with span("rag.generate"):
+            response = llm.invoke(prompt)
         answer_text = getattr(response, "content", str(response))
+        observe("rag.total", time.perf_counter() - start)
 
-        print(f"[DEBUG] Answer preview: {answer_text[:200]}...\n")
-
-        return {
+        result = {
             "answer": answer_text,
             "source_documents": docs[:5],  # Return top 5 for display
+            "timings": {
+                "retrieval_s": retrieval_s,
+                "generation_s": time.perf_counter() - start - retrieval_s,
+                "total_s": time.perf_counter() - start,
+            },
+            "context_stats": context_stats,
         }
-
-    return rag
\ No newline at end of file
+        if question_vec is not None:
+            cache.put(question, question_vec, result)
+        return result
+
+    def stream(question: str, filters: Optional[Dict[str, List[Any]]] = None) -> Dict[str, Any]:
+        """
+        Streaming variant of `rag`. Retrieval runs immediately and the returned
+        dict already holds `source_documents`; `tokens` is a generator yielding
+        answer text as the LLM produces it. Once it is exhausted, `answer` holds
+        the full text and `timings` the time to first token and generation time.
+        """
+        start = time.perf_counter()
+        timings: Dict[str, float] = {}
+        result: Dict[str, Any] = {"answer": None, "timings": timings}
+
+        cache = answer_cache()
+        cached, question_vec = check_cache(question, filters, cache)
+        if cached is not None:
+            timings["ttft_s"] = timings["total_s"] = time.perf_counter() - start
+            result.update(cached)
+            result["tokens"] = iter([cached["answer"]])
+            return result
+
+        docs, prompt, context_stats = prepare(question, filters)
+        result["source_documents"] = docs[:5]
+        result["context_stats"] = context_stats
+        timings["retrieval_s"] = time.perf_counter() - start
+
+        def tokens() -> Iterator[str]:
+            gen_start = time.perf_counter()
+            parts = []
+            for chunk in llm.stream(prompt):
+                text = getattr(chunk, "content", str(chunk))
+                if not text:
+                    continue
+                if not parts:
+                    timings["ttft_s"] = time.perf_counter() - start
+                    observe("rag.ttft", timings["ttft_s"])
+                parts.append(text)
+                yield text
+
+            timings["generation_s"] = time.perf_counter() - gen_start
+            timings["total_s"] = time.perf_counter() - start
+            result["answer"] = "".join(parts)
+            observe("rag.generate", timings["generation_s"])
+            observe("rag.total", timings["total_s"])
+
+            if question_vec is not None:
+                cache.put(question, question_vec, result)
+
+        result["tokens"] = tokens()
+        return result
+
+    # Stages exposed for callers that schedule retrieval and generation
+    # themselves (see src/rag/batch.py)
+    rag.stream = stream
+    rag.prepare = prepare
+    rag.check_cache = check_cache
+    rag.llm = llm
+    rag.answer_cache = answer_cache
+    return rag
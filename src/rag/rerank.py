@@ -0,0 +1,116 @@
+# src/rag/rerank.py
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from langchain_core.documents import Document
+from sentence_transformers import CrossEncoder
+
+from src.config import (
+    RERANK_BATCH_SIZE,
+    RERANK_BUDGET_MS,
+    RERANK_CACHE_SIZE,
+    RERANK_MODEL,
+    RERANK_PROBE_EVERY,
+    RERANK_PROBE_PAIRS,
+)
+from src.core.metrics import incr
+from src.rag.retrieval import doc_key
+
+
+class CrossEncoderReranker:
+    """
+    Re-orders candidates by a CPU cross-encoder's (question, chunk) relevance.
+
+    All uncached pairs are scored in one predict call. Scores are cached by
+    (question hash, chunk ID). The cost per pair is tracked, and when scoring
+    the uncached pairs is expected to exceed `budget_ms` the candidates are
+    returned in their retrieval order instead. Every `probe_every` such
+    fallbacks a few pairs are scored to re-measure the cost. The model is warmed
+    up on load, so its first call does not count against the budget.
+    """
+
+    def __init__(
+        self,
+        model_name: str = RERANK_MODEL,
+        batch_size: int = RERANK_BATCH_SIZE,
+        budget_ms: float = RERANK_BUDGET_MS,
+        cache_size: int = RERANK_CACHE_SIZE,
+        probe_every: int = RERANK_PROBE_EVERY,
+        probe_pairs: int = RERANK_PROBE_PAIRS,
+    ):
+        self.model = CrossEncoder(model_name, device="cpu")
+        # Lazy initialisation and first-call allocations, kept out of the measured cost
+        self.model.predict([("warm-up", "warm-up")] * batch_size, batch_size=batch_size, show_progress_bar=False)
+        self.batch_size = batch_size
+        self.budget_s = budget_ms / 1000
+        self.cache_size = cache_size
+        self.probe_every = probe_every
+        self.probe_pairs = probe_pairs
+        self.fallbacks = 0
+        self._cache: "OrderedDict[tuple, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pair_cost_s: Optional[float] = None  # moving average per scored pair
+
+    def rerank(self, question: str, docs: List[Document], top_n: int) -> List[Document]:
+        qhash = hashlib.sha256(question.strip().lower().encode("utf-8")).hexdigest()
+        keys = [(qhash, doc_key(d)) for d in docs]
+
+        with self._lock:
+            scores = {k: self._cache[k] for k in keys if k in self._cache}
+            for k in scores:
+                self._cache.move_to_end(k)
+        missing = [i for i, k in enumerate(keys) if k not in scores]
+
+        if missing and self._pair_cost_s is not None and self._pair_cost_s * len(missing) > self.budget_s:
+            self.fallbacks += 1
+            incr("rerank.fallbacks")
+            if self.probe_every and self.fallbacks % self.probe_every == 0:
+                # Re-measure on a sample, replacing the average that kept
+                # failing; the scores are cached for later calls
+                self._pair_cost_s = None
+                self._score(question, docs, keys, missing[:self.probe_pairs], scores)
+                missing = [i for i in missing if keys[i] not in scores]
+            if self._pair_cost_s * len(missing) > self.budget_s:
+                return docs[:top_n]
+
+        if missing:
+            self._score(question, docs, keys, missing, scores)
+
+        order = sorted(range(len(docs)), key=lambda i: scores[keys[i]], reverse=True)
+        return [docs[i] for i in order[:top_n]]
+
+    def _score(self, question: str, docs: List[Document], keys: List[tuple], rows: List[int], scores: dict) -> None:
+        """Score docs[rows] against `question` into `scores` and the cache, updating the cost per pair."""
+        start = time.perf_counter()
+        predicted = self.model.predict(
+            [(question, docs[i].page_content) for i in rows],
+            batch_size=self.batch_size,
+            show_progress_bar=False,
+        )
+        cost = (time.perf_counter() - start) / len(rows)
+        self._pair_cost_s = cost if self._pair_cost_s is None else 0.8 * self._pair_cost_s + 0.2 * cost
+
+        with self._lock:
+            for i, score in zip(rows, predicted):
+                scores[keys[i]] = float(score)
+                self._cache[keys[i]] = float(score)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+
+_reranker: Optional[CrossEncoderReranker] = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> CrossEncoderReranker:
+    """Process-wide reranker, loaded on first use."""
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = CrossEncoderReranker()
+    return _reranker
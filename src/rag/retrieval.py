@@ -0,0 +1,127 @@
+# src/rag/retrieval.py
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from langchain_core.documents import Document
+
+from src.config import (
+    DOCUMENT_TOP_K,
+    HIERARCHICAL_RETRIEVAL,
+    HYBRID_RETRIEVAL,
+    RETRIEVAL_K,
+    RETRIEVAL_MMR,
+    RETRIEVAL_MMR_LAMBDA,
+    RRF_K,
+    SECTION_TOP_K,
+)
+from src.core.bm25 import get_lexical_index
+from src.core.embeddings import get_embeddings
+from src.core.hierarchy import top_sections
+from src.core.metrics import span
+from src.core.vectorstore import ensure_lexical_index, query_by_vectors
+
+
+def doc_key(doc: Document) -> str:
+    """Stable identity of a stored chunk, used to deduplicate across queries."""
+    meta = doc.metadata or {}
+    return meta.get("chunk_id") or f"{meta.get('file_name')}:{meta.get('page_number')}:{doc.page_content}"
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int = RRF_K) -> List[Tuple[Document, float]]:
+    """Merge several rankings: each document scores sum(1 / (k + rank)) over the lists it is in."""
+    docs: Dict[str, Document] = {}
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc_key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return [(docs[key], scores[key]) for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+def _vector_ranking(
+    queries: List[str],
+    k: int,
+    mmr: bool,
+    lambda_mult: float,
+    filters: Optional[Dict[str, List[Any]]],
+    hierarchical: bool = False,
+) -> List[Document]:
+    """
+    All query variants are embedded in one batch and sent to the collection in
+    one query. With `hierarchical`, the closest files and sections are found
+    first and only the chunks of those sections are searched. Hits are deduplicated by chunk ID, keeping each chunk's best
+    (smallest) distance; chunks found by more variants rank first among equal
+    distances. With `mmr`, the merged candidates are re-ordered by maximal
+    marginal relevance against the first query.
+    """
+    # embed_documents batches all variants through the model in one call
+    with span("retrieve.embed"):
+        vectors = get_embeddings().embed_documents(queries)
+    if hierarchical:
+        with span("retrieve.sections"):
+            section_ids = top_sections(vectors, SECTION_TOP_K, DOCUMENT_TOP_K, filters)
+        if section_ids:
+            filters = {**(filters or {}), "section_id": section_ids}
+    with span("retrieve.vector"):
+        per_query = query_by_vectors(vectors, k=k, filters=filters, include_embeddings=mmr)
+
+    merged: Dict[str, list] = {}  # key -> [doc, best distance, hit count, embedding]
+    for hits in per_query:
+        for doc, distance, embedding in hits:
+            key = doc_key(doc)
+            entry = merged.get(key)
+            if entry is None:
+                merged[key] = [doc, distance, 1, embedding]
+            else:
+                entry[1] = min(entry[1], distance)
+                entry[2] += 1
+
+    ranked = sorted(merged.values(), key=lambda e: (e[1], -e[2]))
+
+    if mmr and ranked:
+        order = maximal_marginal_relevance(
+            np.array(vectors[0], dtype=np.float32),
+            [e[3] for e in ranked],
+            lambda_mult=lambda_mult,
+            k=len(ranked),
+        )
+        ranked = [ranked[i] for i in order]
+
+    return [e[0] for e in ranked]
+
+
+def retrieve(
+    queries: List[str],
+    k: int = RETRIEVAL_K,
+    mmr: bool = RETRIEVAL_MMR,
+    lambda_mult: float = RETRIEVAL_MMR_LAMBDA,
+    filters: Optional[Dict[str, List[Any]]] = None,
+    hybrid: bool = HYBRID_RETRIEVAL,
+    hierarchical: bool = HIERARCHICAL_RETRIEVAL,
+) -> List[Tuple[Document, float]]:
+    """
+    Retrieve candidates for one or more query variants.
+
+    The vector ranking (see `_vector_ranking`) and, with `hybrid`, a BM25 ranking
+    per query are merged by reciprocal-rank fusion. `filters` restricts both to
+    documents whose metadata values are allowed, e.g. {"modality": ["table"]}.
+    With `hierarchical`, only the vector side is narrowed to the closest
+    sections; BM25 still sees every section, so exact term matches elsewhere
+    count too. Returns (document, fused score) pairs, best first.
+    """
+    if not queries:
+        return []
+
+    rankings = [_vector_ranking(queries, k, mmr, lambda_mult, filters, hierarchical)]
+
+    if hybrid:
+        ensure_lexical_index()
+        index = get_lexical_index()
+        with span("retrieve.lexical"):
+            for q in queries:
+                rankings.append([doc for doc, _ in index.search(q, k, filters)])
+
+    return reciprocal_rank_fusion(rankings)